@@ -0,0 +1,306 @@
+"""
+点对点聊天传输方式对比：TCP 与可靠UDP在模拟丢包下的连接耗时与消息延迟
+不依赖 netem：连接经过本地的用户态中继，中继为每个方向加上固定的单向时延并按概率注入丢包。
+- 可靠UDP：中继直接丢弃数据报（两个方向，确认也会丢），由协议自行重传。
+- TCP：回环上无法真正丢弃TCP报文段，中继按TCP的恢复行为模拟丢包的后果：丢失的报文段在
+  之后又到达3个报文段时经快速重传补上（再等一个往返），否则等待重传超时（Linux下为往返时间+200毫秒），
+  重传也可能再次丢失（超时加倍）；期间之后的所有数据都被挡住（队头阻塞）。
+  连接建立计入一个往返，SYN/SYN-ACK 丢失时按初始超时1秒重传。
+两种方式都先交换一次JSON握手，然后以固定速率发送消息，接收方统计每条消息从发出到读出的延迟。
+
+用法: python benchmarks/bench_direct_transport.py [--loss 0,0.01,0.05,0.1] [--delay 20] [--messages 200]
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import select
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.p2pu.core_utils import send_json, receive_json  # noqa: E402
+from src.p2pu.framing import release_frame_reader  # noqa: E402
+from src.p2pu.rudp import RUDPListener, connect_rudp  # noqa: E402
+
+TCP_MSS = 1448            # 回环上按以太网MSS切分报文段
+TCP_MIN_RTO = 0.2         # Linux 的 tcp_rto_min
+TCP_SYN_RTO = 1.0         # 初始重传超时（SYN）
+TCP_DUPACK_THRESHOLD = 3  # 快速重传所需的重复确认数
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+class DelayLine:
+    """按固定单向时延依次转发（模拟链路传播时延，保持顺序）"""
+
+    def __init__(self, delay, deliver):
+        self.delay = delay
+        self.deliver = deliver
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, data):
+        self._queue.put((time.monotonic() + self.delay, data))
+
+    def close(self):
+        self._queue.put((0, None))
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        while True:
+            due, data = self._queue.get()
+            if data is None:
+                return
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.deliver(data)
+            except OSError:
+                pass
+
+
+class LossyUDPRelay:
+    """单个UDP会话的中继：两个方向各加时延，并按概率丢弃数据报"""
+
+    def __init__(self, target, loss, delay, rng):
+        self.loss = loss
+        self.rng = rng
+        self.dropped = 0
+        self.front = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.front.bind(('127.0.0.1', 0))
+        self.back = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.address = self.front.getsockname()
+        self.client = None
+        self.to_server = DelayLine(delay, lambda data: self.back.sendto(data, target))
+        self.to_client = DelayLine(delay, lambda data: self.front.sendto(data, self.client))
+        self.closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self.closed:
+            readable, _, _ = select.select([self.front, self.back], [], [], 0.1)
+            for sock in readable:
+                try:
+                    data, address = sock.recvfrom(65535)
+                except OSError:
+                    continue
+                if self.rng.random() < self.loss:
+                    self.dropped += 1
+                    continue
+                if sock is self.front:
+                    self.client = address
+                    self.to_server.put(data)
+                else:
+                    self.to_client.put(data)
+
+    def close(self):
+        self.closed = True
+        self._thread.join(timeout=1)
+        self.to_server.close()
+        self.to_client.close()
+        self.front.close()
+        self.back.close()
+
+
+class LossyTCPRelay:
+    """单个TCP连接的中继：两个方向各加时延，并按TCP的恢复行为模拟报文段丢失（见模块说明）"""
+
+    def __init__(self, target, loss, delay, rng):
+        self.target = target
+        self.loss = loss
+        self.delay = delay
+        self.rng = rng
+        self.dropped = 0
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.address = self.listener.getsockname()
+        self._sockets = []
+        self._lines = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _lost(self):
+        lost = self.rng.random() < self.loss
+        self.dropped += lost
+        return lost
+
+    def _run(self):
+        try:
+            client, _ = self.listener.accept()
+        except OSError:
+            return
+        # 三次握手：一个往返，SYN 或 SYN-ACK 丢失时按初始超时（每次加倍）重传
+        setup = 2 * self.delay
+        timeout = TCP_SYN_RTO
+        while self._lost() or self._lost():
+            setup += timeout
+            timeout *= 2
+        time.sleep(setup)
+        upstream = socket.create_connection(self.target)
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sockets = [client, upstream]
+        for source, destination in ((client, upstream), (upstream, client)):
+            line = DelayLine(self.delay, destination.sendall)
+            self._lines.append(line)
+            threading.Thread(target=self._pump, args=(source, line), daemon=True).start()
+
+    def _pump(self, source, line):
+        rto = 2 * self.delay + TCP_MIN_RTO
+        held = None  # 丢失的报文段及其后被挡住的数据
+        deadline = duplicates = 0
+        while True:
+            timeout = None if held is None else max(0.0, deadline - time.monotonic())
+            try:
+                readable, _, _ = select.select([source], [], [], timeout)
+                data = source.recv(TCP_MSS) if readable else None
+            except OSError:
+                data = b''
+            now = time.monotonic()
+            if data == b'':
+                for segment in held or ():
+                    line.put(segment)
+                return
+            if held is None:
+                if data is not None and self._lost():
+                    held, deadline, duplicates = [data], now + rto, 0
+                elif data is not None:
+                    line.put(data)
+                continue
+            if data is not None:
+                held.append(data)
+                duplicates += 1
+                if duplicates == TCP_DUPACK_THRESHOLD:
+                    # 第3个重复确认在一个往返后回到发送方，立即重传
+                    deadline = min(deadline, now + 2 * self.delay)
+            if now >= deadline:
+                if self._lost():
+                    deadline = now + rto * 2  # 重传也丢失：超时加倍
+                    continue
+                for segment in held:
+                    line.put(segment)
+                held = None
+
+    def close(self):
+        self.listener.close()
+        for sock in self._sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        for line in self._lines:
+            line.close()
+
+
+def run_once(transport, loss, delay, messages, interval, size, seed):
+    """
+    在一种传输方式与丢包率下建立连接、握手并发送 messages 条消息
+    Returns:
+        结果字典（连接耗时、延迟分位数、到达条数等）
+    """
+    rng = random.Random(seed)
+    if transport == 'tcp':
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        relay = LossyTCPRelay(server.getsockname(), loss, delay, rng)
+    else:
+        server = RUDPListener(0)
+        relay = LossyUDPRelay(('127.0.0.1', server.port), loss, delay, rng)
+
+    latencies = []
+    received = threading.Event()
+
+    def receive():
+        conn, _ = server.accept()
+        if receive_json(conn) is not None:
+            send_json(conn, {'type': 'handshake'})
+            while True:
+                message = receive_json(conn)
+                if message is None or message.get('type') == 'leave':
+                    break
+                latencies.append(time.perf_counter() - message['sent'])
+        received.set()
+        conn.close()
+        release_frame_reader(conn)
+
+    threading.Thread(target=receive, daemon=True).start()
+
+    started = time.perf_counter()
+    if transport == 'tcp':
+        client = socket.create_connection(relay.address)
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    else:
+        client = connect_rudp(relay.address)
+    send_json(client, {'type': 'handshake'})
+    receive_json(client)
+    connect_time = time.perf_counter() - started
+
+    text = 'x' * size
+    for _ in range(messages):
+        send_json(client, {'type': 'message', 'message': text, 'sent': time.perf_counter()})
+        time.sleep(interval)
+    send_json(client, {'type': 'leave'})
+    received.wait(timeout=60)
+
+    result = {
+        'transport': transport,
+        'loss': loss,
+        'delay_ms': delay * 1000,
+        'connect_ms': connect_time * 1000,
+        'delivered': len(latencies),
+        'messages': messages,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+        'dropped': relay.dropped
+    }
+    if transport == 'udp':
+        result['retransmits'] = client.stats()['retransmits']
+    client.close()
+    release_frame_reader(client)
+    relay.close()
+    server.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="点对点聊天传输方式对比（模拟丢包）")
+    parser.add_argument('--loss', default='0,0.01,0.05,0.1', help="丢包率列表，逗号分隔")
+    parser.add_argument('--delay', type=float, default=20.0, help="单向时延（毫秒）")
+    parser.add_argument('--messages', type=int, default=200, help="每轮发送的消息数")
+    parser.add_argument('--rate', type=float, default=50.0, help="每秒发送的消息数")
+    parser.add_argument('--size', type=int, default=200, help="消息正文字节数")
+    parser.add_argument('--seed', type=int, default=1, help="丢包随机数种子")
+    parser.add_argument('--output', default=None, help="把每轮结果以一行JSON追加到该文件")
+    args = parser.parse_args()
+
+    print(f"单向时延: {args.delay}ms，每轮 {args.messages} 条消息，{args.rate}/s，正文 {args.size} 字节")
+    print(f"{'丢包率':<8}{'传输':<6}{'连接(ms)':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}"
+          f"{'到达':>8}{'重传':>8}")
+    for loss in (float(value) for value in args.loss.split(',')):
+        for transport in ('tcp', 'udp'):
+            result = run_once(transport, loss, args.delay / 1000, args.messages, 1 / args.rate, args.size, args.seed)
+            print(f"{loss:<8.2%}{transport:<6}{result['connect_ms']:>10.1f}{result['p50_ms']:>10.1f}"
+                  f"{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}"
+                  f"{result['delivered']:>5}/{result['messages']:<3}{result.get('retransmits', '-'):>6}")
+            if args.output:
+                with open(args.output, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+
+if __name__ == "__main__":
+    main()
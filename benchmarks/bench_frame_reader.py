@@ -0,0 +1,80 @@
+"""
+帧读取基准测试
+对比旧版 recv(4) + bytearray 逐块拼接的读取方式与 FrameReader 的每条消息内存分配量。
+
+用法: python benchmarks/bench_frame_reader.py [消息数] [消息字节数]
+"""
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.p2pu.framing import FrameReader  # noqa: E402
+
+
+def legacy_read_frame(sock, buffer_size=4096):
+    """旧版 receive_json 的分帧逻辑（不含JSON解码）"""
+    length_bytes = sock.recv(4)
+    if not length_bytes:
+        return None
+    length = int.from_bytes(length_bytes, 'big')
+    received = bytearray()
+    while len(received) < length:
+        chunk = sock.recv(min(buffer_size, length - len(received)))
+        if not chunk:
+            break
+        received.extend(chunk)
+    return received
+
+
+def _feed(sock, blob):
+    sock.sendall(blob)
+
+
+def run(read_one, count, size):
+    """在socketpair上接收count条消息，返回(每条消息平均瞬时分配字节数, 每条消息平均耗时微秒)"""
+    payload = b'x' * size
+    blob = b''.join(len(payload).to_bytes(4, 'big') + payload for _ in range(count))
+    reader_sock, writer_sock = socket.socketpair()
+    writer = threading.Thread(target=_feed, args=(writer_sock, blob), daemon=True)
+    writer.start()
+
+    read = read_one(reader_sock)
+    total_transient = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(count):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        frame = read()
+        total_transient += tracemalloc.get_traced_memory()[1] - baseline
+        assert frame is not None and len(frame) == size
+        del frame
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+
+    writer.join()
+    reader_sock.close()
+    writer_sock.close()
+    return total_transient / count, elapsed / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+
+    legacy = run(lambda sock: lambda: legacy_read_frame(sock), count, size)
+    buffered = run(lambda sock: FrameReader(sock).read_frame, count, size)
+
+    print(f"消息数: {count}, 消息大小: {size} 字节")
+    print(f"{'实现':<16}{'分配字节/消息':>16}{'耗时 us/消息':>16}")
+    print(f"{'legacy recv':<16}{legacy[0]:>16.1f}{legacy[1]:>16.2f}")
+    print(f"{'FrameReader':<16}{buffered[0]:>16.1f}{buffered[1]:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+心跳时间轮基准测试
+向 HeartbeatMonitor 登记N个对端（到期时间均匀分散在一个心跳周期内），
+用模拟时钟推进若干个周期，统计每个tick的处理耗时，并与每个tick扫描全部对端的做法对比。
+
+用法: python benchmarks/bench_heartbeat.py [对端数] [周期数]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.p2pu.heartbeat import HeartbeatMonitor  # noqa: E402
+from src.config.settings import HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, HEARTBEAT_TICK  # noqa: E402
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    peers = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    periods = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    pings = []
+    monitor = HeartbeatMonitor(pings.append, lambda peer: None)
+
+    # 用模拟时钟登记：对端的加入时间均匀分布在一个心跳周期内
+    now = monitor._wheel._time
+    for peer in range(peers):
+        monitor._last_seen[peer] = now - HEARTBEAT_INTERVAL * peer / peers
+        monitor._wheel.schedule(peer, HEARTBEAT_INTERVAL * (peers - peer) / peers)
+
+    wheel_ticks = []
+    ticks = int(periods * HEARTBEAT_INTERVAL / HEARTBEAT_TICK)
+    for _ in range(ticks):
+        now += HEARTBEAT_TICK
+        # 一半的对端在每个tick内都有消息到达，只更新时间戳
+        for peer in range(0, peers, 2):
+            monitor._last_seen[peer] = now
+        started = time.perf_counter()
+        monitor.tick(now)
+        wheel_ticks.append(time.perf_counter() - started)
+
+    # 对照：每个tick遍历全部对端检查空闲时间
+    scan_ticks = []
+    last_seen = dict(monitor._last_seen)
+    for _ in range(min(ticks, 50)):
+        started = time.perf_counter()
+        sum(1 for seen in last_seen.values() if now - seen >= min(HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT))
+        scan_ticks.append(time.perf_counter() - started)
+
+    print(f"对端数: {peers}，tick: {HEARTBEAT_TICK}s，心跳周期: {HEARTBEAT_INTERVAL}s，发送ping: {len(pings)}")
+    print(f"{'方式':<10}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for label, values in (('时间轮', wheel_ticks), ('全量扫描', scan_ticks)):
+        print(f"{label:<10}{percentile(values, 0.5) * 1000:>10.3f}{percentile(values, 0.99) * 1000:>10.3f}"
+              f"{max(values) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+空闲成员容量基准测试
+分别启动各主机引擎（子进程），在回环地址上加入N个空闲成员，
+比较主机进程的常驻内存(RSS)、线程数和全部加入耗时。
+
+用法: python benchmarks/bench_idle_members.py [成员数] [引擎...]
+"""
+import socket
+import sys
+import time
+
+from hostproc import HostProcess
+
+
+def join_members(port, room_uid, count):
+    """加入count个空闲成员，返回socket列表"""
+    from src.p2pu import send_json, receive_json
+
+    members = []
+    for i in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        send_json(sock, {'type': 'join_room', 'uid': f'bench{i}', 'room_uid': room_uid, 'wire': 2})
+        response = receive_json(sock)
+        if not response or response.get('type') != 'join_success':
+            raise RuntimeError(f"第{i}个成员加入失败: {response}")
+        members.append(sock)
+    return members
+
+
+def run_engine(engine, count):
+    host = HostProcess(engine)
+    idle_rss, idle_threads, _ = host.measure()
+    started = time.perf_counter()
+    members = join_members(host.port, host.room_uid, count)
+    join_seconds = time.perf_counter() - started
+    # 等待主机端处理完成员加入广播
+    time.sleep(0.5)
+    rss, threads, joined = host.measure()
+
+    host.close()
+    for sock in members:
+        sock.close()
+
+    return {
+        'engine': engine,
+        'members': joined,
+        'rss_kb_idle': idle_rss,
+        'rss_kb_loaded': rss,
+        'rss_kb_per_member': (rss - idle_rss) / max(joined, 1),
+        'threads': threads,
+        'join_seconds': join_seconds,
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    engines = sys.argv[2:] or ['threaded', 'async', 'selectors']
+
+    print(f"{'引擎':<12}{'成员':>8}{'RSS(KB)':>12}{'KB/成员':>10}{'线程数':>8}{'加入耗时(s)':>14}")
+    for engine in engines:
+        result = run_engine(engine, count)
+        print(f"{result['engine']:<12}{result['members']:>8}{result['rss_kb_loaded']:>12}"
+              f"{result['rss_kb_per_member']:>10.1f}{result['threads']:>8}{result['join_seconds']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
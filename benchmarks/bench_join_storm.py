@@ -0,0 +1,115 @@
+"""
+加入风暴基准测试
+先建立若干个连上后一言不发的连接，再让N个客户端同时发起加入，
+统计全部收到 join_success 的耗时和单个加入的延迟分布。
+同一引擎分别以旧设置（listen(8)、30秒握手期限）和当前设置运行以作对比。
+
+用法: python benchmarks/bench_join_storm.py [加入数] [沉默连接数] [引擎...]
+"""
+import selectors
+import socket
+import sys
+import time
+
+from hostproc import HostProcess
+from src.p2pu import FrameReader, decode_json_frame, encode_json_frame
+from src.p2pu.core_utils import WIRE_LEGACY
+
+STORM_TIMEOUT = 60
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def join_storm(port, room_uid, count):
+    """单线程非阻塞地同时发起count个加入，返回(总耗时, 延迟列表, 失败数)"""
+    selector = selectors.DefaultSelector()
+    started = time.perf_counter()
+    for i in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.connect_ex(('127.0.0.1', port))
+        frame = encode_json_frame({'type': 'join_room', 'uid': f'storm{i}', 'room_uid': room_uid, 'wire': 2},
+                                  WIRE_LEGACY)
+        selector.register(sock, selectors.EVENT_WRITE, [frame, FrameReader(sock), time.perf_counter()])
+
+    latencies = []
+    failed = 0
+    deadline = started + STORM_TIMEOUT
+    members = []
+    while len(latencies) + failed < count and time.perf_counter() < deadline:
+        for key, mask in selector.select(1.0):
+            sock = key.fileobj
+            state = key.data
+            try:
+                if mask & selectors.EVENT_WRITE:
+                    sock.sendall(state[0])
+                    selector.modify(sock, selectors.EVENT_READ, state)
+                    continue
+                if not state[1].fill():
+                    raise ConnectionError("连接被关闭")
+                frame = state[1].next_frame()
+                if frame is None:
+                    continue
+                reply = decode_json_frame(frame)
+                selector.unregister(sock)
+                if reply and reply.get('type') == 'join_success':
+                    latencies.append(time.perf_counter() - state[2])
+                    members.append(sock)
+                else:
+                    failed += 1
+                    sock.close()
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                failed += 1
+                selector.unregister(sock)
+                sock.close()
+
+    total = time.perf_counter() - started
+    failed = count - len(latencies)
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+    for sock in members:
+        sock.close()
+    selector.close()
+    return total, latencies, failed
+
+
+def run(engine, count, silent, attributes):
+    host = HostProcess(engine, **attributes)
+    # 沉默连接：连上后不发送握手
+    idle = [socket.create_connection(('127.0.0.1', host.port)) for _ in range(silent)]
+    time.sleep(0.1)
+    total, latencies, failed = join_storm(host.port, host.room_uid, count)
+    host.close()
+    for sock in idle:
+        sock.close()
+    return total, latencies, failed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    silent = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    engines = sys.argv[3:] or ['threaded']
+
+    configurations = [
+        ('旧设置', {'listen_backlog': 8, 'handshake_timeout': 30}),
+        ('当前设置', {}),
+    ]
+
+    print(f"同时加入: {count}，沉默连接: {silent}")
+    print(f"{'引擎':<12}{'配置':<10}{'总耗时(s)':>12}{'p50(ms)':>10}{'p99(ms)':>10}{'失败':>6}")
+    for engine in engines:
+        for label, attributes in configurations:
+            total, latencies, failed = run(engine, count, silent, attributes)
+            print(f"{engine:<12}{label:<10}{total:>12.2f}{percentile(latencies, 0.5) * 1000:>10.1f}"
+                  f"{percentile(latencies, 0.99) * 1000:>10.1f}{failed:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+运行时统计开销基准测试
+1. 进程内热路径：对M个成员的聊天室反复调用 _handle_message（入站计数 + 广播扇出），
+   比较开启与关闭统计时每条消息的耗时，两种模式交替运行多轮取中位数以减小噪声。
+2. 端到端：在子进程中运行主机，经回环连接测量送达吞吐（METRICS_ENABLED 开/关）。
+
+用法: python benchmarks/bench_metrics.py [成员数] [消息数] [轮数]
+"""
+import statistics
+import sys
+import time
+
+from hostproc import UNLIMITED
+from bench_workers import run
+import src.config.settings as settings
+
+for _name, _value in UNLIMITED.items():
+    setattr(settings, _name, _value)
+
+from src.room.room_host import ChatRoomHost  # noqa: E402
+from src.room.metrics import HostMetrics  # noqa: E402
+
+
+class _StubQueue:
+    """只接收帧、不写socket的发送队列，测得的是纯CPU开销（统计开销的占比因此最大）"""
+
+    def put(self, frame, priority=None):
+        return True
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {'bytes': 0}
+
+
+def build_host(members, metrics_enabled):
+    host = ChatRoomHost(0)
+    host.metrics = HostMetrics(metrics_enabled)
+    host.search_indexer.add = lambda index, message_data: None  # 检索索引不在本测试范围内
+    room = host.rooms.get(host.create_room('bench'))
+    for i in range(members):
+        client = object()
+        client_info = {'uid': f'bench{i}', 'address': ('127.0.0.1', i), 'wire': 2, 'room': room,
+                       'queue': _StubQueue(), 'rate_limiter': host.rooms.get(room.room_uid).rate_limiter}
+        host.clients.add(client, client_info)
+        room.members.add(client, client_info)
+    sender = next(iter(host.clients.snapshot()))[0]
+    client_info = host.clients.get(sender)
+    client_info['rate_limiter'] = type(room.rate_limiter)(shared=False)
+    return host, sender
+
+
+def time_messages(host, sender, messages):
+    message = {'type': 'message', 'message': 'x' * 64}
+    started = time.perf_counter()
+    for _ in range(messages):
+        host._handle_message(sender, 'bench0', message, 96)
+    return (time.perf_counter() - started) / messages
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 7
+
+    hosts = {enabled: build_host(members, enabled) for enabled in (False, True)}
+    samples = {False: [], True: []}
+    for _ in range(rounds):
+        for enabled, (host, sender) in hosts.items():
+            samples[enabled].append(time_messages(host, sender, messages))
+    off, on = statistics.median(samples[False]), statistics.median(samples[True])
+    print(f"进程内热路径: 成员 {members}，每轮 {messages} 条，{rounds} 轮取中位数")
+    print(f"  关闭统计 {off * 1e6:.2f} us/条，开启统计 {on * 1e6:.2f} us/条，开销 {(on - off) / off * 100:+.2f}%")
+
+    print(f"端到端 (回环，成员 {members}，4个发送方，{rounds} 轮交替取中位数):")
+    for engine in ('threaded', 'selectors'):
+        throughput = {False: [], True: []}
+        for _ in range(rounds):
+            for enabled in (False, True):
+                elapsed, delivered = run(engine, 1, members, messages // 25, 4, {'METRICS_ENABLED': enabled})
+                throughput[enabled].append(delivered / elapsed)
+        off, on = statistics.median(throughput[False]), statistics.median(throughput[True])
+        print(f"  {engine:<10} 关闭统计 {off:>8.0f} 条/秒，开启统计 {on:>8.0f} 条/秒，开销 {(off - on) / off * 100:+.2f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+聊天记录检索基准测试
+向 SearchIndex 写入N条随机中英文消息，统计索引吞吐、索引内存，
+并对比倒排索引查询与逐条线性扫描的延迟。
+
+用法: python benchmarks/bench_search_index.py [消息数] [查询数]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.room.search_index import SearchIndex  # noqa: E402
+
+# 常用汉字与英文单词，组合出接近真实聊天的文本
+HANZI = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处府研质"
+WORDS = "hello world python server latency chat room network weekend coffee meeting deploy release bug fix".split()
+
+
+def random_message(rng):
+    parts = []
+    for _ in range(rng.randint(2, 6)):
+        if rng.random() < 0.7:
+            parts.append(''.join(rng.choice(HANZI) for _ in range(rng.randint(2, 8))))
+        else:
+            parts.append(rng.choice(WORDS))
+    return ' '.join(parts)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(1)
+    messages = [random_message(rng) for _ in range(count)]
+
+    tracemalloc.start()
+    index = SearchIndex(max_documents=count)
+    started = time.perf_counter()
+    for i, text in enumerate(messages):
+        index.add({'message': text, 'sender': f'user{i % 50}', 'timestamp': '12:00:00'})
+    add_seconds = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # 查询词取自已有消息的片段，保证有命中
+    terms = []
+    for _ in range(queries):
+        text = rng.choice(messages).replace(' ', '')
+        start = rng.randrange(max(len(text) - 3, 1))
+        terms.append(text[start:start + 3])
+
+    indexed, linear = [], []
+    for term in terms:
+        started = time.perf_counter()
+        index.search(term)
+        indexed.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        results = []
+        for text in reversed(messages):
+            if term in text:
+                results.append(text)
+                if len(results) > 20:
+                    break
+        linear.append(time.perf_counter() - started)
+
+    stats = index.stats()
+    print(f"消息数: {count}，索引耗时: {add_seconds:.2f}s ({count / add_seconds:.0f} 条/秒)")
+    print(f"索引内存: {memory / 1024 / 1024:.1f} MB，词元: {stats['tokens']}，倒排项: {stats['postings']}")
+    print(f"{'方式':<10}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for label, values in (('倒排索引', indexed), ('线性扫描', linear)):
+        print(f"{label:<10}{percentile(values, 0.5) * 1000:>10.3f}{percentile(values, 0.99) * 1000:>10.3f}"
+              f"{max(values) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+关闭与集体掉线基准测试
+1. 集体掉线：N个成员同时断开，统计留下的观察者收到的离开通知条数与发出的总帧数，
+   比较逐个通知（PRESENCE_BATCH_INTERVAL=0）与合并通知。
+2. 停止托管：N个成员在线时调用 stop_hosting，统计耗时以及每个成员在关闭通知之外
+   收到的多余帧数（逐个广播离开通知时为O(N)）。
+
+用法: python benchmarks/bench_shutdown.py [成员数] [观察者数]
+"""
+import contextlib
+import io
+import socket
+import sys
+import time
+
+from bench_workers import join
+from hostproc import UNLIMITED
+import src.config.settings as settings
+
+for _name, _value in UNLIMITED.items():
+    setattr(settings, _name, _value)
+
+from src.p2pu import FrameReader, decode_json_frame  # noqa: E402
+from src.room.room_host import HOST_ENGINES, create_host  # noqa: E402
+
+
+def drain(sock, timeout=0.3):
+    """读取并返回当前已到达的所有消息"""
+    sock.settimeout(timeout)
+    reader = FrameReader(sock)
+    messages = []
+    while True:
+        try:
+            if not reader.fill():
+                break
+        except (socket.timeout, BlockingIOError, OSError):
+            break
+        messages.extend(decode_json_frame(payload) for payload in reader.frames())
+    return messages
+
+
+def start_host(engine, members, batch_interval):
+    host = create_host(engine, 0)
+    host.presence.interval = batch_interval
+    room_uid = host.create_room('bench')
+    host.start_hosting(interactive=False)
+    socks = [join(host.port, room_uid, f'bench{i}') for i in range(members)]
+    time.sleep(0.5)
+    for sock in socks:
+        drain(sock, 0.01)
+    return host, socks
+
+
+def mass_disconnect(engine, members, observers, batch_interval):
+    """返回 (每个观察者收到的系统通知条数, 主机发出的帧数)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        host, socks = start_host(engine, members + observers, batch_interval)
+        sent_before = host.metrics.messages_out.value
+        for sock in socks[observers:]:
+            sock.close()
+        time.sleep(1.0)
+        notices = [sum(1 for message in drain(sock) if message.get('type') == 'system')
+                   for sock in socks[:observers]]
+        sent = host.metrics.messages_out.value - sent_before
+        for sock in socks[:observers]:
+            sock.close()
+        host.stop_hosting()
+    return sum(notices) / len(notices), sent
+
+
+def shutdown(engine, members):
+    """返回 (stop_hosting 耗时, 每个成员收到的帧数平均值)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        host, socks = start_host(engine, members, settings.PRESENCE_BATCH_INTERVAL)
+        started = time.perf_counter()
+        host.stop_hosting()
+        elapsed = time.perf_counter() - started
+        received = [len(drain(sock, 1.0)) for sock in socks]
+        for sock in socks:
+            sock.close()
+    return elapsed, sum(received) / len(received)
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    observers = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"集体掉线: {members} 人同时断开，{observers} 名观察者")
+    print(f"{'引擎':<12}{'合并间隔(s)':>12}{'观察者收到通知':>16}{'主机发出帧数':>14}")
+    for engine in HOST_ENGINES:
+        for interval in (0, settings.PRESENCE_BATCH_INTERVAL):
+            notices, sent = mass_disconnect(engine, members, observers, interval)
+            print(f"{engine:<12}{interval:>12}{notices:>16.1f}{sent:>14}")
+
+    print(f"\n停止托管: {members} 名成员在线")
+    print(f"{'引擎':<12}{'耗时(s)':>10}{'每人收到帧数':>14}")
+    for engine in HOST_ENGINES:
+        elapsed, frames = shutdown(engine, members)
+        print(f"{engine:<12}{elapsed:>10.3f}{frames:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
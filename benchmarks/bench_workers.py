@@ -0,0 +1,104 @@
+"""
+多进程主机吞吐基准测试
+同一聊天室的成员由内核分配到各工作进程上，多个发送方同时发送，
+统计全部成员收齐所有消息的耗时与每秒送达的消息数，比较不同工作进程数。
+多进程模式只有在多核机器上才能体现出优势。
+
+用法: python benchmarks/bench_workers.py [成员数] [每个发送方的消息数] [发送方数] [工作进程数...]
+"""
+import selectors
+import socket
+import sys
+import time
+
+from hostproc import HostProcess
+from src.p2pu import FrameReader, decode_json_frame, encode_json_frame, receive_json, send_json
+from src.p2pu.core_utils import WIRE_V2
+
+DELIVERY_TIMEOUT = 120
+
+
+def join(port, room_uid, uid):
+    sock = socket.create_connection(('127.0.0.1', port))
+    send_json(sock, {'type': 'join_room', 'uid': uid, 'room_uid': room_uid, 'wire': 2})
+    reply = receive_json(sock)
+    if not reply or reply.get('type') != 'join_success':
+        raise RuntimeError(f"{uid} 加入失败: {reply}")
+    return sock
+
+
+def run(engine, workers, members, messages, senders, settings=None):
+    """返回 (耗时, 送达消息数)"""
+    host = HostProcess(engine, workers, settings)
+    socks = [join(host.port, host.room_uid, f'bench{i}') for i in range(members)]
+    # 等待加入通知全部送达后再开始计时
+    time.sleep(1)
+
+    selector = selectors.DefaultSelector()
+    received = {}
+    for sock in socks:
+        sock.setblocking(False)
+        reader = FrameReader(sock)
+        while True:
+            try:
+                if not reader.fill():
+                    break
+            except BlockingIOError:
+                break
+            for _ in reader.frames():
+                pass
+        received[sock] = 0
+        selector.register(sock, selectors.EVENT_READ, reader)
+
+    frame = encode_json_frame({'type': 'message', 'message': 'x' * 64}, WIRE_V2)
+    expected = messages * senders
+    started = time.perf_counter()
+    for i in range(messages):
+        for sender in socks[:senders]:
+            sender.setblocking(True)
+            sender.sendall(frame)
+            sender.setblocking(False)
+
+    deadline = started + DELIVERY_TIMEOUT
+    done = 0
+    while done < members and time.perf_counter() < deadline:
+        for key, _ in selector.select(1.0):
+            sock, reader = key.fileobj, key.data
+            try:
+                if not reader.fill():
+                    selector.unregister(sock)
+                    done += 1
+                    continue
+            except BlockingIOError:
+                continue
+            for payload in reader.frames():
+                if decode_json_frame(payload).get('type') == 'message':
+                    received[sock] += 1
+            if received[sock] >= expected:
+                selector.unregister(sock)
+                done += 1
+    elapsed = time.perf_counter() - started
+
+    host.close()
+    for sock in socks:
+        sock.close()
+    selector.close()
+    return elapsed, sum(received.values())
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    senders = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    worker_counts = [int(v) for v in sys.argv[4:]] or [1, 4]
+
+    print(f"成员: {members}，发送方: {senders}，每个发送方消息数: {messages}")
+    print(f"{'引擎':<12}{'工作进程':>8}{'耗时(s)':>10}{'送达':>10}{'送达/秒':>12}")
+    for engine in ('threaded', 'selectors'):
+        for workers in worker_counts:
+            elapsed, delivered = run(engine, workers, members, messages, senders)
+            print(f"{engine:<12}{workers:>8}{elapsed:>10.2f}{delivered:>10}{delivered / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+主机联邦回环拓扑测试
+在本进程中启动N台主机（依次使用各主机引擎），联邦端口和聊天端口都由系统分配，
+第一台主机创建聊天室，其余主机经 link_host 加入同一房间ID，按拓扑互联：
+    line  链状 0-1-2-...，只有一条路径
+    ring  环状，首尾相连，每条消息经两条路径到达
+    mesh  两两互联，重复到达最多
+每台主机上的成员各发送若干条消息，检查每个成员恰好收到每条消息一次，
+并输出各主机丢弃的重复消息数与送达耗时。
+
+用法: python benchmarks/federation_topology.py [主机数] [每台主机的成员数] [每个成员的消息数] [拓扑]
+"""
+import contextlib
+import io
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hostproc import UNLIMITED  # noqa: E402
+import src.config.settings as settings  # noqa: E402
+
+for _name, _value in UNLIMITED.items():
+    setattr(settings, _name, _value)
+
+from src.p2pu import receive_json, send_json  # noqa: E402
+from src.room.room_host import HOST_ENGINES, create_host  # noqa: E402
+
+DELIVERY_TIMEOUT = 30
+
+
+def topology_edges(count, topology):
+    if topology == 'mesh':
+        return [(a, b) for a in range(count) for b in range(a + 1, count)]
+    edges = [(i, i + 1) for i in range(count - 1)]
+    if topology == 'ring' and count > 2:
+        edges.append((count - 1, 0))
+    return edges
+
+
+def join(port, room_uid, uid):
+    sock = socket.create_connection(('127.0.0.1', port))
+    send_json(sock, {'type': 'join_room', 'uid': uid, 'room_uid': room_uid, 'wire': 2})
+    reply = receive_json(sock)
+    if not reply or reply.get('type') != 'join_success':
+        raise RuntimeError(f"{uid} 加入失败: {reply}")
+    return sock
+
+
+def collect(sock, expected, received):
+    """读取聊天消息直到收齐或超时"""
+    sock.settimeout(DELIVERY_TIMEOUT)
+    while sum(received.values()) < expected:
+        message = receive_json(sock)
+        if not message:
+            break
+        if message.get('type') == 'message':
+            text = message['message']
+            received[text] = received.get(text, 0) + 1
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    members = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    messages = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    topology = sys.argv[4] if len(sys.argv) > 4 else 'ring'
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        hosts = []
+        for index in range(count):
+            host = create_host(HOST_ENGINES[index % len(HOST_ENGINES)], 0)
+            host.uid = f"fed{index}"  # 同一目录下的主机共用 .uid，这里区分开
+            host.enable_federation(0, secret='federation-topology')
+            hosts.append(host)
+        room_uid = hosts[0].create_room('federated')
+        hosts[0].share_room(room_uid)
+        for host in hosts:
+            if not host.start_hosting(interactive=False):
+                raise RuntimeError("主机启动失败")
+
+        # 按拓扑互联：每条边由编号较大的一方发起，它从对方获知聊天室名称并创建同一房间ID
+        edges = topology_edges(count, topology)
+        for a, b in sorted(edges, key=lambda edge: max(edge)):
+            source, target = (b, a) if b > a else (a, b)
+            if not hosts[source].link_host('127.0.0.1', hosts[target].federation.port, room_uid):
+                raise RuntimeError(f"主机 {source} 无法连接主机 {target}")
+
+        clients = [(index, join(host.port, room_uid, f"h{index}c{i}"))
+                   for index, host in enumerate(hosts) for i in range(members)]
+        time.sleep(0.5)  # 等待加入通知送达
+
+        expected = count * members * messages
+        results = [{} for _ in clients]
+        readers = [threading.Thread(target=collect, args=(sock, expected, results[i]), daemon=True)
+                   for i, (_, sock) in enumerate(clients)]
+        for reader in readers:
+            reader.start()
+
+        started = time.perf_counter()
+        for n in range(messages):
+            for index, sock in clients:
+                send_json(sock, {'type': 'message', 'message': f"{sock.getsockname()[1]}-{n}"}, 2)
+        for reader in readers:
+            reader.join(DELIVERY_TIMEOUT)
+        elapsed = time.perf_counter() - started
+        stats = [host.get_federation_stats() for host in hosts]
+
+        for _, sock in clients:
+            sock.close()
+        for host in hosts:
+            host.stop_hosting()
+
+    missing = sum(expected - len(result) for result in results)
+    repeated = sum(times - 1 for result in results for times in result.values())
+    print(f"拓扑: {topology}，主机: {count} ({', '.join(HOST_ENGINES[i % len(HOST_ENGINES)] for i in range(count))})，"
+          f"联邦连接: {len(edges)}，成员: {len(clients)}，消息: {expected}")
+    print(f"{'主机':<8}{'连接':>6}{'转发出':>10}{'收到':>10}{'丢弃重复':>10}")
+    for index, item in enumerate(stats):
+        print(f"{index:<8}{len(item['links']):>6}{item['published']:>10}{item['delivered']:>10}{item['duplicates']:>10}")
+    print(f"全部送达耗时: {elapsed:.2f}s，缺失: {missing}，成员收到重复: {repeated}")
+    print("通过" if missing == 0 and repeated == 0 else "失败")
+    return 0 if missing == 0 and repeated == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+基准测试公用：在子进程中运行聊天室主机
+父进程通过子进程的stdin发送命令，从stdout读取结果；主机自身的输出被丢弃。
+
+settings 参数中的配置项在导入主机模块之前写入 src.config.settings，
+经环境变量传递，多进程模式下的工作进程（spawn）导入本模块时同样生效。
+
+子进程命令:
+    measure  -> "<RSS KB> <线程数> <成员数>"
+    quit     -> 立即退出
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SETTINGS_ENV = 'TRANSITCHAT_BENCH_SETTINGS'
+if os.environ.get(SETTINGS_ENV):
+    import src.config.settings as _settings
+    for _name, _value in json.loads(os.environ[SETTINGS_ENV]).items():
+        setattr(_settings, _name, _value)
+
+# 基准测试由少数连接高速发送，关闭入站限流
+UNLIMITED = {'RATE_LIMIT_MESSAGES': 0, 'RATE_LIMIT_BYTES': 0,
+             'ROOM_RATE_LIMIT_MESSAGES': 0, 'ROOM_RATE_LIMIT_BYTES': 0}
+
+
+def read_rss_kb():
+    """读取当前进程的常驻内存(KB)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class HostProcess:
+    """子进程中的主机句柄"""
+
+    def __init__(self, engine='threaded', workers=1, settings=None, **attributes):
+        env = dict(os.environ)
+        env[SETTINGS_ENV] = json.dumps(dict(UNLIMITED, **(settings or {})))
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), engine, json.dumps(attributes), str(workers)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            cwd=tempfile.gettempdir(), env=env
+        )
+        line = self.process.stdout.readline().split()
+        if len(line) != 2:
+            raise RuntimeError("主机进程启动失败")
+        self.port = int(line[0])
+        self.room_uid = line[1]
+
+    def command(self, name):
+        self.process.stdin.write(name + "\n")
+        self.process.stdin.flush()
+        return self.process.stdout.readline().split()
+
+    def measure(self):
+        """返回 (RSS KB, 线程数, 成员数)"""
+        return [int(v) for v in self.command('measure')]
+
+    def close(self):
+        try:
+            self.process.stdin.write("quit\n")
+            self.process.stdin.flush()
+        except OSError:
+            pass
+        self.process.wait(timeout=30)
+
+
+def host_main(engine, attributes, workers=1):
+    """子进程入口"""
+    from src.room import create_host
+
+    # 控制通道改用复制出的描述符，标准输出（含多进程模式下工作进程继承的）全部丢弃
+    control = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+    host = create_host(engine, 0, workers)
+    for name, value in attributes.items():
+        setattr(host, name, value)
+    host.create_room('bench')
+    if not host.start_hosting(interactive=False):
+        control.write("error\n")
+        control.flush()
+        return
+
+    control.write(f"{host.port} {host.room_uid}\n")
+    control.flush()
+    for line in sys.stdin:
+        command = line.strip()
+        if command == 'measure':
+            control.write(f"{read_rss_kb()} {threading.active_count()} {len(host.clients)}\n")
+            control.flush()
+        elif command == 'quit':
+            break
+    if workers > 1:
+        host.stop_hosting()
+    # 只关心测量结果，直接退出，不走逐个通知成员的关闭流程
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    host_main(sys.argv[1], json.loads(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 1)
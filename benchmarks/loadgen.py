@@ -0,0 +1,335 @@
+"""
+聊天室主机负载生成器
+在子进程中启动主机（hostproc），由若干负载进程在回环地址上建立N个按 ChatRoomClient 协议
+加入的成员连接，其中一部分成员按给定的总速率和消息大小分布持续发送，所有成员统计送达延迟。
+
+延迟为发送时刻到每个成员收到该消息的时间（扇出延迟），用系统范围的单调时钟测量，
+发送时刻写在消息正文开头。主机进程（含多进程模式下的工作进程）的CPU和RSS从 /proc 读取。
+结果以JSON输出（--output 追加为一行），附带当前提交，便于跨提交比较。
+
+用法: python benchmarks/loadgen.py --engine selectors --clients 200 --senders 20 --rate 500 \\
+          --duration 10 --sizes 64:0.7,512:0.25,4096:0.05 [--workers 2] [--output runs.jsonl]
+"""
+import argparse
+import array
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from hostproc import HostProcess, ROOT
+from src.p2pu import FrameReader, decode_json_frame, encode_json_frame, receive_json, send_json
+from src.p2pu.core_utils import WIRE_V2
+
+SETTLE_SECONDS = 1.0    # 全部成员加入后等待加入通知送达
+DRAIN_IDLE = 1.0        # 发送结束后连续多久没有新消息即停止接收
+DRAIN_TIMEOUT = 10.0    # 发送结束后最多再接收多久
+SAMPLE_INTERVAL = 0.5   # 主机CPU/RSS的采样间隔
+
+
+def parse_size_mix(text):
+    """
+    解析消息大小分布 "64:0.7,512:0.3"
+    Returns:
+        ([大小], [权重])
+    """
+    sizes, weights = [], []
+    for item in text.split(','):
+        size, _, weight = item.partition(':')
+        sizes.append(int(size))
+        weights.append(float(weight or 1))
+    return sizes, weights
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _clock_ticks():
+    try:
+        return os.sysconf('SC_CLK_TCK')
+    except (AttributeError, ValueError, OSError):
+        return 100
+
+
+def process_tree_usage(pid):
+    """
+    读取进程及其所有子进程的CPU时间与RSS（仅Linux，读取失败时为None）
+    Returns:
+        (CPU秒数, RSS KB)
+    """
+    cpu, rss = 0.0, 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f'/proc/{current}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / _clock_ticks()
+            rss += int(fields[21]) * resource.getpagesize() // 1024
+            try:
+                with open(f'/proc/{current}/task/{current}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+    except (OSError, IndexError, ValueError):
+        return None, None
+    return cpu, rss
+
+
+def join(port, room_uid, uid):
+    """按 ChatRoomClient 的握手加入聊天室（不声明心跳，主机不会发送ping）"""
+    sock = socket.create_connection(('127.0.0.1', port))
+    send_json(sock, {'type': 'join_room', 'uid': uid, 'room_uid': room_uid, 'wire': WIRE_V2})
+    reply = receive_json(sock)
+    if not reply or reply.get('type') != 'join_success':
+        raise RuntimeError(f"{uid} 加入失败: {reply}")
+    return sock
+
+
+def _send_loop(index, senders, rate, sizes, weights, start_at, duration, counters):
+    """按固定节拍（开环）发送：落后于节拍时立即补发，不因主机变慢而降低发送速率"""
+    rng = random.Random(index)
+    padding = 'x' * max(sizes)
+    interval = 1.0 / rate
+    sent = 0
+    max_lag = 0.0
+    end_at = start_at + duration
+    while True:
+        due = start_at + sent * interval
+        if due >= end_at:
+            break
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            max_lag = max(max_lag, -delay)
+        header = f"{index}:{sent}:{time.monotonic():.6f}|"
+        size = rng.choices(sizes, weights)[0]
+        frame = encode_json_frame({'type': 'message', 'message': header + padding[:max(0, size - len(header))]},
+                                  WIRE_V2)
+        try:
+            senders[sent % len(senders)].sendall(frame)
+        except OSError:
+            break
+        sent += 1
+    counters['sent'] = sent
+    counters['max_lag'] = max_lag
+
+
+def load_process(index, port, room_uid, clients, senders, rate, size_mix, duration, ready, go, results):
+    """负载进程：加入 clients 个成员，其中前 senders 个按 rate 发送，所有成员记录送达延迟"""
+    sizes, weights = parse_size_mix(size_mix)
+    socks = [join(port, room_uid, f'load{index}-{i}') for i in range(clients)]
+    ready.put(index)
+    start_at = go.get()
+
+    selector = selectors.DefaultSelector()
+    for sock in socks:
+        selector.register(sock, selectors.EVENT_READ, FrameReader(sock, 64 * 1024))
+
+    counters = {'sent': 0, 'max_lag': 0.0}
+    sender_thread = None
+    if senders and rate > 0:
+        sender_thread = threading.Thread(
+            target=_send_loop,
+            args=(index, socks[:senders], rate, sizes, weights, start_at, duration, counters),
+            daemon=True
+        )
+        sender_thread.start()
+
+    latencies = array.array('d')
+    delivered = 0
+    send_end = start_at + duration
+    last_delivery = time.monotonic()
+    while True:
+        now = time.monotonic()
+        if now > send_end and (now - last_delivery > DRAIN_IDLE or now > send_end + DRAIN_TIMEOUT):
+            break
+        for key, _ in selector.select(0.2):
+            reader = key.data
+            try:
+                if not reader.fill():
+                    selector.unregister(key.fileobj)
+                    continue
+            except OSError:
+                selector.unregister(key.fileobj)
+                continue
+            now = time.monotonic()
+            for payload in reader.frames():
+                message = decode_json_frame(payload)
+                if not message or message.get('type') != 'message':
+                    continue
+                header = message.get('message', '').partition('|')[0]
+                if header.count(':') != 2:
+                    continue
+                sent_at = float(header.rsplit(':', 1)[1])
+                if sent_at >= start_at:
+                    latencies.append(now - sent_at)
+                    delivered += 1
+                    last_delivery = now
+
+    if sender_thread is not None:
+        sender_thread.join()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    results.put({
+        'index': index,
+        'sent': counters['sent'],
+        'max_send_lag': counters['max_lag'],
+        'delivered': delivered,
+        'latencies': latencies.tobytes(),
+        'cpu_seconds': usage.ru_utime + usage.ru_stime
+    })
+    for sock in socks:
+        sock.close()
+
+
+def _split(total, parts):
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_load(engine='threaded', workers=1, clients=100, senders=10, rate=200.0, duration=10.0,
+             sizes='64:0.7,512:0.25,4096:0.05', processes=2, settings=None):
+    """
+    运行一次负载测试
+    Returns:
+        可直接序列化为JSON的结果
+    """
+    processes = max(1, min(processes, clients))
+    senders = min(senders, clients)
+    host = HostProcess(engine, workers, settings)
+    context = multiprocessing.get_context('spawn')
+    ready, go, results = context.Queue(), context.Queue(), context.Queue()
+    client_split = _split(clients, processes)
+    sender_split = [min(count, share) for count, share in zip(client_split, _split(senders, processes))]
+    loaders = []
+    for index in range(processes):
+        process_rate = rate * sender_split[index] / senders if senders else 0.0
+        process = context.Process(target=load_process, args=(
+            index, host.port, host.room_uid, client_split[index], sender_split[index], process_rate, sizes,
+            duration, ready, go, results
+        ), daemon=True)
+        process.start()
+        loaders.append(process)
+
+    try:
+        for _ in loaders:
+            ready.get(timeout=120)
+        time.sleep(SETTLE_SECONDS)
+
+        cpu_before, rss_before = process_tree_usage(host.process.pid)
+        start_at = time.monotonic() + 0.2
+        for _ in loaders:
+            go.put(start_at)
+
+        peak_rss = rss_before or 0
+        while time.monotonic() < start_at + duration:
+            time.sleep(SAMPLE_INTERVAL)
+            _, rss = process_tree_usage(host.process.pid)
+            peak_rss = max(peak_rss, rss or 0)
+        cpu_after, rss_after = process_tree_usage(host.process.pid)
+        elapsed = time.monotonic() - start_at
+
+        replies = [results.get(timeout=duration + DRAIN_TIMEOUT + 60) for _ in loaders]
+    finally:
+        for process in loaders:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        host.close()
+
+    latencies = array.array('d')
+    for reply in replies:
+        latencies.frombytes(reply['latencies'])
+    ordered = sorted(latencies)
+    sent = sum(reply['sent'] for reply in replies)
+    delivered = sum(reply['delivered'] for reply in replies)
+    host_cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        'benchmark': 'loadgen',
+        'commit': current_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'engine': engine, 'workers': workers, 'clients': clients, 'senders': senders,
+            'rate': rate, 'duration': duration, 'sizes': sizes, 'load_processes': processes,
+            'settings': settings or {}
+        },
+        'sent': sent,
+        'expected_deliveries': sent * clients,
+        'delivered': delivered,
+        'delivery_ratio': delivered / (sent * clients) if sent and clients else 0.0,
+        'sent_per_second': sent / duration,
+        'delivered_per_second': delivered / duration,
+        'max_send_lag_ms': max((reply['max_send_lag'] for reply in replies), default=0.0) * 1000,
+        'latency_ms': {
+            'p50': percentile(ordered, 0.5) * 1000,
+            'p99': percentile(ordered, 0.99) * 1000,
+            'p999': percentile(ordered, 0.999) * 1000,
+            'max': (ordered[-1] if ordered else 0.0) * 1000,
+            'mean': (sum(ordered) / len(ordered) if ordered else 0.0) * 1000
+        },
+        'host': {
+            'cpu_seconds': host_cpu,
+            'cpu_percent': host_cpu / elapsed * 100 if host_cpu is not None else None,
+            'rss_kb_before': rss_before,
+            'rss_kb_after': rss_after,
+            'rss_kb_peak': peak_rss or None
+        },
+        'loadgen_cpu_seconds': sum(reply['cpu_seconds'] for reply in replies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天室主机负载生成器")
+    parser.add_argument('--engine', default='threaded', choices=('threaded', 'async', 'selectors'))
+    parser.add_argument('--workers', type=int, default=1, help="主机工作进程数")
+    parser.add_argument('--clients', type=int, default=100, help="成员连接数")
+    parser.add_argument('--senders', type=int, default=10, help="其中发送消息的成员数")
+    parser.add_argument('--rate', type=float, default=200.0, help="所有发送方合计每秒消息数")
+    parser.add_argument('--duration', type=float, default=10.0, help="发送持续秒数")
+    parser.add_argument('--sizes', default='64:0.7,512:0.25,4096:0.05', help="消息大小分布 大小:权重,...")
+    parser.add_argument('--processes', type=int, default=2, help="负载进程数（分担成员连接的接收）")
+    parser.add_argument('--settings', default=None, help="覆盖主机配置项的JSON，如 '{\"WIRE_VERSION\": 1}'")
+    parser.add_argument('--output', default=None, help="把结果以一行JSON追加到该文件")
+    args = parser.parse_args()
+
+    result = run_load(args.engine, args.workers, args.clients, args.senders, args.rate, args.duration,
+                      args.sizes, args.processes, json.loads(args.settings) if args.settings else None)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    latency, host = result['latency_ms'], result['host']
+    print(f"{result['config']['engine']} x{result['config']['workers']}，{result['config']['clients']} 成员，"
+          f"发送 {result['sent_per_second']:.0f} 条/秒，送达 {result['delivered_per_second']:.0f} 条/秒 "
+          f"({result['delivery_ratio'] * 100:.1f}%)", file=sys.stderr)
+    print(f"扇出延迟 p50 {latency['p50']:.2f}ms，p99 {latency['p99']:.2f}ms，p999 {latency['p999']:.2f}ms，"
+          f"最大 {latency['max']:.2f}ms", file=sys.stderr)
+    if host['cpu_percent'] is not None:
+        print(f"主机 CPU {host['cpu_percent']:.0f}%，RSS 峰值 {host['rss_kb_peak']} KB", file=sys.stderr)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
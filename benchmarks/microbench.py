@@ -0,0 +1,246 @@
+"""
+线路与界面热路径微基准
+每个用例先校准循环次数（每轮约 --min-time 秒），重复 --repeat 轮取最快一轮计算每秒操作数；
+另用 tracemalloc 逐次测量每次操作的瞬时内存峰值与残留内存（分配情况）。
+
+用例:
+    send_receive_json_v1/v2_*   send_json + receive_json 经 socketpair 往返（旧格式/新格式，小/大消息）
+    create_room_uid
+    format_message_left/right
+    display_chat_message        标准输出重定向到空写入器
+    get_all_network_addresses   地址解析、公网IP查询和IPv6连通性检测替换为本地桩
+
+用法:
+    python benchmarks/microbench.py [--filter 名称片段] [--save baseline.json]
+    python benchmarks/microbench.py --baseline baseline.json [--threshold 10]
+与基线比较时输出各用例的变化百分比，每秒操作数下降超过阈值的用例记为退化，退出码为1。
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import socket
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.p2pu import create_room_uid, receive_json, send_json, set_wire_version  # noqa: E402
+from src.p2pu import ipv6_utils  # noqa: E402
+from src.p2pu.core_utils import WIRE_LEGACY, WIRE_V2  # noqa: E402
+from src.ui.display_utils import display_chat_message, format_message  # noqa: E402
+from src.config.settings import LEFT_ALIGN, RIGHT_ALIGN  # noqa: E402
+
+ALLOCATION_SAMPLES = 200  # 测量分配情况的操作次数
+
+
+class _NullWriter:
+    """丢弃所有输出的标准输出替身"""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+@contextlib.contextmanager
+def socket_roundtrip(wire_version, size):
+    """send_json 写入 socketpair 的一端，receive_json 从另一端读回"""
+    sender, receiver = socket.socketpair()
+    set_wire_version(sender, wire_version)
+    set_wire_version(receiver, wire_version)
+    message = {'type': 'message', 'message': 'x' * size, 'sender': 'bench', 'timestamp': '12:00:00'}
+
+    def op():
+        send_json(sender, message)
+        receive_json(receiver)
+
+    try:
+        yield op
+    finally:
+        sender.close()
+        receiver.close()
+
+
+@contextlib.contextmanager
+def plain(function, *args, **kwargs):
+    yield lambda: function(*args, **kwargs)
+
+
+@contextlib.contextmanager
+def display_redirected():
+    message = {'type': 'message', 'message': '你好，这是一条用于基准测试的消息', 'sender': 'bench',
+               'timestamp': '12:00:00'}
+    with contextlib.redirect_stdout(_NullWriter()):
+        yield lambda: display_chat_message(message)
+
+
+def _fake_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    """本地替身：固定返回两个IPv4和两个IPv6地址，不查询DNS"""
+    entries = []
+    if family in (0, socket.AF_INET):
+        entries += [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (ip, port or 0))
+                    for ip in ('192.168.1.20', '10.0.0.5')]
+    if family in (0, socket.AF_INET6):
+        entries += [(socket.AF_INET6, socket.SOCK_STREAM, 6, '', (ip, port or 0, 0, 0))
+                    for ip in ('2001:db8::20', '2408:8207:1234::5')]
+    return entries
+
+
+@contextlib.contextmanager
+def network_stubbed():
+    """替换网络调用：地址解析、公网IPv4查询（HTTP）和IPv6连通性检测（外连）"""
+    with mock.patch('socket.getaddrinfo', _fake_getaddrinfo), \
+            mock.patch.object(ipv6_utils, 'get_public_ipv4', lambda: '203.0.113.7'), \
+            mock.patch.object(ipv6_utils, 'check_ipv6_connectivity', lambda: True):
+        yield ipv6_utils.get_all_network_addresses
+
+
+CASES = {
+    'send_receive_json_v1_64B': lambda: socket_roundtrip(WIRE_LEGACY, 64),
+    'send_receive_json_v2_64B': lambda: socket_roundtrip(WIRE_V2, 64),
+    'send_receive_json_v1_4KB': lambda: socket_roundtrip(WIRE_LEGACY, 4096),
+    'send_receive_json_v2_4KB': lambda: socket_roundtrip(WIRE_V2, 4096),
+    'create_room_uid': lambda: plain(create_room_uid, 'MyChatRoom', 'a1b2c3d4'),
+    'format_message_left': lambda: plain(format_message, '你好，世界', LEFT_ALIGN, sender='bench',
+                                         timestamp='12:00:00'),
+    'format_message_right': lambda: plain(format_message, '你好，世界', RIGHT_ALIGN, timestamp='12:00:00'),
+    'display_chat_message': display_redirected,
+    'get_all_network_addresses': network_stubbed,
+}
+
+
+def measure_speed(op, min_time, repeat):
+    """
+    Returns:
+        (每秒操作数, 每轮循环次数)
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            op()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 4:
+            break
+        loops *= 4
+    loops = max(1, int(loops * min_time / max(elapsed, 1e-9)))
+
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            op()
+        best = min(best, time.perf_counter() - started)
+    return loops / best, loops
+
+
+def measure_allocations(op, samples=ALLOCATION_SAMPLES):
+    """
+    Returns:
+        (每次操作的平均瞬时峰值字节数, 每次操作的平均残留字节数)
+    """
+    op()  # 预热：首次调用的缓存、帧读取器等不计入
+    tracemalloc.start()
+    try:
+        peak_total = 0
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _ in range(samples):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            op()
+            peak_total += tracemalloc.get_traced_memory()[1] - current
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return peak_total / samples, retained / samples
+
+
+def run_suite(names, min_time, repeat):
+    results = {}
+    for name in names:
+        with CASES[name]() as op:
+            ops_per_second, loops = measure_speed(op, min_time, repeat)
+            peak_bytes, retained_bytes = measure_allocations(op)
+        results[name] = {
+            'ops_per_second': ops_per_second,
+            'ns_per_op': 1e9 / ops_per_second,
+            'loops': loops,
+            'alloc_peak_bytes_per_op': round(peak_bytes, 1),
+            'alloc_retained_bytes_per_op': round(retained_bytes, 2)
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns:
+        (每个用例的变化, 退化的用例名称列表)
+    """
+    deltas, regressions = {}, []
+    for name, item in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        speed = (item['ops_per_second'] / base['ops_per_second'] - 1) * 100
+        deltas[name] = {
+            'ops_per_second_pct': round(speed, 1),
+            'alloc_peak_bytes_delta': round(item['alloc_peak_bytes_per_op'] - base['alloc_peak_bytes_per_op'], 1)
+        }
+        if speed < -threshold:
+            regressions.append(name)
+    return deltas, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="线路与界面热路径微基准")
+    parser.add_argument('--filter', default='', help="只运行名称包含该片段的用例")
+    parser.add_argument('--min-time', type=float, default=0.2, help="每轮计时的最短秒数")
+    parser.add_argument('--repeat', type=int, default=5, help="计时轮数（取最快一轮）")
+    parser.add_argument('--save', default=None, help="把结果保存为基线JSON")
+    parser.add_argument('--baseline', default=None, help="与该基线JSON比较")
+    parser.add_argument('--threshold', type=float, default=10.0, help="每秒操作数下降超过该百分比记为退化")
+    parser.add_argument('--json', action='store_true', help="以JSON输出结果")
+    args = parser.parse_args()
+
+    names = [name for name in CASES if args.filter in name]
+    results = run_suite(names, args.min_time, args.repeat)
+    report = {
+        'benchmark': 'microbench',
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            report['deltas'], regressions = compare(results, json.load(f), args.threshold)
+        report['regressions'] = regressions
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        deltas = report.get('deltas', {})
+        print(f"{'用例':<30}{'ops/s':>14}{'ns/op':>12}{'峰值B/op':>12}{'残留B/op':>10}{'变化':>10}")
+        for name, item in results.items():
+            delta = f"{deltas[name]['ops_per_second_pct']:+.1f}%" if name in deltas else ''
+            mark = ' !' if name in regressions else ''
+            print(f"{name:<30}{item['ops_per_second']:>14,.0f}{item['ns_per_op']:>12,.0f}"
+                  f"{item['alloc_peak_bytes_per_op']:>12,.0f}{item['alloc_retained_bytes_per_op']:>10,.1f}"
+                  f"{delta:>10}{mark}")
+        if regressions:
+            print(f"退化 (> {args.threshold}%): {', '.join(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+客户端登记表并发压力测试
+1. 登记表层面：多个线程反复增删客户端，同时多个线程遍历快照，并发移除同一客户端；
+2. 主机层面：在运行中的主机上不断加入/断开成员，同时持续广播，
+   检查没有异常、没有重复的离开通知。
+任一检查失败时以非零状态退出。
+
+用法: python benchmarks/stress_client_registry.py [加入断开轮数] [引擎]
+"""
+import collections
+import contextlib
+import io
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.p2pu import receive_json, send_json, set_wire_version  # noqa: E402
+from src.room import create_host  # noqa: E402
+from src.room.client_registry import ClientRegistry  # noqa: E402
+
+
+def stress_registry(rounds=20000, writers=4, readers=2, double_keys=2000):
+    """返回 (耗时, 错误列表)"""
+    registry = ClientRegistry()
+    errors = []
+    stop = threading.Event()
+    removed = collections.Counter()
+    removed_lock = threading.Lock()
+
+    def writer(index):
+        for i in range(rounds):
+            key = (index, i % 64)
+            registry.add(key, {'uid': f'{index}-{i}'})
+            if registry.remove(key) is not None:
+                with removed_lock:
+                    removed[key, i] += 1
+
+    def reader():
+        while not stop.is_set():
+            try:
+                snapshot = registry.snapshot()
+                for key, info in snapshot:
+                    if 'uid' not in info:
+                        errors.append(f"快照中出现不完整的条目: {key}")
+            except Exception as e:
+                errors.append(f"遍历快照出错: {e}")
+
+    def double_remover(keys, results):
+        for key in keys:
+            results.append(registry.remove(key) is not None)
+
+    started = time.perf_counter()
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+
+    # 两个线程同时移除同一批客户端，每个客户端只能被成功移除一次
+    keys = [('double', i) for i in range(double_keys)]
+    for key in keys:
+        registry.add(key, {'uid': str(key)})
+    results_a, results_b = [], []
+    removers = [threading.Thread(target=double_remover, args=(keys, results_a)),
+                threading.Thread(target=double_remover, args=(list(reversed(keys)), results_b))]
+    for thread in removers:
+        thread.start()
+    for thread in removers:
+        thread.join()
+    if sum(results_a) + sum(results_b) != len(keys):
+        errors.append(f"重复移除: 成功 {sum(results_a) + sum(results_b)} 次，应为 {len(keys)} 次")
+
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+    if len(registry):
+        errors.append(f"登记表残留 {len(registry)} 个客户端")
+    return time.perf_counter() - started, errors
+
+
+def join(port, room_uid, uid):
+    sock = socket.create_connection(('127.0.0.1', port))
+    send_json(sock, {'type': 'join_room', 'uid': uid, 'room_uid': room_uid, 'wire': 2})
+    reply = receive_json(sock)
+    if not reply or reply.get('type') != 'join_success':
+        raise RuntimeError(f"{uid} 加入失败: {reply}")
+    set_wire_version(sock, 2)
+    return sock
+
+
+def stress_host(engine, rounds=300, churners=4):
+    """返回 (耗时, 错误列表)"""
+    errors = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        host = create_host(engine, 0)
+        host.create_room('stress')
+        host.start_hosting(interactive=False)
+
+        watcher = join(host.port, host.room_uid, 'watcher')
+        sender = join(host.port, host.room_uid, 'sender')
+        leaves = collections.Counter()
+        stop = threading.Event()
+
+        def watch():
+            while True:
+                message = receive_json(watcher)
+                if not message:
+                    return
+                text = message.get('message', '')
+                if message.get('type') == 'system' and text.endswith('离开了聊天室'):
+                    leaves[text.split(' ')[0]] += 1
+
+        def send():
+            while not stop.is_set():
+                if not send_json(sender, {'type': 'message', 'message': 'stress'}):
+                    errors.append("广播发送方连接断开")
+                    return
+                receive_json(sender)
+
+        def churn(index):
+            try:
+                for i in range(rounds):
+                    sock = join(host.port, host.room_uid, f'c{index}-{i}')
+                    # 一半正常关闭，一半直接RST，覆盖读写线程同时发现断开的情况
+                    if i % 2:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, b'\x01\x00\x00\x00\x00\x00\x00\x00')
+                    sock.close()
+            except Exception as e:
+                errors.append(f"加入/断开出错: {e}")
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=watch, daemon=True), threading.Thread(target=send, daemon=True)]
+        churn_threads = [threading.Thread(target=churn, args=(i,)) for i in range(churners)]
+        for thread in threads + churn_threads:
+            thread.start()
+        for thread in churn_threads:
+            thread.join()
+        stop.set()
+        elapsed = time.perf_counter() - started
+
+        # 等待剩余的离开通知送达
+        deadline = time.monotonic() + 5
+        while len(host.clients) > 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.5)
+
+        duplicates = {uid: count for uid, count in leaves.items() if count > 1}
+        if duplicates:
+            errors.append(f"重复的离开通知: {duplicates}")
+        if len(host.clients) != 2:
+            errors.append(f"主机登记表残留 {len(host.clients) - 2} 个已断开的成员")
+        host.stop_hosting()
+    return elapsed, errors
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    engine = sys.argv[2] if len(sys.argv) > 2 else 'threaded'
+
+    elapsed, errors = stress_registry()
+    print(f"登记表并发增删: {elapsed:.2f}s, {'通过' if not errors else '失败'}")
+    for error in errors:
+        print(f"  {error}")
+
+    host_elapsed, host_errors = stress_host(engine, rounds)
+    print(f"主机 [{engine}] 加入/断开 {rounds * 4} 次并持续广播: {host_elapsed:.2f}s, "
+          f"{'通过' if not host_errors else '失败'}")
+    for error in host_errors:
+        print(f"  {error}")
+
+    sys.exit(1 if errors or host_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
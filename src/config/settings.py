@@ -3,6 +3,92 @@ DEFAULT_PORT = 64125
 MAX_MESSAGE_LENGTH = 200
 CONNECTION_TIMEOUT = 10
 RECONNECT_ATTEMPTS = 3
+RECONNECT_BASE_DELAY = 1.0    # 第一次重连前的等待（秒），之后每次加倍，并加入随机抖动
+RECONNECT_MAX_DELAY = 30.0    # 重连等待上限（秒）
+SESSION_RESUME_TIMEOUT = 60   # 连接意外断开后保留会话的秒数，期间凭令牌重连不产生加入/离开通知
+KICK_REJOIN_COOLDOWN = 30     # 被主机断开（发送过快、接收过慢）的成员在此秒数内不能恢复会话或重新加入
+# 线路格式版本: 1=旧版MD5信封(兼容模式), 2=CRC32单次编码
+WIRE_VERSION = 2
+
+# 应用层心跳：空闲超过 HEARTBEAT_INTERVAL 秒发送ping，超过 HEARTBEAT_TIMEOUT 秒无任何数据判定对端失联
+HEARTBEAT_INTERVAL = 15   # 0为关闭心跳
+HEARTBEAT_TIMEOUT = 45
+HEARTBEAT_TICK = 0.5      # 时间轮精度（秒）
+TIMER_WHEEL_SLOTS = 256
+
+# 主机握手阶段设置
+LISTEN_BACKLOG = 1024          # 监听队列长度，重启后的加入风暴不会溢出
+HANDSHAKE_TIMEOUT = 5          # 连接后必须在此秒数内完成握手
+MAX_PENDING_HANDSHAKES = 2048  # 同时等待握手的连接上限，超出的新连接直接关闭
+
+# 主机发送队列设置
+OUTBOUND_HIGH_WATER_BYTES = 256 * 1024  # 超过后按策略丢弃低优先级消息或断开
+OUTBOUND_MAX_BYTES = 1024 * 1024        # 单个客户端积压上限，超过必定断开
+SLOW_CONSUMER_POLICY = "drop"           # drop / disconnect
+
+# 成员加入/离开通知按此间隔（秒）合并为一批发出，0为每次立即发出
+PRESENCE_BATCH_INTERVAL = 0.2
+
+# 聊天室历史消息（新成员加入后回放，断线重连时从中补发缺口），按条数和字节数限制每个聊天室的内存
+HISTORY_MAX_MESSAGES = 100
+HISTORY_MAX_BYTES = 64 * 1024
+ACK_EVERY = 32  # 客户端每收到多少条消息发送一次累计确认（空闲时随心跳确认）
+
+# 聊天室消息持久化日志（分段只追加文件，主机重启后恢复历史消息）
+MESSAGE_LOG_DIR = None                        # 日志目录，None为不保存
+MESSAGE_LOG_SEGMENT_BYTES = 16 * 1024 * 1024  # 单个段的大小上限，写满后滚动到新段
+MESSAGE_LOG_INDEX_INTERVAL = 4096             # 每写入多少字节记一个索引项
+MESSAGE_LOG_FSYNC_INTERVAL = 1.0              # 组提交：每隔多少秒fsync一次，0为每批写入后立即fsync
+MESSAGE_LOG_RETENTION_SECONDS = 7 * 24 * 3600  # 超过此时间的旧段被删除，0为不限
+MESSAGE_LOG_RETENTION_BYTES = 256 * 1024 * 1024  # 每个聊天室日志的总大小上限，0为不限
+
+# 聊天室消息检索（/search），按文档数和倒排项数限制每个聊天室索引的内存
+SEARCH_MAX_DOCUMENTS = 100000
+SEARCH_MAX_POSTINGS = 2000000
+SEARCH_RESULT_LIMIT = 20
+
+# 入站限流（令牌桶），防止单个客户端刷屏后被广播放大N倍；速率为0表示不限
+RATE_LIMIT_MESSAGES = 5                    # 每个客户端每秒消息数
+RATE_LIMIT_MESSAGE_BURST = 10              # 每个客户端允许的突发消息数
+RATE_LIMIT_BYTES = 4 * 1024                # 每个客户端每秒字节数
+RATE_LIMIT_BYTE_BURST = 16 * 1024
+ROOM_RATE_LIMIT_MESSAGES = 100             # 每个聊天室所有成员合计每秒消息数（多进程模式下按工作进程计）
+ROOM_RATE_LIMIT_MESSAGE_BURST = 200
+ROOM_RATE_LIMIT_BYTES = 64 * 1024
+ROOM_RATE_LIMIT_BYTE_BURST = 256 * 1024
+RATE_LIMIT_POLICY = "delay"                # delay / drop / disconnect
+RATE_LIMIT_MAX_DELAY = 5.0                 # delay策略下最多暂停读取的秒数，超过则丢弃
+
+# 主机运行时统计（/stats），METRICS_SNAPSHOT_PATH 不为None时定期写出JSON快照
+METRICS_ENABLED = True
+METRICS_SNAPSHOT_PATH = None
+METRICS_SNAPSHOT_INTERVAL = 10  # 秒
+
+# 主机联邦：多台主机以同一房间ID组成一个逻辑聊天室，经主机间长连接互相转发房间广播
+FEDERATION_PORT = 64126           # 主机间连接的监听端口，0为由系统分配
+FEDERATION_RETRY_INTERVAL = 5     # 主动建立的连接断开后的重连间隔（秒）
+FEDERATION_DEDUP_SIZE = 65536     # 记住最近多少个消息ID用于去重
+FEDERATION_MAX_HOPS = 16          # 转发跳数上限（去重之外的保护）
+FEDERATION_SECRET = None          # 各主机相同的共享密钥，握手时以HMAC互相验证
+FEDERATION_ALLOWED_PEERS = ()     # 允许发起联邦连接的主机IP；密钥与允许列表都未配置时拒绝所有联邦连接
+FEDERATION_MAX_PENDING = 64       # 同时进行的联邦握手上限，超出的新连接直接关闭
+
+# 性能剖析（主机控制台 /profile 或环境变量 TRANSITCHAT_PROFILE=1|cpu 开启），关闭时热路径只多一次标志检查
+PROFILE_ENABLED = False
+PROFILE_DIR = "profiles"        # cProfile/tracemalloc 快照与耗时汇总的输出目录
+PROFILE_SAMPLE_EVERY = 8        # 每N次调用计时一次
+PROFILE_SAMPLES = 4096          # 每个函数保留的最近计时样本数（用于分位数）
+
+# 点对点聊天的可靠UDP传输（start_direct_chat 中选择），适合丢包较多的网络
+RUDP_MTU = 1200            # 每个数据报的最大字节数（含协议头），低于常见路径MTU，避免IP分片
+RUDP_WINDOW = 32           # 发送窗口：最多同时在途的未确认数据报数
+RUDP_INITIAL_RTO = 0.5     # 测得往返时间之前的重传超时（秒）
+RUDP_MIN_RTO = 0.05        # 重传超时下限（秒），TCP在Linux上为0.2
+RUDP_MAX_RTO = 4.0         # 重传超时上限（秒），每次重传加倍直到该值
+RUDP_MAX_RETRIES = 8       # 同一数据报重传超过该次数判定连接已断开
+
+# 多进程主机设置
+HOST_WORKERS = 1  # 工作进程数，大于1时以 SO_REUSEPORT 共用端口，房间广播经本地IPC中转
 
 # 显示设置
 DISPLAY_WIDTH = 80
@@ -1,4 +1,5 @@
 # src/direct/direct_chat.py
+import secrets
 import socket
 import threading
 import time
@@ -6,12 +7,18 @@ import time
 # 处理导入问题 - 使用绝对导入
 try:
     # 尝试直接导入
-    from src.p2pu.core_utils import get_or_create_uid, receive_json, send_json, get_current_time
+    from src.p2pu.core_utils import (
+        get_or_create_uid, receive_json, send_json, get_current_time,
+        negotiate_wire_version, set_wire_version, backoff_delays
+    )
+    from src.p2pu.framing import release_frame_reader
+    from src.p2pu.heartbeat import HeartbeatMonitor
     from src.p2pu.ipv4_utils import is_ipv4_address
     from src.p2pu.ipv6_utils import create_dual_stack_socket, get_all_network_addresses, is_ipv6_address
+    from src.p2pu.rudp import RUDPListener, connect_rudp
     from src.ui.display_utils import display_chat_message, display_system_message, display_network_info
     from src.ui.input_utils import get_input, get_choice
-    from src.config.settings import DEFAULT_PORT
+    from src.config.settings import DEFAULT_PORT, WIRE_VERSION, CONNECTION_TIMEOUT, SESSION_RESUME_TIMEOUT
 except ImportError:
 
         # 如果相对导入也失败，使用动态导入
@@ -27,8 +34,11 @@ except ImportError:
         import importlib
 
         p2pu_core = importlib.import_module('p2pu.core_utils')
+        p2pu_framing = importlib.import_module('p2pu.framing')
+        p2pu_heartbeat = importlib.import_module('p2pu.heartbeat')
         p2pu_ipv4 = importlib.import_module('p2pu.ipv4_utils')
         p2pu_ipv6 = importlib.import_module('p2pu.ipv6_utils')
+        p2pu_rudp = importlib.import_module('p2pu.rudp')
         ui_display = importlib.import_module('ui.display_utils')
         ui_input = importlib.import_module('ui.input_utils')
         config_settings = importlib.import_module('config.settings')
@@ -38,42 +48,75 @@ except ImportError:
         receive_json = p2pu_core.receive_json
         send_json = p2pu_core.send_json
         get_current_time = p2pu_core.get_current_time
+        negotiate_wire_version = p2pu_core.negotiate_wire_version
+        set_wire_version = p2pu_core.set_wire_version
+        backoff_delays = p2pu_core.backoff_delays
+        release_frame_reader = p2pu_framing.release_frame_reader
+        HeartbeatMonitor = p2pu_heartbeat.HeartbeatMonitor
         is_ipv4_address = p2pu_ipv4.is_ipv4_address
         create_dual_stack_socket = p2pu_ipv6.create_dual_stack_socket
         get_all_network_addresses = p2pu_ipv6.get_all_network_addresses
         is_ipv6_address = p2pu_ipv6.is_ipv6_address
+        RUDPListener = p2pu_rudp.RUDPListener
+        connect_rudp = p2pu_rudp.connect_rudp
         display_chat_message = ui_display.display_chat_message
         display_system_message = ui_display.display_system_message
         display_network_info = ui_display.display_network_info
         get_input = ui_input.get_input
         get_choice = ui_input.get_choice
         DEFAULT_PORT = config_settings.DEFAULT_PORT
+        WIRE_VERSION = config_settings.WIRE_VERSION
+        CONNECTION_TIMEOUT = config_settings.CONNECTION_TIMEOUT
+        SESSION_RESUME_TIMEOUT = config_settings.SESSION_RESUME_TIMEOUT
+
+
+# 点对点连接的传输方式，双方需选择相同的方式
+TRANSPORT_TCP = 'tcp'
+TRANSPORT_UDP = 'udp'  # 可靠UDP，丢包较多的网络上延迟更稳定
+MAX_PENDING_RECONNECTS = 4  # 监听方同时进行的重连握手数，超出的连接直接关闭
 
 
 class DirectChat:
-    def __init__(self, port=DEFAULT_PORT):
+    def __init__(self, port=DEFAULT_PORT, transport=TRANSPORT_TCP):
         self.uid = get_or_create_uid()
         self.port = port
+        self.transport = transport
         self.peer_socket = None
         self.connected = False
         self.peer_uid = "Unknown"
+        self._send_lock = threading.Lock()  # 输入线程与心跳线程共用socket
+        self.heartbeat = None
+        # 断线重连：监听方在首次握手时发放会话令牌，连接方断线后凭它重连，监听方凭它认出对方
+        self.session = None
+        self.is_incoming = False
+        self.peer_address = None
+        self.reconnecting = False
+        self._server_socket = None  # 监听方在会话期间保持监听，接受对方的重连
+        self._pending_reconnects = threading.BoundedSemaphore(MAX_PENDING_RECONNECTS)
+        self._replace_lock = threading.Lock()  # 同时到达的多个重连握手只有一个接替当前连接
+        self._peer_replaced = threading.Event()
+        self._peer_left = False
 
     def start_listening(self):
         """启动监听模式"""
         try:
-            sock = create_dual_stack_socket()
-            if hasattr(sock, 'family') and sock.family == socket.AF_INET6:
-                sock.bind(('::', self.port))
+            if self.transport == TRANSPORT_UDP:
+                sock = RUDPListener(self.port)
             else:
-                sock.bind(('0.0.0.0', self.port))
-            sock.listen(1)
+                sock = create_dual_stack_socket()
+                if hasattr(sock, 'family') and sock.family == socket.AF_INET6:
+                    sock.bind(('::', self.port))
+                else:
+                    sock.bind(('0.0.0.0', self.port))
+                sock.listen(1)
 
             network_info = get_all_network_addresses()
             display_system_message("等待连接中...")
             display_network_info(network_info)
 
             self.peer_socket, address = sock.accept()
-            sock.close()
+            # 会话期间保持监听，对方断线后从这里重连
+            self._server_socket = sock
 
             self._handle_connection(self.peer_socket, address, is_incoming=True)
 
@@ -107,14 +150,8 @@ class DirectChat:
             # 尝试连接
             for addr in addresses:
                 try:
-                    if len(addr) == 2:  # IPv4
-                        family = socket.AF_INET
-                    else:  # IPv6
-                        family = socket.AF_INET6
-
-                    self.peer_socket = socket.socket(family, socket.SOCK_STREAM)
-                    self.peer_socket.settimeout(10)
-                    self.peer_socket.connect(addr)
+                    self.peer_socket = self._open_connection(addr)
+                    self.peer_address = addr
                     self._handle_connection(self.peer_socket, addr, is_incoming=False)
                     return
                 except:
@@ -126,24 +163,65 @@ class DirectChat:
             display_system_message(f"连接失败: {e}")
         time.sleep(2)
 
+    def _open_connection(self, addr):
+        """
+        按所选传输方式连接对方
+        可靠UDP连接不等待对方回复，对方不可达时由随后的握手超时发现
+        """
+        if self.transport == TRANSPORT_UDP:
+            peer_socket = connect_rudp(addr)
+            peer_socket.settimeout(CONNECTION_TIMEOUT)
+            return peer_socket
+        family = socket.AF_INET if len(addr) == 2 else socket.AF_INET6
+        peer_socket = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            peer_socket.settimeout(CONNECTION_TIMEOUT)
+            peer_socket.connect(addr)
+        except OSError:
+            peer_socket.close()
+            raise
+        return peer_socket
+
+    def _own_handshake(self):
+        """本方握手消息（以旧格式发送并声明支持的线路格式）"""
+        return {'type': 'handshake', 'uid': self.uid, 'wire': WIRE_VERSION, 'heartbeat': True,
+                'session': self.session or True}
+
     def _handle_connection(self, peer_socket, address, is_incoming):
         """处理连接"""
         self.connected = True
+        self.is_incoming = is_incoming
 
         # 交换UID
+        handshake = None
         try:
             if is_incoming:
                 handshake = receive_json(peer_socket)
-                if handshake and handshake.get('type') == 'handshake':
-                    self.peer_uid = handshake.get('uid', 'Unknown')
-                send_json(peer_socket, {'type': 'handshake', 'uid': self.uid})
+                if handshake and handshake.get('session'):
+                    # 对方支持断线重连：发放本次会话的令牌
+                    self.session = secrets.token_hex(16)
+                send_json(peer_socket, self._own_handshake())
             else:
-                send_json(peer_socket, {'type': 'handshake', 'uid': self.uid})
+                send_json(peer_socket, self._own_handshake())
                 handshake = receive_json(peer_socket)
-                if handshake and handshake.get('type') == 'handshake':
-                    self.peer_uid = handshake.get('uid', 'Unknown')
         except:
+            handshake = None
+
+        if handshake and handshake.get('type') == 'handshake':
+            self.peer_uid = handshake.get('uid', 'Unknown')
+            if not is_incoming:
+                session = handshake.get('session')
+                self.session = session if isinstance(session, str) else None
+            self._setup_peer(peer_socket, handshake)
+        else:
             self.peer_uid = "Unknown"
+            self.session = None
+
+        if is_incoming and self.session is not None:
+            threading.Thread(target=self._accept_reconnects, daemon=True).start()
+        elif self._server_socket is not None:
+            self._server_socket.close()
+            self._server_socket = None
 
         display_system_message(f"已连接到 {self.peer_uid}")
         display_system_message("开始聊天吧! (输入 '/quit' 退出)")
@@ -155,25 +233,145 @@ class DirectChat:
 
         self._send_messages()
 
+    def _setup_peer(self, peer_socket, handshake):
+        """按对方的握手设置连接"""
+        set_wire_version(peer_socket, negotiate_wire_version(handshake.get('wire')))
+        if handshake.get('heartbeat'):
+            # 双方都支持心跳：失联由心跳检测，空闲连接不再因读超时断开
+            peer_socket.settimeout(None)
+            if self.heartbeat is None:
+                self.heartbeat = HeartbeatMonitor(self._ping_peer, self._peer_lost)
+            self.heartbeat.add(peer_socket)
+
+    def _replace_peer(self, peer_socket, handshake):
+        """换用重连后的新连接，关闭旧连接（唤醒仍阻塞在旧连接上的接收线程）"""
+        with self._send_lock:
+            old_socket, self.peer_socket = self.peer_socket, peer_socket
+        self._setup_peer(peer_socket, handshake)
+        if old_socket is not None and old_socket is not peer_socket:
+            if self.heartbeat:
+                self.heartbeat.remove(old_socket)
+            try:
+                old_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            old_socket.close()
+            release_frame_reader(old_socket)
+        self._peer_replaced.set()
+
+    def _accept_reconnects(self):
+        """
+        监听方：会话期间持续接受连接，只有携带本会话令牌的对方才能接替当前连接
+        （对方先于本方发现断线时也能立即重连）
+        """
+        server_socket = self._server_socket
+        while self.connected:
+            try:
+                conn, _ = server_socket.accept()
+            except OSError:
+                return  # 监听socket已关闭
+            # 每个握手在自己的线程中进行，不发送握手的连接不会耽误对方真正的重连
+            if not self._pending_reconnects.acquire(blocking=False):
+                conn.close()
+                continue
+            threading.Thread(target=self._reconnect_handshake, args=(conn,), daemon=True).start()
+
+    def _reconnect_handshake(self, conn):
+        """监听方：校验一个重连握手，携带本会话令牌时换用该连接"""
+        try:
+            conn.settimeout(CONNECTION_TIMEOUT)
+            handshake = receive_json(conn)
+            if (handshake and handshake.get('type') == 'handshake'
+                    and handshake.get('session') == self.session and handshake.get('uid') == self.peer_uid):
+                with self._replace_lock:
+                    if self.connected and send_json(conn, self._own_handshake()):
+                        self._replace_peer(conn, handshake)
+                        return
+        except OSError:
+            pass
+        finally:
+            self._pending_reconnects.release()
+        conn.close()
+        release_frame_reader(conn)
+
+    def _reconnect(self, lost_socket):
+        """
+        连接意外断开后恢复会话：连接方按指数退避（带随机抖动）重连，监听方等待对方重连
+        Returns:
+            是否已换用新连接
+        """
+        if self.session is None or self._peer_left or not self.connected:
+            return False
+        if self.peer_socket is not lost_socket:
+            return True  # 已被重连的新连接接替
+        self.reconnecting = True
+        display_system_message("连接中断，正在重连...")
+        try:
+            if self.is_incoming:
+                # 等待对方凭令牌重连（由 _accept_reconnects 换用新连接）
+                deadline = time.monotonic() + SESSION_RESUME_TIMEOUT
+                while self.connected and self.peer_socket is lost_socket and time.monotonic() < deadline:
+                    self._peer_replaced.wait(0.5)
+                    self._peer_replaced.clear()
+                recovered = self.connected and self.peer_socket is not lost_socket
+            else:
+                recovered = self._reconnect_to_peer()
+        finally:
+            self.reconnecting = False
+        display_system_message("已重新连接" if recovered else "重连失败")
+        return recovered
+
+    def _reconnect_to_peer(self):
+        """连接方：按退避间隔重新连接对方并出示会话令牌"""
+        for delay in backoff_delays():
+            time.sleep(delay)
+            if not self.connected:
+                return False
+            try:
+                peer_socket = self._open_connection(self.peer_address)
+            except OSError:
+                continue
+            try:
+                if send_json(peer_socket, self._own_handshake()):
+                    handshake = receive_json(peer_socket)
+                    if handshake and handshake.get('type') == 'handshake' and handshake.get('session') == self.session:
+                        self._replace_peer(peer_socket, handshake)
+                        return True
+            except OSError:
+                pass
+            peer_socket.close()
+            release_frame_reader(peer_socket)
+        return False
+
     def _receive_messages(self):
-        """接收消息（他人消息左对齐）"""
+        """接收消息（他人消息左对齐），连接意外断开时自动重连"""
         while self.connected:
+            peer_socket = self.peer_socket
             try:
-                message_data = receive_json(self.peer_socket)
+                message_data = receive_json(peer_socket)
                 if not message_data:
+                    if self._reconnect(peer_socket):
+                        continue
                     break
+                if self.heartbeat:
+                    self.heartbeat.seen(peer_socket)
 
-                if message_data.get('type') == 'message':
+                if message_data.get('type') == 'ping':
+                    self._send({'type': 'pong', 'seq': message_data.get('seq')})
+                elif message_data.get('type') == 'message':
                     display_chat_message(message_data, is_own_message=False)
                     print("> ", end="", flush=True)
+                elif message_data.get('type') == 'leave':
+                    # 对方主动退出，不再重连
+                    self._peer_left = True
+                    break
 
             except:
                 break
 
         display_system_message("连接已断开")
         self.connected = False
-        if self.peer_socket:
-            self.peer_socket.close()
+        self._close_peer()
 
     def _send_messages(self):
         """发送消息（自己消息右对齐）"""
@@ -184,6 +382,8 @@ class DirectChat:
                     break
 
                 if message.lower() == '/quit':
+                    # 通知对方本方主动退出，对方不会等待重连
+                    self._send({'type': 'leave'})
                     break
 
                 if message.strip():
@@ -193,7 +393,9 @@ class DirectChat:
                         'sender': self.uid,
                         'timestamp': get_current_time()
                     }
-                    send_json(self.peer_socket, message_data)
+                    if not self._send(message_data) and self.reconnecting:
+                        display_system_message("正在重连，消息未发送")
+                        continue
                     # 显示自己发送的消息（右对齐）
                     display_chat_message(message_data, is_own_message=True)
 
@@ -203,8 +405,34 @@ class DirectChat:
                 break
 
         self.connected = False
+        self._close_peer()
+
+    def _send(self, message_data):
+        """发送一条消息（与心跳线程互斥，避免两个线程的帧交错）"""
+        with self._send_lock:
+            return send_json(self.peer_socket, message_data)
+
+    def _ping_peer(self, peer_socket):
+        self._send({'type': 'ping'})
+
+    def _peer_lost(self, peer_socket):
+        """对方超过心跳期限没有任何消息到达：关闭连接，唤醒接收线程重连"""
+        display_system_message("对方无响应，连接已断开")
+        try:
+            peer_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _close_peer(self):
+        """关闭对等连接（监听方同时停止接受重连）"""
+        if self.heartbeat:
+            self.heartbeat.stop()
+        if self._server_socket is not None:
+            self._server_socket.close()
+            self._server_socket = None
         if self.peer_socket:
             self.peer_socket.close()
+            release_frame_reader(self.peer_socket)
 
 
 def start_direct_chat():
@@ -215,13 +443,20 @@ def start_direct_chat():
 
     options = ["等待他人连接", "连接他人", "返回主菜单"]
     choice = get_choice(options)
+    if choice not in (0, 1):
+        return  # 返回主菜单
+
+    # 双方需选择相同的传输方式
+    transport_choice = get_choice(["TCP", "可靠UDP (丢包较多的网络)"], "传输方式")
+    if transport_choice is None:
+        return
+    transport = [TRANSPORT_TCP, TRANSPORT_UDP][transport_choice]
 
     if choice == 0:
-        chat = DirectChat(DEFAULT_PORT)
+        chat = DirectChat(DEFAULT_PORT, transport)
         chat.start_listening()
-    elif choice == 1:
+    else:
         host_input = get_input("输入对方地址 (IP/主机名)")
         if host_input:
-            chat = DirectChat(DEFAULT_PORT)
-            chat.connect_to_peer(host_input)
-    # choice == 2: 返回主菜单
\ No newline at end of file
+            chat = DirectChat(DEFAULT_PORT, transport)
+            chat.connect_to_peer(host_input)
\ No newline at end of file
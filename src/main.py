@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import sys
 import time
@@ -93,4 +94,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 多进程主机的工作进程在打包后的程序中也能启动
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
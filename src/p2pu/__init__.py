@@ -10,9 +10,35 @@ from .core_utils import (
     receive_json,
     get_current_time,
     generate_session_id,
+    backoff_delays,
+    encode_json_frame,
+    decode_json_frame,
+    send_frame,
+    negotiate_wire_version,
+    set_wire_version,
+    get_wire_version,
     validate_ip_address,
     get_local_ip
 )
+from .framing import (
+    FrameReader,
+    get_frame_reader,
+    release_frame_reader
+)
+from .heartbeat import (
+    TimerWheel,
+    HeartbeatMonitor
+)
+from .profiling import (
+    Profiler,
+    profiler,
+    profiled
+)
+from .rudp import (
+    RUDPConnection,
+    RUDPListener,
+    connect_rudp
+)
 from .ipv4_utils import (
     get_ipv4_addresses,
     create_ipv4_socket,
@@ -43,6 +69,34 @@ __all__ = [
     'receive_json',
     'get_current_time',
     'generate_session_id',
+    'backoff_delays',
+
+    # 线路格式
+    'encode_json_frame',
+    'decode_json_frame',
+    'send_frame',
+    'negotiate_wire_version',
+    'set_wire_version',
+    'get_wire_version',
+
+    # 帧读取
+    'FrameReader',
+    'get_frame_reader',
+    'release_frame_reader',
+
+    # 心跳
+    'TimerWheel',
+    'HeartbeatMonitor',
+
+    # 性能剖析
+    'Profiler',
+    'profiler',
+    'profiled',
+
+    # 可靠UDP传输
+    'RUDPConnection',
+    'RUDPListener',
+    'connect_rudp',
 
     # 网络诊断
     'validate_ip_address',
@@ -97,6 +151,15 @@ def get_network_capabilities():
     }
 
 from .core_utils import get_or_create_uid, create_room_uid, send_json, receive_json, get_current_time
+from .core_utils import generate_session_id, backoff_delays
+from .core_utils import (
+    encode_json_frame, decode_json_frame, send_frame, negotiate_wire_version, set_wire_version,
+    get_wire_version
+)
+from .framing import FrameReader, get_frame_reader, release_frame_reader
+from .heartbeat import TimerWheel, HeartbeatMonitor
+from .profiling import Profiler, profiler, profiled
+from .rudp import RUDPConnection, RUDPListener, connect_rudp
 from .ipv4_utils import get_ipv4_addresses, create_ipv4_socket, is_ipv4_address, get_public_ipv4
 from .ipv6_utils import (
     get_ipv6_addresses, create_dual_stack_socket, check_ipv6_connectivity,
@@ -107,6 +170,13 @@ from .ipv6_utils import (
 
 __all__ = [
     'get_or_create_uid', 'create_room_uid', 'send_json', 'receive_json', 'get_current_time',
+    'generate_session_id', 'backoff_delays',
+    'encode_json_frame', 'decode_json_frame', 'send_frame', 'negotiate_wire_version',
+    'set_wire_version', 'get_wire_version',
+    'FrameReader', 'get_frame_reader', 'release_frame_reader',
+    'TimerWheel', 'HeartbeatMonitor',
+    'Profiler', 'profiler', 'profiled',
+    'RUDPConnection', 'RUDPListener', 'connect_rudp',
     'get_ipv4_addresses', 'create_ipv4_socket', 'is_ipv4_address', 'get_public_ipv4',
     'get_ipv6_addresses', 'create_dual_stack_socket', 'check_ipv6_connectivity',
     'ensure_ipv6_support', 'is_ipv6_address', 'get_all_network_addresses',
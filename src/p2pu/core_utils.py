@@ -1,12 +1,20 @@
 import os
 import uuid
+import random
 import json
 import socket
 import hashlib
+import struct
+import weakref
+import zlib
 from datetime import datetime
 from typing import Optional, Dict, Any
 from pathlib import Path
-from ..config.settings import DEFAULT_PORT
+from ..config.settings import (
+    DEFAULT_PORT, WIRE_VERSION, RECONNECT_ATTEMPTS, RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY
+)
+from .framing import DEFAULT_BUFFER_SIZE, get_frame_reader
+from .profiling import profiled
 
 
 def get_or_create_uid(uid_file: str = '.uid') -> str:
@@ -50,73 +58,147 @@ def create_room_uid(room_name: str, host_uid: str) -> str:
     return hashlib.sha256(base_str.encode()).hexdigest()[:20]
 
 
-def send_json(sock: socket.socket, data: Dict[str, Any]) -> bool:
+# 线路格式版本
+WIRE_LEGACY = 1  # 旧版信封: {'payload', 'checksum'(MD5), 'timestamp'}
+WIRE_V2 = 2      # 单次编码: 版本字节 + CRC32(4字节) + 载荷JSON，校验覆盖线上原始字节
+_V2_HEADER = struct.Struct('>IBI')  # 帧长度 + 版本字节 + CRC32
+_V2_PREFIX_SIZE = 5
+
+# 每个连接协商出的线路格式，未协商的连接按旧格式发送以兼容旧版本
+_wire_versions: "weakref.WeakKeyDictionary[socket.socket, int]" = weakref.WeakKeyDictionary()
+
+
+def negotiate_wire_version(peer_version: Any) -> int:
+    """
+    根据对方在握手中声明的版本确定双方共用的线路格式
+    Args:
+        peer_version: 对方握手消息中的 'wire' 字段（旧版本不携带）
+    Returns:
+        双方都支持的最高版本
+    """
+    if not isinstance(peer_version, int) or peer_version < WIRE_LEGACY:
+        return WIRE_LEGACY
+    return min(peer_version, WIRE_VERSION)
+
+
+def set_wire_version(sock: socket.socket, version: int):
+    """设置连接的线路格式"""
+    _wire_versions[sock] = version
+
+
+def get_wire_version(sock: socket.socket) -> int:
+    """获取连接的线路格式，未协商时为旧格式"""
+    return _wire_versions.get(sock, WIRE_LEGACY)
+
+
+def encode_json_frame(data: Dict[str, Any], wire_version: int = WIRE_VERSION) -> bytes:
+    """
+    将字典编码为带长度前缀的完整帧
+    Args:
+        data: 要发送的字典数据
+        wire_version: 线路格式版本
+    Returns:
+        可直接写入socket的帧字节
+    """
+    if wire_version >= WIRE_V2:
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return _V2_HEADER.pack(len(payload) + _V2_PREFIX_SIZE, WIRE_V2, zlib.crc32(payload)) + payload
+
+    # 兼容模式：旧版信封
+    checksum = hashlib.md5(json.dumps(data).encode()).hexdigest()
+    message = json.dumps({
+        'payload': data,
+        'checksum': checksum,
+        'timestamp': get_current_time()
+    }).encode('utf-8')
+    return len(message).to_bytes(4, 'big') + message
+
+
+def decode_json_frame(frame) -> Optional[Dict[str, Any]]:
+    """
+    解码一个帧的内容（不含长度前缀），自动识别新旧两种格式
+    Args:
+        frame: 帧内容（bytes或memoryview）
+    Returns:
+        载荷字典，校验失败时返回None
+    Raises:
+        ValueError: 帧内容不是合法的JSON/UTF-8
+        KeyError: 旧格式信封缺少字段
+    """
+    if frame[0] == WIRE_V2:
+        payload = frame[_V2_PREFIX_SIZE:]
+        if zlib.crc32(payload) != int.from_bytes(frame[1:_V2_PREFIX_SIZE], 'big'):
+            print("校验和不匹配，数据可能损坏")
+            return None
+        return json.loads(str(payload, 'utf-8'))
+
+    data = json.loads(str(frame, 'utf-8'))
+
+    # 验证校验和
+    calculated_checksum = hashlib.md5(json.dumps(data['payload']).encode()).hexdigest()
+    if calculated_checksum != data.get('checksum'):
+        print("校验和不匹配，数据可能损坏")
+        return None
+
+    return data['payload']
+
+
+@profiled('send_json')
+def send_json(sock: socket.socket, data: Dict[str, Any], wire_version: Optional[int] = None) -> bool:
     """
     安全发送JSON数据
     Args:
         sock: 已连接的socket对象
         data: 要发送的字典数据
+        wire_version: 线路格式版本，默认使用该连接协商出的版本
     Returns:
         是否发送成功
     """
     try:
-        # 添加数据校验和
-        checksum = hashlib.md5(json.dumps(data).encode()).hexdigest()
-        data_with_checksum = {
-            'payload': data,
-            'checksum': checksum,
-            'timestamp': get_current_time()
-        }
-
-        message = json.dumps(data_with_checksum).encode('utf-8')
-        # 先发送消息长度(4字节)
-        sock.send(len(message).to_bytes(4, 'big'))
-        # 再发送消息内容
-        sock.send(message)
+        if wire_version is None:
+            wire_version = get_wire_version(sock)
+        # 长度前缀与内容一次写出，避免部分发送导致数据流错位
+        sock.sendall(encode_json_frame(data, wire_version))
         return True
     except (socket.error, TypeError, ValueError) as e:
         print(f"发送JSON失败: {e}")
         return False
 
 
-def receive_json(sock: socket.socket, buffer_size: int = 4096) -> Optional[Dict[str, Any]]:
+def send_frame(sock: socket.socket, frame: bytes) -> bool:
     """
-    安全接收JSON数据
+    发送已编码好的帧（广播时同一帧复用于多个连接）
     Args:
         sock: 已连接的socket对象
-        buffer_size: 初始缓冲区大小
+        frame: encode_json_frame 生成的帧字节
     Returns:
-        解析后的字典数据或None
+        是否发送成功
     """
     try:
-        # 先读取消息长度
-        length_bytes = sock.recv(4)
-        if not length_bytes:
-            return None
-
-        length = int.from_bytes(length_bytes, 'big')
-        received = bytearray()
-
-        # 分段接收直到收完所有数据
-        while len(received) < length:
-            chunk = sock.recv(min(buffer_size, length - len(received)))
-            if not chunk:
-                break
-            received.extend(chunk)
-
-        if not received:
-            return None
+        sock.sendall(frame)
+        return True
+    except socket.error as e:
+        print(f"发送帧失败: {e}")
+        return False
 
-        data = json.loads(received.decode('utf-8'))
 
-        # 验证校验和
-        calculated_checksum = hashlib.md5(json.dumps(data['payload']).encode()).hexdigest()
-        if calculated_checksum != data.get('checksum'):
-            print("校验和不匹配，数据可能损坏")
+@profiled('receive_json', cpu=False)  # 阻塞等待数据，不计入cProfile
+def receive_json(sock: socket.socket, buffer_size: int = DEFAULT_BUFFER_SIZE) -> Optional[Dict[str, Any]]:
+    """
+    安全接收JSON数据
+    Args:
+        sock: 已连接的socket对象
+        buffer_size: 该socket帧读取器的初始缓冲区大小
+    Returns:
+        解析后的字典数据或None
+    """
+    try:
+        # 使用该socket专用的帧读取器，长度头被拆包时也不会错位
+        frame = get_frame_reader(sock, buffer_size).read_frame()
+        if not frame:
             return None
-
-        return data['payload']
-    except (socket.error, json.JSONDecodeError, KeyError) as e:
+        return decode_json_frame(frame)
+    except (socket.error, ValueError, KeyError) as e:
         print(f"接收JSON失败: {e}")
         return None
 
@@ -177,4 +259,21 @@ def generate_session_id() -> str:
     """
     timestamp = int(datetime.now().timestamp() * 1000)
     random_part = uuid.uuid4().hex[:6]
-    return f"{timestamp}-{random_part}"
\ No newline at end of file
+    return f"{timestamp}-{random_part}"
+
+
+def backoff_delays(attempts: int = RECONNECT_ATTEMPTS, base: float = RECONNECT_BASE_DELAY,
+                   cap: float = RECONNECT_MAX_DELAY):
+    """
+    重连前的等待时间：指数退避，并在 [delay/2, delay] 之间随机取值，
+    避免主机恢复后大量客户端在同一时刻重连
+    Args:
+        attempts: 重连次数
+        base: 第一次的等待上限（秒），之后每次加倍
+        cap: 等待上限（秒）
+    Returns:
+        依次给出每次重连前等待秒数的迭代器
+    """
+    for attempt in range(attempts):
+        delay = min(cap, base * (2 ** attempt))
+        yield random.uniform(delay / 2, delay)
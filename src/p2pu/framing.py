@@ -0,0 +1,167 @@
+import socket
+import struct
+import threading
+import weakref
+from typing import Iterator, Optional
+
+# 帧格式: 4字节大端长度 + 帧内容
+HEADER_SIZE = 4
+_HEADER = struct.Struct('>I')
+DEFAULT_BUFFER_SIZE = 4096
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+class FrameTooLargeError(ValueError):
+    """帧长度超过允许的上限（通常意味着数据流已错位）"""
+
+
+class FrameReader:
+    """
+    长度前缀帧读取器
+    每个socket复用一块预分配缓冲区，通过 recv_into + memoryview 读取，
+    正确处理不完整的长度头和跨多次recv的帧，不再为每条消息分配新缓冲区。
+
+    返回的帧是缓冲区上的memoryview，只在下一次读取之前有效，
+    调用方需要在此之前完成解码（或自行 bytes() 复制）。
+    """
+
+    def __init__(self, sock: socket.socket, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 max_frame_size: int = MAX_FRAME_SIZE):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray(max(buffer_size, HEADER_SIZE))
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    @property
+    def pending(self) -> int:
+        """缓冲区中尚未消费的字节数"""
+        return self._end - self._start
+
+    @property
+    def capacity(self) -> int:
+        """当前缓冲区容量"""
+        return len(self._buffer)
+
+    def _frame_length(self) -> Optional[int]:
+        """解析当前帧的长度头，长度头不完整时返回None"""
+        if self._end - self._start < HEADER_SIZE:
+            return None
+        length = _HEADER.unpack_from(self._buffer, self._start)[0]
+        if length > self.max_frame_size:
+            raise FrameTooLargeError(f"帧长度 {length} 超过上限 {self.max_frame_size}")
+        return length
+
+    def _reserve(self):
+        """保证缓冲区尾部有空间容纳当前帧的剩余部分"""
+        pending = self._end - self._start
+        if pending == 0:
+            self._start = self._end = 0
+            return
+
+        length = self._frame_length()
+        needed = HEADER_SIZE + length if length is not None else HEADER_SIZE
+        needed = max(needed, pending + 1)
+
+        if needed > len(self._buffer):
+            # 帧比缓冲区大：换一块更大的缓冲区（旧缓冲区上可能仍有导出的视图，不能原地扩容）
+            new_buffer = bytearray(max(needed, len(self._buffer) * 2))
+            new_buffer[:pending] = self._view[self._start:self._end]
+            self._buffer = new_buffer
+            self._view = memoryview(new_buffer)
+            self._start, self._end = 0, pending
+        elif self._start + needed > len(self._buffer):
+            # 尾部空间不足：把未消费数据挪到缓冲区开头
+            self._view[:pending] = self._view[self._start:self._end]
+            self._start, self._end = 0, pending
+
+    def fill(self) -> int:
+        """
+        从socket读取一次数据到缓冲区
+        Returns:
+            读取的字节数，0表示对端已关闭连接
+        Raises:
+            socket.error: 底层读取失败（包括超时、非阻塞socket暂无数据）
+        """
+        self._reserve()
+        received = self.sock.recv_into(self._view[self._end:])
+        self._end += received
+        return received
+
+    def next_frame(self) -> Optional[memoryview]:
+        """
+        从缓冲区取出一个完整帧，不进行任何socket读取
+        Returns:
+            帧内容视图，缓冲区中没有完整帧时返回None
+        """
+        length = self._frame_length()
+        if length is None:
+            return None
+        frame_end = self._start + HEADER_SIZE + length
+        if frame_end > self._end:
+            return None
+        frame = self._view[self._start + HEADER_SIZE:frame_end]
+        self._start = frame_end
+        if self._start == self._end:
+            self._start = self._end = 0
+        return frame
+
+    def frames(self) -> Iterator[memoryview]:
+        """依次产出缓冲区中所有已完整到达的帧（适用于非阻塞socket）"""
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def read_frame(self) -> Optional[memoryview]:
+        """
+        阻塞读取下一个完整帧
+        Returns:
+            帧内容视图，连接关闭时返回None（未读完的残帧被丢弃）
+        """
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                return frame
+            if not self.fill():
+                return None
+
+    def __iter__(self) -> Iterator[memoryview]:
+        while True:
+            frame = self.read_frame()
+            if frame is None:
+                return
+            yield frame
+
+
+# 每个socket对应一个读取器，保证握手与后续消息循环共享同一缓冲区
+_readers: "weakref.WeakKeyDictionary[socket.socket, FrameReader]" = weakref.WeakKeyDictionary()
+_readers_lock = threading.Lock()
+
+
+def get_frame_reader(sock: socket.socket, buffer_size: int = DEFAULT_BUFFER_SIZE) -> FrameReader:
+    """
+    获取socket对应的帧读取器，不存在时创建
+    Args:
+        sock: 已连接的socket对象
+        buffer_size: 新建读取器的初始缓冲区大小
+    Returns:
+        该socket专用的FrameReader
+    """
+    reader = _readers.get(sock)
+    if reader is None:
+        with _readers_lock:
+            reader = _readers.get(sock)
+            if reader is None:
+                # 读取器只持有socket的弱代理，避免与弱键字典形成引用环
+                reader = FrameReader(weakref.proxy(sock), buffer_size)
+                _readers[sock] = reader
+    return reader
+
+
+def release_frame_reader(sock: socket.socket):
+    """释放socket对应的帧读取器（连接关闭时调用）"""
+    with _readers_lock:
+        _readers.pop(sock, None)
@@ -0,0 +1,177 @@
+import threading
+import time
+from ..config.settings import HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, HEARTBEAT_TICK, TIMER_WHEEL_SLOTS
+
+
+class TimerWheel:
+    """
+    哈希时间轮
+    到期时间按 tick 取整后散列到固定数量的槽中，超过一圈的定时器记录剩余圈数。
+    安排、取消都是O(1)，每个tick只检查一个槽，与定时器总数无关。
+    不是线程安全的，由调用方加锁。
+    """
+
+    def __init__(self, tick=HEARTBEAT_TICK, slots=TIMER_WHEEL_SLOTS, now=None):
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]  # 每个槽: {键: 剩余圈数}
+        self._where = {}  # 键 -> 所在槽
+        self._current = 0
+        self._time = time.monotonic() if now is None else now
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def schedule(self, key, delay, now=None):
+        """
+        安排（或重新安排）key 在 delay 秒后到期，精度为一个tick
+        Args:
+            now: 当前时间，默认为 time.monotonic()；空闲的时间轮（没有定时器、也没有人推进）
+                 先把时钟整tick地追到 now，否则下一次 advance 会补推空闲期间的所有tick，使定时器提前到期
+        """
+        self.cancel(key)
+        if not self._where:
+            if now is None:
+                now = time.monotonic()
+            if now > self._time:
+                self._time += (now - self._time) // self.tick * self.tick
+        ticks = max(1, -int(-delay // self.tick))
+        index = (self._current + ticks) % len(self._slots)
+        self._slots[index][key] = (ticks - 1) // len(self._slots)
+        self._where[key] = index
+
+    def cancel(self, key):
+        index = self._where.pop(key, None)
+        if index is not None:
+            del self._slots[index][key]
+
+    def advance(self, now=None):
+        """
+        推进到 now，依次处理经过的每个槽
+        Returns:
+            到期的键列表
+        """
+        if now is None:
+            now = time.monotonic()
+        expired = []
+        while self._time + self.tick <= now:
+            self._time += self.tick
+            self._current += 1
+            slot = self._slots[self._current % len(self._slots)]
+            if not slot:
+                continue
+            for key, rounds in list(slot.items()):
+                if rounds:
+                    slot[key] = rounds - 1
+                else:
+                    del slot[key]
+                    del self._where[key]
+                    expired.append(key)
+        return expired
+
+
+class HeartbeatMonitor:
+    """
+    应用层心跳：对空闲的对端发送ping，超时仍无任何数据到达则判定对端已失联
+    收到任何消息都算存活（seen 只更新时间戳），只有空闲超过 interval 的对端才会收到ping；
+    每个对端在时间轮中只有一个检查定时器，由后台线程按tick推进。
+    """
+
+    def __init__(self, send_ping, on_dead, interval=HEARTBEAT_INTERVAL, timeout=HEARTBEAT_TIMEOUT,
+                 tick=HEARTBEAT_TICK):
+        """
+        Args:
+            send_ping: send_ping(对端)，向空闲的对端发送ping
+            on_dead: on_dead(对端)，对端超过 timeout 没有任何消息到达
+            interval: 空闲多少秒后发送ping，0为关闭心跳
+            timeout: 多少秒没有任何消息到达判定为失联
+            tick: 时间轮精度（秒）
+        """
+        self.send_ping = send_ping
+        self.on_dead = on_dead
+        self.interval = interval
+        self.timeout = timeout
+        self.pings_sent = 0
+        self.dead_peers = 0
+        self._wheel = TimerWheel(tick)
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0 and self.timeout > 0
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def add(self, peer):
+        """开始监视一个对端（首次调用时启动后台线程）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._last_seen[peer] = time.monotonic()
+            self._wheel.schedule(peer, self.interval)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def remove(self, peer):
+        with self._lock:
+            if self._last_seen.pop(peer, None) is not None:
+                self._wheel.cancel(peer)
+
+    def seen(self, peer):
+        """对端有数据到达"""
+        if peer in self._last_seen:
+            with self._lock:
+                if peer in self._last_seen:
+                    self._last_seen[peer] = time.monotonic()
+
+    def tick(self, now=None):
+        """推进时间轮，对到期的对端发送ping或判定失联（回调在锁外执行）"""
+        if now is None:
+            now = time.monotonic()
+        pings, dead = [], []
+        with self._lock:
+            for peer in self._wheel.advance(now):
+                idle = now - self._last_seen[peer]
+                if idle >= self.timeout:
+                    del self._last_seen[peer]
+                    dead.append(peer)
+                elif idle >= self.interval:
+                    pings.append(peer)
+                    self._wheel.schedule(peer, min(self.interval, self.timeout - idle), now)
+                else:
+                    # 期间有数据到达，等它再空闲满 interval 时检查
+                    self._wheel.schedule(peer, self.interval - idle, now)
+
+        for peer in pings:
+            self.pings_sent += 1
+            self.send_ping(peer)
+        for peer in dead:
+            self.dead_peers += 1
+            self.on_dead(peer)
+
+    def _run(self):
+        while not self._stop.wait(self._wheel.tick):
+            self.tick()
+
+    def stop(self):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+
+    def stats(self):
+        return {
+            'peers': len(self._last_seen),
+            'pings_sent': self.pings_sent,
+            'dead_peers': self.dead_peers,
+            'interval': self.interval,
+            'timeout': self.timeout
+        }
@@ -0,0 +1,239 @@
+import atexit
+import collections
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from ..config.settings import PROFILE_ENABLED, PROFILE_DIR, PROFILE_SAMPLE_EVERY, PROFILE_SAMPLES
+
+# 环境变量开启剖析: 1=采样计时, cpu=采样计时+cProfile
+PROFILE_ENV = 'TRANSITCHAT_PROFILE'
+
+
+class _FunctionTimer:
+    """单个函数的调用次数与采样耗时"""
+
+    __slots__ = ('calls', 'timed', 'total', 'max', 'samples')
+
+    def __init__(self, samples):
+        self.calls = 0
+        self.timed = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=samples)  # 最近的采样，用于估算分位数
+
+    def record(self, elapsed):
+        self.timed += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.samples.append(elapsed)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+
+        def percentile(fraction):
+            return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000 if ordered else 0.0
+
+        return {
+            'calls': self.calls,
+            'timed': self.timed,
+            'mean_ms': self.total / self.timed * 1000 if self.timed else 0.0,
+            'p50_ms': percentile(0.5),
+            'p90_ms': percentile(0.9),
+            'p99_ms': percentile(0.99),
+            'max_ms': self.max * 1000
+        }
+
+
+class Profiler:
+    """
+    按需开启的剖析器
+    被 profiled 包装的函数在关闭时只多一次标志检查；开启后统计调用次数，每 sample_every 次
+    调用计时一次。cpu 模式下还为每个线程维护一个 cProfile，只在最外层被包装的短调用期间启用，
+    可随时合并导出；tracemalloc 快照按需导出。各函数的耗时汇总在进程退出时写入 directory。
+    """
+
+    def __init__(self, directory=PROFILE_DIR, sample_every=PROFILE_SAMPLE_EVERY, samples=PROFILE_SAMPLES):
+        self.directory = directory
+        self.sample_every = max(1, sample_every)
+        self.samples = samples
+        self.enabled = False
+        self.cpu_enabled = False
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cpu_profiles = []  # [(锁, cProfile.Profile)]，每个线程一个
+        self._exit_registered = False
+        self._summarized_calls = 0  # 上次写出汇总时的总调用次数，退出时没有新数据就不再重复写出
+
+    def enable(self, cpu=False):
+        """开启采样计时；cpu为True时同时收集cProfile"""
+        self.enabled = True
+        self.cpu_enabled = self.cpu_enabled or cpu
+        if not self._exit_registered:
+            self._exit_registered = True
+            atexit.register(self._write_summary_at_exit)
+
+    def disable(self):
+        """停止收集（已收集的数据保留，仍可导出）"""
+        self.enabled = False
+        self.cpu_enabled = False
+
+    def _timer(self, name):
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = _FunctionTimer(self.samples)
+            return timer
+
+    def _thread_profile(self):
+        entry = getattr(self._local, 'profile', None)
+        if entry is None:
+            entry = self._local.profile = (threading.Lock(), cProfile.Profile())
+            with self._lock:
+                self._cpu_profiles.append(entry)
+        return entry
+
+    def call(self, name, function, args, kwargs, cpu):
+        """在剖析下执行一次被包装的函数"""
+        timer = self._timers.get(name) or self._timer(name)
+        timer.calls += 1
+        entry = None
+        if cpu and self.cpu_enabled and not getattr(self._local, 'active', False):
+            # 只在最外层的短调用期间启用本线程的cProfile，嵌套调用计入外层
+            entry = self._thread_profile()
+            self._local.active = True
+            entry[0].acquire()
+            entry[1].enable()
+        try:
+            if timer.calls % self.sample_every:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timer.record(time.perf_counter() - started)
+        finally:
+            if entry is not None:
+                entry[1].disable()
+                entry[0].release()
+                self._local.active = False
+
+    def _path(self, prefix, suffix):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.directory, f"{prefix}-{os.getpid()}-{stamp}{suffix}")
+
+    def summary(self):
+        """
+        Returns:
+            {函数名: 调用次数与耗时分位数}，按总耗时估计值从高到低
+        """
+        with self._lock:
+            timers = dict(self._timers)
+        items = {name: timer.summary() for name, timer in timers.items()}
+        return dict(sorted(items.items(), key=lambda item: item[1]['mean_ms'] * item[1]['calls'], reverse=True))
+
+    def write_summary(self):
+        """
+        把各函数的耗时汇总写入JSON文件
+        Returns:
+            文件路径，没有任何数据时为None
+        """
+        summary = self.summary()
+        if not summary:
+            return None
+        self._summarized_calls = sum(item['calls'] for item in summary.values())
+        path = self._path('latency', '.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'pid': os.getpid(), 'timestamp': time.time(), 'sample_every': self.sample_every,
+                       'functions': summary}, f, ensure_ascii=False, indent=2)
+        return path
+
+    def _write_summary_at_exit(self):
+        with self._lock:
+            calls = sum(timer.calls for timer in self._timers.values())
+        if calls == self._summarized_calls:
+            return
+        try:
+            self.write_summary()
+        except OSError:
+            pass
+
+    def dump_cpu(self, limit=30):
+        """
+        合并各线程的cProfile数据，写出 .prof（可用 pstats/snakeviz 打开）和按累计耗时排序的文本
+        Returns:
+            .prof 文件路径，尚未收集到数据时为None
+        """
+        with self._lock:
+            entries = list(self._cpu_profiles)
+        stats = None
+        for lock, profile in entries:
+            with lock:
+                try:
+                    part = pstats.Stats(profile)
+                except TypeError:
+                    continue  # 该线程还没有任何记录
+            if stats is None:
+                stats = part
+            else:
+                stats.add(part)
+        if stats is None:
+            return None
+        path = self._path('cpu', '.prof')
+        stats.dump_stats(path)
+        with open(path[:-len('.prof')] + '.txt', 'w', encoding='utf-8') as f:
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(limit)
+        return path
+
+    def dump_memory(self, limit=30):
+        """
+        导出tracemalloc快照与按代码行汇总的前 limit 项；首次调用只开始跟踪
+        Returns:
+            快照文件路径，刚开始跟踪时为None
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        path = self._path('memory', '.snapshot')
+        snapshot.dump(path)
+        with open(path[:-len('.snapshot')] + '.txt', 'w', encoding='utf-8') as f:
+            for statistic in snapshot.statistics('lineno')[:limit]:
+                f.write(f"{statistic}\n")
+        return path
+
+
+profiler = Profiler()
+_profile_mode = os.environ.get(PROFILE_ENV, '').strip().lower()
+if PROFILE_ENABLED or _profile_mode in ('1', 'cpu'):  # 其他取值（0、false、off等）一律视为关闭
+    profiler.enable(cpu=_profile_mode == 'cpu')
+
+
+def profiled(name=None, cpu=True):
+    """
+    剖析装饰器：关闭剖析时只检查一次标志
+    Args:
+        name: 汇总中的名称，默认为函数的限定名
+        cpu: 是否计入cProfile；长时间运行（如连接处理循环）或会阻塞等待的函数应为False
+    """
+    def decorate(function):
+        label = name or function.__qualname__
+        state = profiler  # 闭包变量，比全局查找更快
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not state.enabled:
+                return function(*args, **kwargs)
+            return state.call(label, function, args, kwargs, cpu)
+
+        return wrapper
+
+    return decorate
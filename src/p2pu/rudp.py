@@ -0,0 +1,507 @@
+import queue
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from ..config.settings import (
+    RUDP_MTU, RUDP_WINDOW, RUDP_INITIAL_RTO, RUDP_MIN_RTO, RUDP_MAX_RTO, RUDP_MAX_RETRIES
+)
+
+# 数据报类型
+PACKET_SYN = 1   # 连接请求，占用编号0，与数据报一样可靠送达
+PACKET_DATA = 2  # 一条消息的一个分片
+PACKET_ACK = 3   # 累计确认 + 选择确认位图
+PACKET_FIN = 4   # 关闭连接（尽力送达）
+
+# 数据报头: 类型, 保留, 编号, 分片序号, 分片总数
+_DATA = struct.Struct('>BBIHH')
+# 确认: 类型, 保留, 下一个期望的编号, 其后64个编号的接收位图
+_ACK = struct.Struct('>BBIQ')
+SACK_BITS = 64
+RECEIVE_WINDOW = 4 * RUDP_WINDOW  # 超出期望编号这么远的数据报直接丢弃，限制接收缓冲
+FAST_RETRANSMIT_SKIPS = 3         # 被之后的确认跳过这么多次即立即重传
+LINGER_TIMEOUT = 2.0              # close() 等待在途数据被确认的期限（秒）
+
+
+class _Outgoing:
+    """一个等待确认的数据报"""
+
+    __slots__ = ('packet', 'sent_at', 'deadline', 'retries', 'skips', 'fast')
+
+    def __init__(self, packet, now, rto):
+        self.packet = packet
+        self.sent_at = now
+        self.deadline = now + rto
+        self.retries = 0
+        self.skips = 0
+        self.fast = False
+
+
+class RUDPConnection:
+    """
+    基于UDP的可靠消息连接
+    每次 sendall 是一条消息，按 RUDP_MTU 切成分片，每个分片一个编号。接收方对每个数据报回复
+    累计确认和其后64个编号的选择确认位图；发送方最多保持 RUDP_WINDOW 个在途数据报，
+    按测得的往返时间（RFC 6298）设置重传定时器，被之后的确认跳过3次的数据报立即重传。
+    消息按发送顺序交付（点对点聊天的 leave 不能越过之前的消息）；与TCP相比，丢失的数据报经选择确认与
+    快速重传通常在一个往返内补上，而不是等待最少200毫秒的重传超时。
+    提供 sendall / recv_into / recv / settimeout / shutdown / close 等与socket相同的方法，
+    send_json、receive_json 与帧读取器可以直接使用（交付的每条消息都是完整的帧）。
+    """
+
+    def __init__(self, endpoint, address, expected):
+        self._endpoint = endpoint
+        self.address = address
+        self._cond = threading.Condition()
+        self._timeout = None
+        self.closed = False
+        # 发送
+        self._next_seq = 1
+        self._unacked = {}  # 编号 -> _Outgoing
+        self._srtt = None
+        self._rttvar = 0.0
+        self.rto = RUDP_INITIAL_RTO
+        # 接收
+        self._expected = expected  # 该编号之前的数据报都已收到
+        self._out_of_order = {}    # 先于 _expected 到达的数据报: 编号 -> (类型, 分片序号, 分片总数, 内容)
+        self._parts = []           # 正在按顺序拼接的消息分片
+        self._inbox = deque()      # 已完整到达、等待读取的消息
+        self._current = memoryview(b'')  # 正在被读取的消息的剩余部分
+        # 统计
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.retransmits = 0
+        self.fast_retransmits = 0
+
+    # ---- socket 兼容接口 ----
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def gettimeout(self):
+        return self._timeout
+
+    def getpeername(self):
+        return self.address
+
+    def fileno(self):
+        return -1 if self.closed else self._endpoint.sock.fileno()
+
+    def sendall(self, data):
+        """
+        发送一条消息（窗口已满时等待确认）
+        Raises:
+            socket.timeout: 设置了超时且窗口一直没有空位
+            BrokenPipeError: 连接已关闭
+        """
+        data = bytes(data)
+        chunk = RUDP_MTU - _DATA.size
+        frags = max(1, -(-len(data) // chunk))
+        if frags > 0xFFFF:
+            raise ValueError(f"消息过大: {len(data)} 字节")
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._cond:
+            for index in range(frags):
+                while len(self._unacked) >= RUDP_WINDOW and not self.closed:
+                    self._wait(deadline)
+                if self.closed:
+                    raise BrokenPipeError("连接已关闭")
+                seq = self._next_seq
+                self._next_seq += 1
+                packet = _DATA.pack(PACKET_DATA, 0, seq, index, frags) + data[index * chunk:(index + 1) * chunk]
+                outgoing = self._unacked[seq] = _Outgoing(packet, time.monotonic(), self.rto)
+                self._transmit(packet)
+                self._endpoint.wake_before(outgoing.deadline)
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def recv_into(self, buffer, nbytes=0):
+        """
+        读取已交付的消息字节
+        Returns:
+            读取的字节数，0表示连接已关闭
+        Raises:
+            socket.timeout: 设置了超时且期间没有消息到达
+        """
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._cond:
+            while not self._current and not self._inbox:
+                if self.closed:
+                    return 0
+                self._wait(deadline)
+            if not self._current:
+                self._current = memoryview(self._inbox.popleft())
+            size = min(nbytes or len(buffer), len(buffer), len(self._current))
+            buffer[:size] = self._current[:size]
+            self._current = self._current[size:]
+            return size
+
+    def recv(self, bufsize):
+        buffer = bytearray(bufsize)
+        size = self.recv_into(buffer)
+        return bytes(buffer[:size])
+
+    def shutdown(self, how=socket.SHUT_RDWR):
+        """立即结束连接并唤醒阻塞在读写上的线程（不等待在途数据）"""
+        self._terminate(send_fin=True)
+
+    def close(self):
+        """在 LINGER_TIMEOUT 内等待在途消息被确认后结束连接"""
+        deadline = time.monotonic() + LINGER_TIMEOUT
+        with self._cond:
+            while self._unacked and not self.closed and time.monotonic() < deadline:
+                self._cond.wait(max(0.0, deadline - time.monotonic()))
+        self._terminate(send_fin=True)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'packets_sent': self.packets_sent,
+                'packets_received': self.packets_received,
+                'retransmits': self.retransmits,
+                'fast_retransmits': self.fast_retransmits,
+                'in_flight': len(self._unacked),
+                'srtt_ms': self._srtt * 1000 if self._srtt is not None else None,
+                'rto_ms': self.rto * 1000
+            }
+
+    # ---- 协议 ----
+
+    def _wait(self, deadline):
+        """等待状态变化（调用方持有锁）"""
+        if deadline is None:
+            self._cond.wait()
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("timed out")
+        self._cond.wait(remaining)
+
+    def _transmit(self, packet):
+        self.packets_sent += 1
+        self._endpoint.sendto(packet, self.address)
+
+    def _send_syn(self):
+        """连接方：以编号0发送连接请求，随后的数据无需等待回复即可发出"""
+        with self._cond:
+            packet = _DATA.pack(PACKET_SYN, 0, 0, 0, 1)
+            outgoing = self._unacked[0] = _Outgoing(packet, time.monotonic(), self.rto)
+            self._transmit(packet)
+            self._endpoint.wake_before(outgoing.deadline)
+
+    def _terminate(self, send_fin):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._unacked.clear()
+            self._cond.notify_all()
+        if send_fin:
+            self._endpoint.sendto(_DATA.pack(PACKET_FIN, 0, 0, 0, 0), self.address)
+        self._endpoint.remove(self)
+
+    def _on_packet(self, data):
+        """处理一个到达的数据报（端点线程调用）"""
+        if len(data) < 1:
+            return
+        kind = data[0]
+        if kind == PACKET_ACK and len(data) >= _ACK.size:
+            _, _, cumulative, bitmap = _ACK.unpack_from(data)
+            self._on_ack(cumulative, bitmap)
+        elif kind in (PACKET_DATA, PACKET_SYN) and len(data) >= _DATA.size:
+            _, _, seq, index, frags = _DATA.unpack_from(data)
+            self._on_data(kind, seq, index, frags, data[_DATA.size:])
+        elif kind == PACKET_FIN:
+            self._terminate(send_fin=False)
+
+    def _on_data(self, kind, seq, index, frags, payload):
+        with self._cond:
+            if self.closed:
+                return
+            self.packets_received += 1
+            if seq >= self._expected + RECEIVE_WINDOW:
+                return  # 超出接收窗口，不确认，等发送方重传
+            if seq >= self._expected:
+                self._out_of_order[seq] = (kind, index, frags, payload)
+                while self._expected in self._out_of_order:
+                    self._accept(*self._out_of_order.pop(self._expected))
+                    self._expected += 1
+            # 重复的数据报也要确认（之前的确认可能丢失）
+            bitmap = 0
+            for seq in self._out_of_order:
+                offset = seq - self._expected - 1
+                if offset < SACK_BITS:
+                    bitmap |= 1 << offset
+            ack = _ACK.pack(PACKET_ACK, 0, self._expected, bitmap)
+        self._endpoint.sendto(ack, self.address)
+
+    def _accept(self, kind, index, frags, payload):
+        """按顺序处理一个数据报，消息的最后一个分片到达时交付（调用方持有锁）"""
+        if kind != PACKET_DATA or index != len(self._parts) or index >= frags:
+            self._parts = []  # 连接请求，或对方发来的分片不连贯
+            return
+        self._parts.append(payload)
+        if index == frags - 1:
+            message = self._parts[0] if frags == 1 else b''.join(self._parts)
+            self._parts = []
+            self._inbox.append(message)
+            self._cond.notify_all()
+
+    def _on_ack(self, cumulative, bitmap):
+        now = time.monotonic()
+        with self._cond:
+            acked = [seq for seq in self._unacked
+                     if seq < cumulative or (seq > cumulative and (bitmap >> (seq - cumulative - 1)) & 1)]
+            if not acked:
+                return
+            sample = None
+            for seq in acked:
+                outgoing = self._unacked.pop(seq)
+                if outgoing.retries == 0 and not outgoing.fast:
+                    sample = now - outgoing.sent_at  # 只用未重传过的数据报估计往返时间
+            if sample is not None:
+                self._update_rto(sample)
+
+            # 被之后的确认跳过的数据报多半已丢失，不必等到重传超时
+            highest = max(acked)
+            for seq, outgoing in self._unacked.items():
+                if seq < highest:
+                    outgoing.skips += 1
+                    if outgoing.skips >= FAST_RETRANSMIT_SKIPS and not outgoing.fast:
+                        outgoing.fast = True
+                        outgoing.deadline = now + self.rto
+                        self.fast_retransmits += 1
+                        self.retransmits += 1
+                        self._transmit(outgoing.packet)
+            self._cond.notify_all()
+
+    def _update_rto(self, sample):
+        """RFC 6298 的平滑往返时间与重传超时（调用方持有锁）"""
+        if self._srtt is None:
+            self._srtt = sample
+            self._rttvar = sample / 2
+        else:
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - sample)
+            self._srtt = 0.875 * self._srtt + 0.125 * sample
+        self.rto = min(RUDP_MAX_RTO, max(RUDP_MIN_RTO, self._srtt + 4 * self._rttvar))
+
+    def _next_deadline(self):
+        """最近的重传期限，没有在途数据报时为 None（端点线程调用）"""
+        with self._cond:
+            return min((outgoing.deadline for outgoing in self._unacked.values()), default=None)
+
+    def _tick(self, now):
+        """重传到期的数据报；重传次数用尽时判定连接已断开（端点线程调用）"""
+        failed = False
+        with self._cond:
+            for outgoing in self._unacked.values():
+                if now < outgoing.deadline:
+                    continue
+                if outgoing.retries >= RUDP_MAX_RETRIES:
+                    failed = True
+                    break
+                outgoing.retries += 1
+                outgoing.deadline = now + min(RUDP_MAX_RTO, self.rto * (2 ** outgoing.retries))
+                self.retransmits += 1
+                self._transmit(outgoing.packet)
+        if failed:
+            self._terminate(send_fin=False)
+
+
+class _Endpoint:
+    """
+    一个UDP socket及其后台线程：接收数据报并分发给对应的连接，在最近的重传期限到达时推进重传定时器。
+    没有在途数据报时线程一直阻塞到有数据报到达（空闲连接不会定时唤醒）；其他线程发出新数据报时
+    若其期限早于线程当前的等待期限，经内部的socket对唤醒线程重新计算。
+    监听端点按对方地址区分连接，收到连接请求时创建新连接并放入 accept 队列；
+    连接端点只有一个连接。不再接受新连接后，最后一个连接结束时关闭socket。
+    """
+
+    def __init__(self, sock, listening, loss=0.0):
+        self.sock = sock
+        self.single = not listening
+        self.listening = listening  # 是否接受新连接
+        self.connections = {}  # 对方地址 -> RUDPConnection
+        self.accepted = queue.Queue()
+        self.closed = False
+        # 测试用的丢包注入：按概率丢弃发出的数据报
+        self.loss = loss
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self.sock.settimeout(None)
+        # 唤醒：_sleep_until 为线程当前等待到的时刻（正在计算或无限期等待时为 inf）
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._wake_lock = threading.Lock()
+        self._sleep_until = float('inf')
+        self._woken = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def sendto(self, packet, address):
+        if self.loss and self._random.random() < self.loss:
+            return
+        try:
+            self.sock.sendto(packet, address)
+        except OSError:
+            pass
+
+    def wake_before(self, deadline):
+        """确保线程在 deadline 之前醒来（新的在途数据报的重传期限早于当前等待期限时唤醒）"""
+        with self._wake_lock:
+            if deadline >= self._sleep_until or self._woken:
+                return
+            self._woken = True
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # 缓冲区已满（线程必然会醒来）或已关闭
+
+    def remove(self, connection):
+        with self._lock:
+            if self.connections.get(connection.address) is connection:
+                del self.connections[connection.address]
+            empty = not self.connections
+        if empty and not self.listening:
+            self.close()
+
+    def stop_listening(self):
+        """不再接受新连接，已建立的连接照常工作（与关闭TCP监听socket相同）"""
+        with self._lock:
+            self.listening = False
+            empty = not self.connections
+        self.accepted.put((None, None))
+        if empty:
+            self.close()
+
+    def _dispatch(self, data, address):
+        with self._lock:
+            connection = self.connections.get(address)
+            if connection is None and self.single and self.connections:
+                # 连接端点只有一个连接（对方地址的表示形式可能与连接时不同）
+                connection = next(iter(self.connections.values()))
+            if connection is None and self.listening and data[:1] == bytes([PACKET_SYN]):
+                connection = self.connections[address] = RUDPConnection(self, address, expected=0)
+                self.accepted.put((connection, address))
+        if connection is not None:
+            connection._on_packet(data)
+
+    def _next_deadline(self):
+        """所有连接中最近的重传期限，并记为线程的等待期限（None 表示无限期等待）"""
+        with self._wake_lock:
+            self._sleep_until = float('inf')  # 计算期间新发出的数据报都会唤醒线程
+        with self._lock:
+            connections = list(self.connections.values())
+        deadlines = [connection._next_deadline() for connection in connections]
+        deadline = min((value for value in deadlines if value is not None), default=None)
+        with self._wake_lock:
+            if deadline is not None:
+                self._sleep_until = deadline
+        return deadline
+
+    def _run(self):
+        try:
+            while not self.closed:
+                deadline = self._next_deadline()
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    readable, _, _ = select.select([self.sock, self._wake_r], [], [], timeout)
+                except (OSError, ValueError):
+                    break  # socket已关闭
+                if self._wake_r in readable:
+                    with self._wake_lock:
+                        self._woken = False
+                    try:
+                        self._wake_r.recv(4096)
+                    except OSError:
+                        pass
+                if self.sock in readable:
+                    try:
+                        data, address = self.sock.recvfrom(65535)
+                        self._dispatch(data, address)
+                    except OSError:
+                        if self.closed:
+                            break
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    with self._lock:
+                        connections = list(self.connections.values())
+                    for connection in connections:
+                        connection._tick(now)
+        finally:
+            for sock in (self.sock, self._wake_r, self._wake_w):
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+
+    def close(self):
+        """结束端点；socket由后台线程退出时关闭"""
+        if self.closed:
+            return
+        self.closed = True
+        self.accepted.put((None, None))
+        self._wake()
+
+
+class RUDPListener:
+    """可靠UDP监听端：与TCP监听socket一样用 accept() 逐个取得新连接"""
+
+    def __init__(self, port, loss=0.0):
+        try:
+            sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+            sock.bind(('::', port))
+        except OSError:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('0.0.0.0', port))
+        self.port = sock.getsockname()[1]
+        self._endpoint = _Endpoint(sock, listening=True, loss=loss)
+
+    def accept(self):
+        """
+        等待下一个连接
+        Returns:
+            (RUDPConnection, 对方地址)
+        Raises:
+            OSError: 监听端已关闭
+        """
+        connection, address = self._endpoint.accepted.get()
+        if connection is None:
+            self._endpoint.accepted.put((None, None))  # 让其他等待者也能退出
+            raise OSError("监听已关闭")
+        return connection, address
+
+    def close(self):
+        """停止监听；已接受的连接不受影响，全部结束后释放socket"""
+        self._endpoint.stop_listening()
+
+
+def connect_rudp(address, loss=0.0):
+    """
+    连接可靠UDP监听端
+    连接请求与随后的消息一起发出，不等待对方回复（省去TCP三次握手的往返），
+    对方不存在时重传用尽后连接结束，读取返回0。
+    Args:
+        address: 对方地址，(主机, 端口) 或IPv6的 (主机, 端口, 流标签, 范围ID)
+        loss: 测试用的丢包率
+    Returns:
+        RUDPConnection
+    """
+    family = socket.AF_INET if len(address) == 2 else socket.AF_INET6
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    endpoint = _Endpoint(sock, listening=False, loss=loss)
+    connection = RUDPConnection(endpoint, address, expected=1)
+    with endpoint._lock:
+        endpoint.connections[address] = connection
+    connection._send_syn()
+    return connection
@@ -1,5 +1,6 @@
 # src/room/__init__.py
-from .room_host import create_chat_room, ChatRoomHost
+from .room_host import create_chat_room, create_host, ChatRoomHost
+from .room_host_async import AsyncChatRoomHost
 from .room_join import join_chat_room, ChatRoomClient
 
-__all__ = ['create_chat_room', 'ChatRoomHost', 'join_chat_room', 'ChatRoomClient']
\ No newline at end of file
+__all__ = ['create_chat_room', 'create_host', 'ChatRoomHost', 'AsyncChatRoomHost', 'join_chat_room', 'ChatRoomClient']
\ No newline at end of file
@@ -0,0 +1,53 @@
+# src/room/channel.py
+import socket
+import threading
+from ..p2pu import encode_json_frame, receive_json, send_frame, set_wire_version
+from ..p2pu.core_utils import WIRE_V2
+from .outbound import OutboundQueue
+
+CHANNEL_HIGH_WATER_BYTES = 8 * 1024 * 1024  # 通道积压超过后丢弃加入/离开通知
+CHANNEL_MAX_BYTES = 64 * 1024 * 1024
+
+
+class FrameChannel:
+    """
+    主机内部的长连接通道：主进程与工作进程之间（socketpair），或联邦主机之间（TCP）
+    消息为v2格式的长度前缀JSON帧；发送只入队，由通道自己的写线程写出，
+    不会阻塞事件循环或转发线程。积压超过 CHANNEL_MAX_BYTES 时发送失败，由调用方断开。
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        set_wire_version(sock, WIRE_V2)
+        self.queue = OutboundQueue(CHANNEL_HIGH_WATER_BYTES, CHANNEL_MAX_BYTES)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None or not send_frame(self.sock, frame):
+                break
+
+    def send(self, message):
+        return self.send_frame(encode_json_frame(message, WIRE_V2))
+
+    def send_frame(self, frame):
+        return self.queue.put(frame)
+
+    def receive(self):
+        return receive_json(self.sock)
+
+    def close(self, timeout=None):
+        """关闭通道，先等待已排队的消息写出，再唤醒阻塞在读取上的线程"""
+        self.queue.close()
+        if self._writer is not threading.current_thread():
+            self._writer.join(timeout)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
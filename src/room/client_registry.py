@@ -0,0 +1,83 @@
+# src/room/client_registry.py
+import threading
+
+
+class ClientRegistry:
+    """
+    线程安全的客户端登记表（写时复制）
+    增删在锁内生成新的字典和快照元组后整体替换，读操作不加锁：
+    广播直接遍历当前快照，无需每次复制 list(self.clients.keys())，
+    也不会因其他线程的增删而出错。remove 是原子的，同一客户端只会被移除一次。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._snapshot = ()
+        self.version = 0
+
+    def _publish(self, clients):
+        """替换为新的字典与快照（调用方持有锁）"""
+        self._clients = clients
+        self._snapshot = tuple(clients.items())
+        self.version += 1
+
+    def add(self, client, info):
+        """登记客户端"""
+        with self._lock:
+            clients = dict(self._clients)
+            clients[client] = info
+            self._publish(clients)
+
+    def remove(self, client):
+        """
+        移除客户端
+        Returns:
+            被移除的客户端信息；已被其他线程移除时返回None
+        """
+        with self._lock:
+            if client not in self._clients:
+                return None
+            clients = dict(self._clients)
+            info = clients.pop(client)
+            self._publish(clients)
+            return info
+
+    def pop(self, client, default=None):
+        info = self.remove(client)
+        return default if info is None else info
+
+    def clear(self):
+        """移除全部客户端并返回移除前的快照"""
+        with self._lock:
+            snapshot = self._snapshot
+            self._publish({})
+            return snapshot
+
+    def snapshot(self):
+        """当前所有 (客户端, 信息) 的不可变快照"""
+        return self._snapshot
+
+    def items(self):
+        return self._snapshot
+
+    def keys(self):
+        return [client for client, _ in self._snapshot]
+
+    def values(self):
+        return [info for _, info in self._snapshot]
+
+    def get(self, client, default=None):
+        return self._clients.get(client, default)
+
+    def __getitem__(self, client):
+        return self._clients[client]
+
+    def __contains__(self, client):
+        return client in self._clients
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __iter__(self):
+        return iter(self.keys())
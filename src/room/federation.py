@@ -0,0 +1,408 @@
+# src/room/federation.py
+import collections
+import hashlib
+import hmac
+import itertools
+import secrets
+import socket
+import threading
+from ..p2pu import (
+    create_dual_stack_socket, resolve_hostname, connect_to_any_address, encode_json_frame, generate_session_id
+)
+from ..p2pu.core_utils import WIRE_V2
+from ..ui.display_utils import display_system_message
+from ..config.settings import (
+    FEDERATION_PORT, FEDERATION_RETRY_INTERVAL, FEDERATION_DEDUP_SIZE, FEDERATION_MAX_HOPS,
+    FEDERATION_SECRET, FEDERATION_ALLOWED_PEERS, FEDERATION_MAX_PENDING, HANDSHAKE_TIMEOUT, CONNECTION_TIMEOUT, LISTEN_BACKLOG
+)
+from .channel import FrameChannel
+
+ACCEPT_POLL_INTERVAL = 0.5  # 监听线程检查是否已停止的间隔（秒）
+
+
+class FederationLink:
+    """与另一台主机之间的一条联邦连接"""
+
+    def __init__(self, channel, peer_uid, address, outgoing):
+        self.channel = channel
+        self.peer_uid = peer_uid
+        self.address = address
+        self.outgoing = outgoing  # 是否由本主机发起（断开后由本主机重连）
+        self.messages_in = 0
+        self.messages_out = 0
+
+    def abort(self):
+        """中断连接，读取线程随即收到EOF并完成清理（不阻塞调用方）"""
+        try:
+            self.channel.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {
+            'peer_uid': self.peer_uid,
+            'address': f"{self.address[0]}:{self.address[1]}",
+            'outgoing': self.outgoing,
+            'messages_in': self.messages_in,
+            'messages_out': self.messages_out,
+            'backlog_bytes': self.channel.queue.stats()['bytes']
+        }
+
+
+class Federation:
+    """
+    主机联邦：多台主机以同一房间ID组成一个逻辑聊天室
+    每台主机只服务自己的成员，房间广播包装成带全局唯一消息ID的信封，经主机间的长连接
+    发给所有相连的主机；收到的信封按消息ID去重后交给本机成员，再转发给来源以外的连接。
+    拓扑中有环时同一条消息会从多条路径到达，只有第一份被处理，其余计为重复丢弃；
+    跳数上限只作为去重窗口失效时的保护。
+    房间ID即加入聊天室所需的全部凭据：只有通过密钥或地址验证的主机才能建立联邦连接，
+    且只有用 share 标记为联邦的聊天室会被告知对方、转发和接收，其他聊天室对联邦不可见。
+    """
+
+    def __init__(self, host_uid, local_rooms, deliver, port=FEDERATION_PORT,
+                 dedup_size=FEDERATION_DEDUP_SIZE, max_hops=FEDERATION_MAX_HOPS,
+                 retry_interval=FEDERATION_RETRY_INTERVAL, secret=FEDERATION_SECRET,
+                 allowed_peers=FEDERATION_ALLOWED_PEERS, max_pending=FEDERATION_MAX_PENDING):
+        """
+        Args:
+            host_uid: 本主机的UID
+            local_rooms: local_rooms() -> {房间ID: 名称}，其中标记为联邦的聊天室在握手时告知对方
+            deliver: deliver(房间ID, 消息字典)，把其他主机转发来的消息发给本机成员
+            port: 主机间连接的监听端口，0为由系统分配
+            dedup_size: 记住最近多少个消息ID
+            max_hops: 转发跳数上限
+            retry_interval: 主动建立的连接断开后的重连间隔（秒）
+            secret: 各主机相同的共享密钥，握手双方都要出示
+            allowed_peers: 允许发起联邦连接的主机IP；与 secret 都未配置时拒绝所有联邦连接
+            max_pending: 同时进行的联邦握手上限，超出的新连接直接关闭
+        """
+        self.host_uid = host_uid
+        self.local_rooms = local_rooms
+        self.deliver = deliver
+        self.port = port
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.allowed_peers = set(allowed_peers or ())
+        self.shared_rooms = set()  # 标记为联邦的房间ID
+        self.max_hops = max_hops
+        self.retry_interval = retry_interval
+        self.max_pending = max_pending
+        self._pending = 0  # 正在握手的对方发起的连接数
+        # 消息ID = 本次运行的来源标识 + 递增序号，主机重启后不会与旧ID冲突
+        self._origin = f"{host_uid}-{generate_session_id()}"
+        self._sequence = itertools.count()
+        self._seen = set()
+        self._seen_order = collections.deque(maxlen=dedup_size)
+        self._lock = threading.Lock()
+        self._links = []  # 写时复制，发送路径无需加锁遍历
+        self._stop = threading.Event()
+        self._listener = None
+        self.published = 0
+        self.delivered = 0
+        self.duplicates = 0
+        self.hop_limited = 0
+        self.rejected = 0  # 未通过验证的联邦连接与格式不对的信封
+
+    def share(self, room_uid):
+        """把聊天室标记为联邦：告知相连的主机，并转发、接收它的消息"""
+        with self._lock:
+            self.shared_rooms.add(room_uid)
+
+    def unshare(self, room_uid):
+        with self._lock:
+            self.shared_rooms.discard(room_uid)
+
+    def _shared_room_names(self):
+        """握手时告知对方的聊天室 {房间ID: 名称}"""
+        return {room_uid: name for room_uid, name in self.local_rooms().items() if room_uid in self.shared_rooms}
+
+    def _proof(self, label, uid, nonce):
+        """握手中证明持有共享密钥的HMAC，未配置密钥时为None"""
+        if not self.secret:
+            return None
+        return hmac.new(self.secret, f"{label}:{uid}:{nonce}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _verify(self, proof, label, uid, nonce):
+        expected = self._proof(label, uid, nonce)
+        return expected is None or (isinstance(proof, str) and hmac.compare_digest(proof, expected))
+
+    def _peer_allowed(self, address):
+        """对方地址是否在允许列表中（IPv4映射的IPv6地址按IPv4比较），未配置允许列表时不限制"""
+        if not self.allowed_peers:
+            return True
+        host = address[0]
+        if host.startswith('::ffff:'):
+            host = host[len('::ffff:'):]
+        return host in self.allowed_peers
+
+    def start(self):
+        """
+        开始监听其他主机的联邦连接
+        Returns:
+            是否监听成功（实际端口见 self.port）
+        """
+        listener = create_dual_stack_socket()
+        if not listener:
+            return False
+        try:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(('::' if listener.family == socket.AF_INET6 else '0.0.0.0', self.port))
+            listener.listen(LISTEN_BACKLOG)
+        except OSError as e:
+            display_system_message(f"联邦端口 {self.port} 监听失败: {e}")
+            listener.close()
+            return False
+        listener.settimeout(ACCEPT_POLL_INTERVAL)
+        self.port = listener.getsockname()[1]
+        self._listener = listener
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return True
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                sock, address = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            with self._lock:
+                admitted = self._pending < self.max_pending
+                if admitted:
+                    self._pending += 1
+            if not admitted:
+                # 待握手连接过多（验证之前不为其占用线程），直接关闭
+                sock.close()
+                continue
+            threading.Thread(target=self._serve_incoming, args=(sock, address), daemon=True).start()
+
+    def _serve_incoming(self, sock, address):
+        """完成对方发起的联邦握手，之后读取该连接直到断开"""
+        try:
+            link = self._accept_handshake(sock, address)
+        finally:
+            with self._lock:
+                self._pending -= 1
+        if link is not None:
+            self._add_link(link)
+            self._read_link(link)
+
+    def _accept_handshake(self, sock, address):
+        """
+        验证对方发起的联邦握手
+        Returns:
+            通过验证的 FederationLink，否则为None（连接已关闭）
+        """
+        sock.settimeout(HANDSHAKE_TIMEOUT)
+        channel = FrameChannel(sock)
+        hello = channel.receive()
+        if not hello or hello.get('type') != 'federate':
+            channel.close(timeout=1)
+            return None
+        if hello.get('uid') == self.host_uid:
+            # 连到了自己
+            channel.send({'type': 'federate_failed', 'message': '不能与本主机互联'})
+            channel.close(timeout=1)
+            return None
+        uid, nonce = hello.get('uid'), hello.get('nonce')
+        if not self.secret and not self.allowed_peers:
+            reason = '对方主机未配置联邦密钥或允许的主机'
+        elif not isinstance(uid, str) or not isinstance(nonce, str):
+            reason = '握手格式错误'
+        elif not self._peer_allowed(address) or not self._verify(hello.get('auth'), 'federate', uid, nonce):
+            reason = '联邦验证失败'
+        else:
+            reason = None
+        if reason is not None:
+            self.rejected += 1
+            display_system_message(f"拒绝来自 {address[0]} 的联邦连接: {reason}")
+            channel.send({'type': 'federate_failed', 'message': reason})
+            channel.close(timeout=1)
+            return None
+        channel.send({'type': 'federate_success', 'uid': self.host_uid,
+                      'auth': self._proof('federate_success', self.host_uid, nonce),
+                      'rooms': self._shared_room_names()})
+        sock.settimeout(None)
+        return FederationLink(channel, uid, address[:2], outgoing=False)
+
+    def connect(self, address, port):
+        """
+        与另一台主机建立联邦连接，断开后每隔 retry_interval 秒自动重连
+        Returns:
+            对方的聊天室 {房间ID: 名称}，连接失败时为None
+        """
+        link, rooms = self._open_link(address, port)
+        if link is None:
+            return None
+        threading.Thread(target=self._outgoing_loop, args=(address, port, link), daemon=True).start()
+        return rooms
+
+    def _open_link(self, address, port):
+        """
+        连接并完成联邦握手
+        Returns:
+            (连接, 对方的聊天室)，失败时为 (None, None)
+        """
+        sock = connect_to_any_address(resolve_hostname(address, port), CONNECTION_TIMEOUT)
+        if sock is None:
+            return None, None
+        sock.settimeout(HANDSHAKE_TIMEOUT)
+        channel = FrameChannel(sock)
+        nonce = secrets.token_hex(16)
+        channel.send({'type': 'federate', 'uid': self.host_uid, 'nonce': nonce,
+                      'auth': self._proof('federate', self.host_uid, nonce)})
+        reply = channel.receive()
+        if not reply or reply.get('type') != 'federate_success':
+            if reply:
+                display_system_message(f"联邦连接被拒绝: {reply.get('message', '')}")
+            channel.close(timeout=1)
+            return None, None
+        if not self._verify(reply.get('auth'), 'federate_success', reply.get('uid'), nonce):
+            # 对方不持有共享密钥
+            self.rejected += 1
+            display_system_message(f"主机 {address}:{port} 未通过联邦验证")
+            channel.close(timeout=1)
+            return None, None
+        sock.settimeout(None)
+        link = FederationLink(channel, reply.get('uid', 'Unknown'), (address, port), outgoing=True)
+        self._add_link(link)
+        rooms = reply.get('rooms')
+        return link, rooms if isinstance(rooms, dict) else {}
+
+    def _outgoing_loop(self, address, port, link):
+        """读取本主机发起的连接，断开后按间隔重连，直到联邦关闭"""
+        while True:
+            if link is not None:
+                self._read_link(link)
+            if self._stop.wait(self.retry_interval):
+                return
+            link, _ = self._open_link(address, port)
+
+    def _add_link(self, link):
+        with self._lock:
+            self._links = self._links + [link]
+        display_system_message(f"已与主机 {link.peer_uid} ({link.address[0]}:{link.address[1]}) 建立联邦连接")
+
+    def _read_link(self, link):
+        """读取一条联邦连接直到断开，断开（或处理出错）后将其移除"""
+        try:
+            while True:
+                envelope = link.channel.receive()
+                if not envelope:
+                    break
+                if envelope.get('type') == 'federated':
+                    self._receive(link, envelope)
+        finally:
+            with self._lock:
+                self._links = [item for item in self._links if item is not link]
+            link.channel.close(timeout=1)
+        if not self._stop.is_set():
+            display_system_message(f"与主机 {link.peer_uid} 的联邦连接已断开")
+
+    def _first_seen(self, message_id):
+        """
+        记录消息ID
+        Returns:
+            该ID此前是否未出现过（窗口满后淘汰最早的ID）
+        """
+        with self._lock:
+            if message_id in self._seen:
+                return False
+            if len(self._seen_order) == self._seen_order.maxlen:
+                self._seen.discard(self._seen_order[0])
+            self._seen_order.append(message_id)
+            self._seen.add(message_id)
+            return True
+
+    def publish(self, room_uid, message_data):
+        """把本机成员在联邦聊天室中的聊天消息发给所有相连的主机（只编码一次）"""
+        if not self._links or room_uid not in self.shared_rooms or message_data.get('type') != 'message':
+            return
+        message_id = f"{self._origin}:{next(self._sequence)}"
+        self._first_seen(message_id)  # 经环路绕回本机时按重复丢弃
+        self.published += 1
+        self._send(encode_json_frame({
+            'type': 'federated',
+            'id': message_id,
+            'room_uid': room_uid,
+            'hops': 0,
+            'message': message_data
+        }, WIRE_V2))
+
+    def _receive(self, link, envelope):
+        """
+        处理其他主机转发来的信封：校验、去重、交给本机成员、再转发给其他连接
+        只接受联邦聊天室中的聊天消息，并且只保留聊天消息的字段（对方不能伪造系统通知等）
+        """
+        link.messages_in += 1
+        try:
+            message_id, room_uid, message_data = envelope['id'], envelope['room_uid'], envelope['message']
+            hops = int(envelope.get('hops', 0)) + 1
+            if (not isinstance(message_id, str) or not isinstance(room_uid, str) or hops < 1
+                    or message_data.get('type') != 'message' or not isinstance(message_data.get('sender'), str)
+                    or not isinstance(message_data.get('message'), str)):
+                raise ValueError(envelope)
+        except (KeyError, TypeError, ValueError, AttributeError, OverflowError):
+            self.rejected += 1
+            return
+        if room_uid not in self.shared_rooms:
+            self.rejected += 1
+            return
+        if not self._first_seen(message_id):
+            self.duplicates += 1
+            return
+        timestamp = message_data.get('timestamp')
+        message_data = {
+            'type': 'message',
+            'message': message_data['message'],
+            'sender': message_data['sender'],
+            'timestamp': timestamp if isinstance(timestamp, str) else ''
+        }
+        self.delivered += 1
+        self.deliver(room_uid, message_data)
+
+        if hops >= self.max_hops:
+            self.hop_limited += 1
+            return
+        self._send(encode_json_frame({
+            'type': 'federated',
+            'id': message_id,
+            'room_uid': room_uid,
+            'hops': hops,
+            'message': message_data
+        }, WIRE_V2), exclude=link)
+
+    def _send(self, frame, exclude=None):
+        for link in self._links:
+            if link is exclude:
+                continue
+            if link.channel.send_frame(frame):
+                link.messages_out += 1
+            else:
+                # 对方长时间不读取，积压超过上限：断开，由发起方重连
+                link.abort()
+
+    def close(self):
+        """停止监听并断开所有联邦连接"""
+        self._stop.set()
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except OSError:
+                pass
+            self._listener = None
+        for link in self._links:
+            link.channel.close(timeout=1)
+
+    def stats(self):
+        return {
+            'port': self.port,
+            'published': self.published,
+            'delivered': self.delivered,
+            'duplicates': self.duplicates,
+            'hop_limited': self.hop_limited,
+            'rejected': self.rejected,
+            'pending': self._pending,
+            'shared_rooms': sorted(self.shared_rooms),
+            'links': [link.stats() for link in self._links]
+        }
@@ -0,0 +1,98 @@
+# src/room/history.py
+import os
+import threading
+from collections import deque
+from ..p2pu import encode_json_frame, decode_json_frame
+from ..p2pu.framing import HEADER_SIZE
+from ..config.settings import WIRE_VERSION, HISTORY_MAX_MESSAGES, HISTORY_MAX_BYTES
+
+
+class HistoryBuffer:
+    """
+    聊天室最近消息的有界环形缓冲区
+    保存广播时已编码好的帧（当前线路格式），按条数和字节数双重限制，
+    超出时丢弃最旧的消息。新成员加入后整段拼接成一次写入回放。
+    聊天消息按到达顺序编号（seq 从1递增），断线重连的成员只补发它最后收到的编号之后的消息，
+    补发同样只来自这个有界缓冲区。epoch 标识编号序列，主机重启（或换了工作进程）后不同。
+    lock 同时用于让"记录消息并取成员快照"与"登记新成员并取回放"互斥，
+    保证新成员看到的每条消息恰好来自回放或实时广播之一，且顺序不乱。
+    """
+
+    def __init__(self, max_messages=HISTORY_MAX_MESSAGES, max_bytes=HISTORY_MAX_BYTES):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._frames = deque()  # [(seq, 帧)]，从日志恢复的旧记录可能没有seq
+        self.bytes = 0
+        self.seq = 0  # 最后一条消息的编号
+        self.epoch = os.urandom(4).hex()
+
+    def next_seq(self):
+        """下一条消息的编号（调用方持有lock，随后以该编号 append）"""
+        return self.seq + 1
+
+    def append(self, frame, seq=None):
+        """记录一条已编码的消息帧（调用方持有lock）"""
+        if seq is not None and seq > self.seq:
+            self.seq = seq
+        if self.max_messages <= 0 or len(frame) > self.max_bytes:
+            return
+        self._frames.append((seq, frame))
+        self.bytes += len(frame)
+        while len(self._frames) > self.max_messages or self.bytes > self.max_bytes:
+            self.bytes -= len(self._frames.popleft()[1])
+
+    def frames_since(self, seq):
+        """
+        编号 seq 之后的所有消息帧（调用方持有lock）
+        Returns:
+            帧列表（没有漏掉消息时为空列表）；缺口已超出缓冲区、编号无法确定或 seq 不属于当前序列时返回None
+        """
+        if seq == self.seq:
+            return []
+        if seq > self.seq or seq < 0:
+            return None
+        frames = []
+        for frame_seq, frame in reversed(self._frames):
+            if frame_seq is None:
+                return None
+            if frame_seq <= seq:
+                break
+            frames.append(frame)
+        if len(frames) != self.seq - seq:
+            return None  # 最旧的部分已被丢弃（或过大的消息未能保存）
+        frames.reverse()
+        return frames
+
+    def replay_frame(self, wire_version=WIRE_VERSION, header=None, frames=None):
+        """
+        把历史消息拼接为一次写入的字节串（调用方持有lock）
+        Args:
+            wire_version: 接收方的线路格式，与保存格式不同时逐条转码
+            header: 可选的提示消息，放在最前面
+            frames: 要回放的帧（如 frames_since 的结果），默认为全部历史消息
+        Returns:
+            拼接后的字节串，没有要回放的消息时返回None
+        """
+        frames = [frame for _, frame in self._frames] if frames is None else list(frames)
+        if not frames:
+            return None
+        if wire_version != WIRE_VERSION:
+            frames = [encode_json_frame(decode_json_frame(memoryview(frame)[HEADER_SIZE:]), wire_version)
+                      for frame in frames]
+        if header is not None:
+            frames.insert(0, encode_json_frame(header, wire_version))
+        return b''.join(frames)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def stats(self):
+        """历史缓冲区占用情况"""
+        return {
+            'messages': len(self._frames),
+            'seq': self.seq,
+            'bytes': self.bytes,
+            'max_messages': self.max_messages,
+            'max_bytes': self.max_bytes
+        }
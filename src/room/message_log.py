@@ -0,0 +1,400 @@
+# src/room/message_log.py
+import bisect
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from urllib.parse import quote
+from ..p2pu.core_utils import WIRE_V2
+from ..p2pu.framing import HEADER_SIZE, MAX_FRAME_SIZE
+from ..ui.display_utils import display_system_message
+from ..config.settings import (
+    MESSAGE_LOG_SEGMENT_BYTES, MESSAGE_LOG_FSYNC_INTERVAL, MESSAGE_LOG_INDEX_INTERVAL,
+    MESSAGE_LOG_RETENTION_SECONDS, MESSAGE_LOG_RETENTION_BYTES
+)
+
+LOG_SUFFIX = '.log'
+INDEX_SUFFIX = '.index'
+_INDEX_ENTRY = struct.Struct('>IQ')  # 段内相对序号 + 文件位置
+_LENGTH = struct.Struct('>I')
+RETENTION_CHECK_INTERVAL = 60.0
+
+
+def _valid_frame(data, position, end):
+    """
+    检查 position 处是否为完整且校验通过的v2帧
+    Returns:
+        帧的总长度（含长度头），不完整或损坏时返回0
+    """
+    if position + HEADER_SIZE > end:
+        return 0
+    length = _LENGTH.unpack_from(data, position)[0]
+    frame_end = position + HEADER_SIZE + length
+    if length < 5 or length > MAX_FRAME_SIZE or frame_end > end or data[position + HEADER_SIZE] != WIRE_V2:
+        return 0
+    if zlib.crc32(data[position + 9:frame_end]) != int.from_bytes(data[position + 5:position + 9], 'big'):
+        return 0
+    return frame_end - position
+
+
+class _Segment:
+    """一个日志段：<起始序号>.log 保存首尾相接的帧，<起始序号>.index 为稀疏的序号→位置索引"""
+
+    def __init__(self, directory, base_offset):
+        self.base_offset = base_offset
+        name = os.path.join(directory, f"{base_offset:020d}")
+        self.log_path = name + LOG_SUFFIX
+        self.index_path = name + INDEX_SUFFIX
+
+    def size(self):
+        try:
+            return os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+
+    def mtime(self):
+        try:
+            return os.path.getmtime(self.log_path)
+        except OSError:
+            return 0
+
+    def read_index(self):
+        """读取索引项 [(相对序号, 位置)]"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return []
+        usable = len(data) - len(data) % _INDEX_ENTRY.size
+        return [entry for entry in _INDEX_ENTRY.iter_unpack(data[:usable])]
+
+    def delete(self):
+        for path in (self.log_path, self.index_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class SegmentedLog:
+    """
+    单个聊天室的分段只追加日志
+    记录是广播时已编码好的v2帧（自带长度与CRC32），原样追加，不再二次编码；
+    每条记录有递增的序号，活动段写满后滚动到新段，按时间和总大小清理旧段。
+    回放通过 mmap 读取，不把整个段读入内存。写入只应来自一个线程（MessageLogWriter）。
+    """
+
+    def __init__(self, directory, segment_bytes=MESSAGE_LOG_SEGMENT_BYTES,
+                 index_interval=MESSAGE_LOG_INDEX_INTERVAL, readonly=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.readonly = readonly
+        self.segments = []
+        self.next_offset = 0
+        self._log_file = None
+        self._index_file = None
+        self._position = 0            # 活动段已写入的字节数
+        self._indexed_position = 0    # 上一个索引项的位置
+        self._dirty = False           # 是否有尚未fsync的写入
+
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self._load_segments()
+
+    def _load_segments(self):
+        """扫描已有的段；写模式下恢复活动段，截掉崩溃时写了一半的帧"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        bases = sorted(int(name[:-len(LOG_SUFFIX)]) for name in names
+                       if name.endswith(LOG_SUFFIX) and name[:-len(LOG_SUFFIX)].isdigit())
+        self.segments = [_Segment(self.directory, base) for base in bases]
+        if not self.segments:
+            if not self.readonly:
+                self._roll(0)
+            return
+
+        active = self.segments[-1]
+        count, valid_end = self._scan_tail(active)
+        self.next_offset = active.base_offset + count
+        if self.readonly:
+            return
+
+        with open(active.log_path, 'r+b') as f:
+            f.truncate(valid_end)
+        entries = [entry for entry in active.read_index() if entry[1] < valid_end]
+        with open(active.index_path, 'wb') as f:
+            f.write(b''.join(_INDEX_ENTRY.pack(*entry) for entry in entries))
+        self._open_active(active, valid_end, entries[-1][1] if entries else 0)
+
+    def _scan_tail(self, segment):
+        """从段的最后一个索引项开始向后扫描，返回 (记录数, 有效数据的末尾位置)"""
+        entries = segment.read_index()
+        count, position = entries[-1] if entries else (0, 0)
+        with open(segment.log_path, 'rb') as f:
+            f.seek(position)
+            data = f.read()
+        offset = 0
+        while True:
+            size = _valid_frame(data, offset, len(data))
+            if not size:
+                break
+            offset += size
+            count += 1
+        return count, position + offset
+
+    def _open_active(self, segment, position, indexed_position):
+        self._log_file = open(segment.log_path, 'ab')
+        self._index_file = open(segment.index_path, 'ab')
+        self._position = position
+        self._indexed_position = indexed_position
+
+    def _roll(self, base_offset):
+        """关闭当前活动段，以 base_offset 开始新段"""
+        self._close_active()
+        segment = _Segment(self.directory, base_offset)
+        self.segments.append(segment)
+        open(segment.log_path, 'ab').close()
+        open(segment.index_path, 'ab').close()
+        self._open_active(segment, 0, 0)
+
+    def append(self, frame):
+        """
+        追加一条记录（写入缓冲区，由 flush/sync 落盘）
+        Returns:
+            该记录的序号
+        """
+        if self._position and self._position + len(frame) > self.segment_bytes:
+            self._roll(self.next_offset)
+
+        segment = self.segments[-1]
+        if self._position == 0 or self._position - self._indexed_position >= self.index_interval:
+            self._index_file.write(_INDEX_ENTRY.pack(self.next_offset - segment.base_offset, self._position))
+            self._indexed_position = self._position
+        self._log_file.write(frame)
+        self._position += len(frame)
+        self._dirty = True
+        offset = self.next_offset
+        self.next_offset += 1
+        return offset
+
+    def flush(self):
+        """把缓冲区写入操作系统，之后其他读取者即可看到"""
+        if self._log_file:
+            self._log_file.flush()
+            self._index_file.flush()
+
+    def sync(self):
+        """flush 后 fsync，保证已写入的记录在断电后仍然存在"""
+        if not self._dirty or not self._log_file:
+            return
+        self.flush()
+        os.fsync(self._log_file.fileno())
+        os.fsync(self._index_file.fileno())
+        self._dirty = False
+
+    def read_from(self, offset):
+        """
+        通过 mmap 按顺序读取序号不小于 offset 的记录
+        Yields:
+            完整的帧字节（含长度头）
+        """
+        bases = [segment.base_offset for segment in self.segments]
+        start = max(bisect.bisect_right(bases, offset) - 1, 0)
+        for segment in list(self.segments[start:]):
+            yield from self._read_segment(segment, max(offset - segment.base_offset, 0))
+
+    def _read_segment(self, segment, relative_offset):
+        try:
+            f = open(segment.log_path, 'rb')
+        except OSError:
+            return  # 已被保留策略删除
+        with f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return  # 空段
+            with data:
+                # 从索引中不超过目标序号的最近位置开始扫描
+                entries = segment.read_index()
+                index = bisect.bisect_right(entries, (relative_offset, float('inf'))) - 1
+                current, position = entries[index] if index >= 0 else (0, 0)
+                end = len(data)
+                while position < end:
+                    size = _valid_frame(data, position, end)
+                    if not size:
+                        break
+                    if current >= relative_offset:
+                        yield data[position:position + size]
+                    position += size
+                    current += 1
+
+    def tail(self, count):
+        """最后 count 条记录"""
+        return list(self.read_from(max(self.next_offset - count, 0)))
+
+    def enforce_retention(self, max_age=MESSAGE_LOG_RETENTION_SECONDS, max_bytes=MESSAGE_LOG_RETENTION_BYTES):
+        """
+        删除过期的旧段以及超出总大小的最旧段（活动段始终保留）
+        Returns:
+            删除的段数
+        """
+        removed = 0
+        now = time.time()
+        total = sum(segment.size() for segment in self.segments)
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            if (max_age and now - oldest.mtime() > max_age) or (max_bytes and total > max_bytes):
+                total -= oldest.size()
+                oldest.delete()
+                self.segments.pop(0)
+                removed += 1
+            else:
+                break
+        return removed
+
+    def stats(self):
+        return {
+            'segments': len(self.segments),
+            'bytes': sum(segment.size() for segment in self.segments),
+            'next_offset': self.next_offset
+        }
+
+    def _close_active(self):
+        if self._log_file:
+            self.sync()
+            self._log_file.close()
+            self._index_file.close()
+            self._log_file = None
+            self._index_file = None
+
+    def close(self):
+        self._close_active()
+
+
+def room_log_directory(root, room_uid):
+    """聊天室日志目录（房间ID转义后作为目录名）"""
+    return os.path.join(root, quote(room_uid, safe=''))
+
+
+class MessageLogWriter:
+    """
+    聊天室消息日志的后台写线程
+    广播路径上只把 (房间ID, 帧) 放入无锁队列，写文件、组提交fsync、滚动与保留清理
+    全部在写线程中完成。fsync_interval 秒内的写入合并为一次fsync（为0时每批写入后立即fsync）。
+    """
+
+    def __init__(self, root, fsync_interval=MESSAGE_LOG_FSYNC_INTERVAL, segment_bytes=MESSAGE_LOG_SEGMENT_BYTES,
+                 retention_seconds=MESSAGE_LOG_RETENTION_SECONDS, retention_bytes=MESSAGE_LOG_RETENTION_BYTES):
+        self.root = root
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self.retention_seconds = retention_seconds
+        self.retention_bytes = retention_bytes
+        self._queue = queue.SimpleQueue()
+        self._logs = {}  # 房间ID -> SegmentedLog，只在写线程中访问
+        self.written = 0
+        self.fsyncs = 0
+        os.makedirs(root, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, room_uid, frame):
+        """记录一条消息（广播路径调用，不做任何I/O）"""
+        self._queue.put((room_uid, frame))
+
+    def close_room(self, room_uid):
+        """聊天室关闭后释放其日志文件（保留数据）"""
+        self._queue.put((room_uid, None))
+
+    def close(self, timeout=5):
+        """写完队列中的记录、fsync 并停止写线程"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _log_for(self, room_uid):
+        log = self._logs.get(room_uid)
+        if log is None:
+            log = self._logs[room_uid] = SegmentedLog(room_log_directory(self.root, room_uid), self.segment_bytes)
+        return log
+
+    def _run(self):
+        next_sync = time.monotonic() + self.fsync_interval
+        next_retention = time.monotonic()
+        running = True
+        while running:
+            # 有待fsync的数据时按组提交间隔醒来；打开的日志还要按时做保留清理，空闲的聊天室也不例外
+            deadlines = [next_retention] if self._logs else []
+            if any(log._dirty for log in self._logs.values()):
+                deadlines.append(next_sync)
+            timeout = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+
+            # 一次取出队列中的全部记录，合并为一批写入
+            batch = [item] if item != () else []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for entry in batch:
+                if entry is None:
+                    running = False
+                    continue
+                room_uid, frame = entry
+                try:
+                    if frame is None:
+                        log = self._logs.pop(room_uid, None)
+                        if log:
+                            log.close()
+                        continue
+                    self._log_for(room_uid).append(frame)
+                    self.written += 1
+                except OSError as e:
+                    display_system_message(f"写入消息日志失败: {e}")
+
+            now = time.monotonic()
+            try:
+                for log in self._logs.values():
+                    log.flush()
+                if not running or now >= next_sync:
+                    for log in self._logs.values():
+                        if log._dirty:
+                            log.sync()
+                            self.fsyncs += 1
+                    next_sync = now + self.fsync_interval
+                if now >= next_retention:
+                    for log in self._logs.values():
+                        log.enforce_retention(self.retention_seconds, self.retention_bytes)
+                    next_retention = now + RETENTION_CHECK_INTERVAL
+            except OSError as e:
+                display_system_message(f"写入消息日志失败: {e}")
+
+        for log in self._logs.values():
+            log.close()
+        self._logs.clear()
+
+    def stats(self):
+        return {'written': self.written, 'fsyncs': self.fsyncs, 'pending': self._queue.qsize()}
+
+
+def load_room_history(root, room_uid, count):
+    """
+    以只读方式读取聊天室日志中最近的 count 条记录（主机重启后恢复历史消息）
+    Returns:
+        帧字节列表
+    """
+    directory = room_log_directory(root, room_uid)
+    if not os.path.isdir(directory):
+        return []
+    log = SegmentedLog(directory, readonly=True)
+    return log.tail(count)
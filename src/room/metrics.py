@@ -0,0 +1,240 @@
+# src/room/metrics.py
+import bisect
+import json
+import os
+import threading
+import time
+from ..config.settings import METRICS_ENABLED, METRICS_SNAPSHOT_INTERVAL
+
+# 耗时直方图的桶上界（秒）：1微秒到约8秒，按2倍递增
+LATENCY_BOUNDS = tuple(1e-6 * 2 ** i for i in range(24))
+# 字节数直方图的桶上界：64字节到16MB，按4倍递增
+SIZE_BOUNDS = tuple(64 * 4 ** i for i in range(10))
+
+
+class Counter:
+    """
+    单调递增计数器
+    热路径上只做一次加法，不加锁：多线程同时递增时极少数增量可能丢失，对统计用途可以接受。
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram:
+    """
+    固定桶直方图
+    observe 用二分查找定位桶，O(log 桶数)；分位数按桶上界估算，精度为相邻桶的倍数。
+    """
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个桶收纳超过最大上界的值
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """按桶估算分位数（取该分位所在桶的上界，不超过最大值）"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            # 只输出非空的桶，上界为None表示超过最大上界
+            'buckets': [[self.bounds[index] if index < len(self.bounds) else None, count]
+                        for index, count in enumerate(self.counts) if count]
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot, bounds):
+        """由 snapshot() 的结果还原（用于合并多个进程的直方图）"""
+        histogram = cls(bounds)
+        for bound, count in snapshot.get('buckets', []):
+            index = len(bounds) if bound is None else bisect.bisect_left(bounds, bound)
+            histogram.counts[index] += count
+        histogram.count = snapshot.get('count', 0)
+        histogram.sum = snapshot.get('sum', 0.0)
+        histogram.max = snapshot.get('max', 0.0)
+        return histogram
+
+
+class _NullInstrument:
+    """关闭统计时使用的空计数器/直方图"""
+
+    __slots__ = ()
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+_NULL_INSTRUMENT = _NullInstrument()
+
+
+class MetricsRegistry:
+    """
+    运行时统计登记表：计数器、直方图和快照时才计算的量（gauge）
+    热路径只更新计数器和直方图；在线人数、队列深度等由 gauge 函数在生成快照时计算，不占热路径。
+    enabled 为False时计数器和直方图都是空操作。
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._sampled = {}
+
+    def counter(self, name):
+        if not self.enabled:
+            return _NULL_INSTRUMENT
+        return self._counters.setdefault(name, Counter())
+
+    def histogram(self, name, bounds=LATENCY_BOUNDS):
+        if not self.enabled:
+            return _NULL_INSTRUMENT
+        return self._histograms.setdefault(name, Histogram(bounds))
+
+    def gauge(self, name, function):
+        """登记一个快照时调用 function() 取值的量"""
+        self._gauges[name] = function
+
+    def sampled_histogram(self, name, function, bounds=SIZE_BOUNDS):
+        """登记一个快照时对 function() 产出的各个值做分布统计的直方图（如各客户端的队列深度）"""
+        self._sampled[name] = (function, bounds)
+
+    def snapshot(self):
+        """
+        Returns:
+            可直接序列化为JSON的统计快照
+        """
+        histograms = {name: histogram.snapshot() for name, histogram in self._histograms.items()}
+        for name, (function, bounds) in self._sampled.items():
+            histogram = Histogram(bounds)
+            for value in function():
+                histogram.observe(value)
+            histograms[name] = histogram.snapshot()
+        return {
+            'timestamp': time.time(),
+            'uptime_seconds': time.time() - self.started,
+            'enabled': self.enabled,
+            'counters': {name: counter.value for name, counter in self._counters.items()},
+            'gauges': {name: function() for name, function in self._gauges.items()},
+            'histograms': histograms
+        }
+
+
+def merge_snapshots(snapshots, bounds=None):
+    """
+    合并多个进程的统计快照：计数器与gauge相加，直方图按桶相加
+    Args:
+        snapshots: snapshot() 的结果列表
+        bounds: {直方图名称: 桶上界}，未列出的按耗时直方图处理
+    """
+    bounds = bounds or {}
+    merged = {
+        'timestamp': time.time(),
+        'uptime_seconds': max((item['uptime_seconds'] for item in snapshots), default=0.0),
+        'enabled': any(item['enabled'] for item in snapshots),
+        'counters': {},
+        'gauges': {},
+        'histograms': {}
+    }
+    histograms = {}
+    for snapshot in snapshots:
+        for section in ('counters', 'gauges'):
+            for name, value in snapshot[section].items():
+                merged[section][name] = merged[section].get(name, 0) + value
+        for name, item in snapshot['histograms'].items():
+            part = Histogram.from_snapshot(item, bounds.get(name, LATENCY_BOUNDS))
+            total = histograms.get(name)
+            if total is None:
+                histograms[name] = part
+                continue
+            total.counts = [a + b for a, b in zip(total.counts, part.counts)]
+            total.count += part.count
+            total.sum += part.sum
+            total.max = max(total.max, part.max)
+    merged['histograms'] = {name: histogram.snapshot() for name, histogram in histograms.items()}
+    return merged
+
+
+class MetricsSnapshotWriter:
+    """后台线程：每隔 interval 秒把 collect() 的结果写入JSON文件（先写临时文件再原子替换）"""
+
+    def __init__(self, path, collect, interval=METRICS_SNAPSHOT_INTERVAL):
+        self.path = path
+        self.collect = collect
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(self.collect(), f, ensure_ascii=False)
+            os.replace(temporary, self.path)
+        except (OSError, ValueError):
+            pass
+
+    def close(self):
+        """停止写线程并写出最后一次快照"""
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        self.write()
+
+
+class HostMetrics(MetricsRegistry):
+    """聊天室主机的统计项（热路径直接访问属性，不再按名称查找）"""
+
+    # 合并多个工作进程的快照时，非耗时类直方图的桶上界
+    BOUNDS = {'client_queue_bytes': SIZE_BOUNDS}
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        super().__init__(enabled)
+        self.messages_in = self.counter('messages_in')
+        self.bytes_in = self.counter('bytes_in')
+        self.messages_out = self.counter('messages_out')
+        self.bytes_out = self.counter('bytes_out')
+        self.broadcasts = self.counter('broadcasts')
+        self.fanout_seconds = self.histogram('broadcast_fanout_seconds')
+        self.handshake_seconds = self.histogram('handshake_seconds')
@@ -0,0 +1,162 @@
+# src/room/outbound.py
+import threading
+from collections import deque
+from ..config.settings import (
+    OUTBOUND_HIGH_WATER_BYTES, OUTBOUND_MAX_BYTES, SLOW_CONSUMER_POLICY
+)
+
+# 发送优先级：超过高水位时先丢弃低优先级流量
+PRIORITY_HIGH = 0    # 控制消息（握手回复、关闭通知），不丢弃
+PRIORITY_NORMAL = 1  # 聊天消息
+PRIORITY_LOW = 2     # 加入/离开等系统通知
+
+# 慢消费者策略
+POLICY_DROP = 'drop'              # 超过高水位丢弃低优先级帧，超过上限断开
+POLICY_DISCONNECT = 'disconnect'  # 超过高水位直接断开
+SLOW_CONSUMER_POLICIES = (POLICY_DROP, POLICY_DISCONNECT)
+
+ACCEPT, DROP, EVICT = 'accept', 'drop', 'evict'
+
+
+def admit_frame(queued_bytes, frame_size, priority, high_water=OUTBOUND_HIGH_WATER_BYTES,
+                max_bytes=OUTBOUND_MAX_BYTES, policy=SLOW_CONSUMER_POLICY):
+    """
+    按慢消费者策略判断一个帧能否进入发送队列
+    Args:
+        queued_bytes: 队列中已积压的字节数
+        frame_size: 新帧大小
+        priority: 新帧优先级
+    Returns:
+        ACCEPT / DROP / EVICT
+    """
+    total = queued_bytes + frame_size
+    if total <= high_water or priority == PRIORITY_HIGH:
+        return ACCEPT
+    if policy == POLICY_DISCONNECT or total > max_bytes:
+        return EVICT
+    if priority == PRIORITY_LOW:
+        return DROP
+    return ACCEPT
+
+
+class OutboundQueue:
+    """
+    单个客户端的有界发送队列
+    广播线程只负责入队，由该客户端自己的写线程（或事件循环）取出写入socket，
+    卡住的客户端只会积压自己的队列。
+    """
+
+    def __init__(self, high_water=OUTBOUND_HIGH_WATER_BYTES, max_bytes=OUTBOUND_MAX_BYTES,
+                 policy=SLOW_CONSUMER_POLICY):
+        self.high_water = high_water
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._frames = deque()  # [帧, 优先级]
+        self._head_offset = 0   # 队首帧已部分写出的字节数（非阻塞写入使用）
+        self._cond = threading.Condition()
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.dropped = 0
+        self.closed = False
+        self.evicted = False
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, frame, priority=PRIORITY_NORMAL):
+        """
+        入队一个帧
+        Returns:
+            False表示队列已关闭或该客户端按策略应被断开
+        """
+        with self._cond:
+            if self.closed:
+                return False
+
+            decision = admit_frame(self.bytes, len(frame), priority,
+                                   self.high_water, self.max_bytes, self.policy)
+            if decision != ACCEPT and priority != PRIORITY_LOW:
+                # 先丢弃已排队的低优先级帧腾出空间
+                self._drop_queued_low_priority()
+                decision = admit_frame(self.bytes, len(frame), priority,
+                                       self.high_water, self.max_bytes, self.policy)
+
+            if decision == DROP:
+                self.dropped += 1
+                return True
+            if decision == EVICT:
+                self.evicted = True
+                self.closed = True
+                self._cond.notify_all()
+                return False
+
+            self._frames.append([frame, priority])
+            self.bytes += len(frame)
+            if self.bytes > self.peak_bytes:
+                self.peak_bytes = self.bytes
+            self._cond.notify()
+            return True
+
+    def _drop_queued_low_priority(self):
+        """丢弃排队中的低优先级帧（不动可能已部分写出的队首）"""
+        if len(self._frames) < 2:
+            return
+        head = self._frames.popleft()
+        kept = deque([head])
+        for item in self._frames:
+            if item[1] == PRIORITY_LOW:
+                self.bytes -= len(item[0])
+                self.dropped += 1
+            else:
+                kept.append(item)
+        self._frames = kept
+
+    def get(self, timeout=None):
+        """
+        阻塞取出下一个帧（写线程使用）
+        Returns:
+            帧字节，队列关闭且已取空（或被驱逐）时返回None
+        """
+        with self._cond:
+            while not self._frames and not self.closed:
+                if not self._cond.wait(timeout):
+                    return None
+            if self.evicted or not self._frames:
+                return None
+            frame = self._frames.popleft()[0]
+            self.bytes -= len(frame)
+            return frame
+
+    def head(self):
+        """返回队首帧尚未写出的部分（非阻塞写入使用），队列为空时返回None"""
+        with self._cond:
+            if not self._frames:
+                return None
+            frame = self._frames[0][0]
+            return memoryview(frame)[self._head_offset:] if self._head_offset else frame
+
+    def consume(self, sent):
+        """记录队首帧已写出sent字节"""
+        with self._cond:
+            frame = self._frames[0][0]
+            self._head_offset += sent
+            if self._head_offset >= len(frame):
+                self._frames.popleft()
+                self.bytes -= len(frame)
+                self._head_offset = 0
+
+    def close(self):
+        """关闭队列，唤醒等待中的写线程"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        """队列统计信息"""
+        return {
+            'depth': len(self._frames),
+            'bytes': self.bytes,
+            'peak_bytes': self.peak_bytes,
+            'dropped': self.dropped,
+            'evicted': self.evicted
+        }
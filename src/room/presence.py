@@ -0,0 +1,153 @@
+# src/room/presence.py
+import threading
+from ..config.settings import PRESENCE_BATCH_INTERVAL
+
+PRESENCE_NOTICE_NAMES = 5  # 合并通知中最多列出的成员数
+
+
+def presence_text(uids, action):
+    """
+    生成加入/离开通知的文字
+    Args:
+        uids: 成员UID列表
+        action: '加入' 或 '离开'
+    """
+    if len(uids) == 1:
+        return f'{uids[0]} {action}了聊天室'
+    names = '、'.join(uids[:PRESENCE_NOTICE_NAMES])
+    if len(uids) > PRESENCE_NOTICE_NAMES:
+        names += ' 等'
+    return f'{names} {len(uids)} 人{action}了聊天室'
+
+
+class PresenceBatcher:
+    """
+    成员加入/离开事件的合并器
+    事件只记入各聊天室的待发列表，由后台线程每隔 interval 秒按聊天室合并成一批发出，
+    网络抖动后的集体掉线因此只产生一条通知，而不是每人一次O(N)的广播。
+    同一批内先加入又离开的成员互相抵消。interval 为0时不合并，立即发出。
+    """
+
+    def __init__(self, flush, interval=PRESENCE_BATCH_INTERVAL):
+        """
+        Args:
+            flush: flush(聊天室, 加入的UID列表, 离开的UID列表)
+            interval: 合并间隔（秒）
+        """
+        self.flush = flush
+        self.interval = interval
+        self._pending = {}  # 聊天室 -> ([加入], [离开])
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._local = threading.local()
+
+    def joined(self, room, uid):
+        self._add(room, uid, 0)
+
+    def left(self, room, uid):
+        self._add(room, uid, 1)
+
+    def _add(self, room, uid, index):
+        if self.interval <= 0:
+            self._flush_now(room, uid, index)
+            return
+        with self._lock:
+            events = self._pending.get(room)
+            if events is None:
+                events = self._pending[room] = ([], [])
+            if index == 1 and uid in events[0]:
+                events[0].remove(uid)
+            else:
+                events[index].append(uid)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _flush_now(self, room, uid, index):
+        """
+        不合并时立即发出；发出过程中引发的新事件（如广播失败移除成员）排在当前事件之后
+        依次发出，不会递归
+        """
+        queued = getattr(self._local, 'queued', None)
+        if queued is not None:
+            queued.append((room, uid, index))
+            return
+        self._local.queued = queued = [(room, uid, index)]
+        try:
+            while queued:
+                room, uid, index = queued.pop(0)
+                self.flush(room, [uid] if index == 0 else [], [uid] if index == 1 else [])
+        finally:
+            self._local.queued = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.drain()
+
+    def drain(self):
+        """立即发出所有待发的事件（已关闭的聊天室跳过）"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for room, (joined, left) in pending.items():
+            if (joined or left) and not room.closed:
+                self.flush(room, joined, left)
+
+    def close(self):
+        """停止后台线程，丢弃未发出的事件"""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+        with self._lock:
+            self._pending = {}
+
+
+class MemberRoster:
+    """
+    聊天室成员名单及其版本号
+    名单按UID计数（同一UID可能有多个连接），apply 只报告真正出现或消失的UID，
+    客户端据此维护的集合与主机一致。每次有变化版本号加一，客户端发现版本不连续时重新同步。
+    多进程模式下主进程持有权威名单，工作进程按主进程给出的版本号应用同样的变化。
+    调用方负责加锁。
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._counts = {}
+
+    def __len__(self):
+        return len(self._counts)
+
+    def apply(self, joined, left, version=None):
+        """
+        应用一批加入/离开
+        Args:
+            version: 指定应用后的版本号（工作进程跟随主进程），为None时有变化才加一
+        Returns:
+            (版本号, 新出现的UID列表, 消失的UID列表)
+        """
+        added, removed = [], []
+        for uid in joined:
+            count = self._counts.get(uid, 0)
+            self._counts[uid] = count + 1
+            if count == 0:
+                added.append(uid)
+        for uid in left:
+            count = self._counts.get(uid, 0)
+            if count <= 1:
+                if self._counts.pop(uid, None) is not None:
+                    removed.append(uid)
+            else:
+                self._counts[uid] = count - 1
+        if version is not None:
+            self.version = version
+        elif added or removed:
+            self.version += 1
+        return self.version, added, removed
+
+    def snapshot(self):
+        """当前名单（按UID排序）"""
+        return sorted(self._counts)
+
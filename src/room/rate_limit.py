@@ -0,0 +1,135 @@
+# src/room/rate_limit.py
+import threading
+import time
+from ..config.settings import (
+    RATE_LIMIT_MESSAGES, RATE_LIMIT_MESSAGE_BURST, RATE_LIMIT_BYTES, RATE_LIMIT_BYTE_BURST,
+    ROOM_RATE_LIMIT_MESSAGES, ROOM_RATE_LIMIT_MESSAGE_BURST, ROOM_RATE_LIMIT_BYTES, ROOM_RATE_LIMIT_BYTE_BURST,
+    RATE_LIMIT_POLICY, RATE_LIMIT_MAX_DELAY
+)
+
+# 超限策略
+POLICY_DELAY = 'delay'            # 处理该消息后暂停读取该客户端，直到令牌补足（TCP背压）
+POLICY_DROP = 'drop'              # 丢弃超限的消息
+POLICY_DISCONNECT = 'disconnect'  # 断开超限的客户端
+RATE_LIMIT_POLICIES = (POLICY_DELAY, POLICY_DROP, POLICY_DISCONNECT)
+
+ACCEPT, DELAY, DROP, DISCONNECT = 'accept', 'delay', 'drop', 'disconnect'
+
+
+class TokenBucket:
+    """
+    令牌桶：以 rate 每秒补充令牌，最多积累 burst 个
+    令牌数允许为负（延迟策略下先放行再偿还），补充按时间差惰性计算，每次操作O(1)。
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = max(burst, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def shortage(self, amount, now):
+        """
+        Returns:
+            取出 amount 个令牌还需等待的秒数，0表示现在就够；rate为0（不限）时总是0
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= min(amount, self.burst):
+            return 0.0
+        return (min(amount, self.burst) - self.tokens) / self.rate
+
+    def take(self, amount):
+        """
+        取出令牌（可以透支）
+        Returns:
+            令牌数回到0还需的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    """
+    消息数与字节数两个令牌桶，外加放行/延迟/丢弃计数
+    每个客户端一个（只由读取该客户端的线程使用），每个聊天室一个汇总限流器（带锁，
+    多个读取线程共用）。
+    """
+
+    def __init__(self, messages=RATE_LIMIT_MESSAGES, message_burst=RATE_LIMIT_MESSAGE_BURST,
+                 bytes_per_second=RATE_LIMIT_BYTES, byte_burst=RATE_LIMIT_BYTE_BURST, shared=False):
+        now = time.monotonic()
+        self.messages = TokenBucket(messages, message_burst, now)
+        self.bytes = TokenBucket(bytes_per_second, byte_burst, now)
+        self.lock = threading.Lock() if shared else None
+        self.accepted = 0
+        self.delayed = 0
+        self.dropped = 0
+
+    def shortage(self, size, now):
+        return max(self.messages.shortage(1, now), self.bytes.shortage(size, now))
+
+    def take(self, size):
+        return max(self.messages.take(1), self.bytes.take(size))
+
+    def stats(self):
+        return {
+            'accepted': self.accepted,
+            'delayed': self.delayed,
+            'dropped': self.dropped,
+            'message_tokens': round(self.messages.tokens, 2),
+            'byte_tokens': round(self.bytes.tokens)
+        }
+
+
+def create_room_limiter():
+    """聊天室的汇总限流器：同一聊天室所有成员的入站消息共用"""
+    return RateLimiter(ROOM_RATE_LIMIT_MESSAGES, ROOM_RATE_LIMIT_MESSAGE_BURST,
+                       ROOM_RATE_LIMIT_BYTES, ROOM_RATE_LIMIT_BYTE_BURST, shared=True)
+
+
+def admit_message(client_limiter, room_limiter, size, policy=RATE_LIMIT_POLICY,
+                  max_delay=RATE_LIMIT_MAX_DELAY, now=None):
+    """
+    按客户端和聊天室的限流器判断一条入站消息的处理方式
+    Args:
+        client_limiter: 发送者的限流器
+        room_limiter: 发送者所在聊天室的汇总限流器
+        size: 消息字节数
+        policy: delay / drop / disconnect
+        max_delay: 延迟策略下最多暂停读取的秒数，超过则丢弃该消息
+    Returns:
+        (ACCEPT / DELAY / DROP / DISCONNECT, 暂停读取的秒数)
+    """
+    if now is None:
+        now = time.monotonic()
+    with room_limiter.lock:
+        client_wait = client_limiter.shortage(size, now)
+        room_wait = room_limiter.shortage(size, now)
+        if client_wait > 0 or room_wait > 0:
+            if policy == POLICY_DISCONNECT and client_wait > 0:
+                # 只有客户端自己超限才断开；聊天室整体繁忙时丢弃
+                return DISCONNECT, 0.0
+            if policy != POLICY_DELAY or max(client_wait, room_wait) > max_delay:
+                client_limiter.dropped += 1
+                room_limiter.dropped += 1
+                return DROP, 0.0
+
+        wait = max(client_limiter.take(size), room_limiter.take(size))
+        if policy == POLICY_DELAY and wait > 0:
+            client_limiter.delayed += 1
+            room_limiter.delayed += 1
+            return DELAY, wait
+        client_limiter.accepted += 1
+        room_limiter.accepted += 1
+        return ACCEPT, 0.0
@@ -1,57 +1,276 @@
 # src/room/room_host.py
+import selectors
 import socket
 import threading
 import time
 from ..p2pu import (
-    get_or_create_uid, send_json, receive_json, get_all_network_addresses,
-    create_dual_stack_socket, get_current_time
+    get_or_create_uid, send_json, get_all_network_addresses,
+    create_dual_stack_socket, get_current_time, release_frame_reader,
+    negotiate_wire_version, set_wire_version, encode_json_frame, decode_json_frame, send_frame,
+    get_frame_reader, HeartbeatMonitor, profiler, profiled
 )
+from ..p2pu.core_utils import WIRE_LEGACY, WIRE_V2
+from ..p2pu.framing import HEADER_SIZE
 from ..ui.display_utils import display_system_message, display_network_info, display_chat_message
 from ..ui.input_utils import get_input
-from ..config.settings import DEFAULT_PORT
+from ..config.settings import (
+    DEFAULT_PORT, WIRE_VERSION, LISTEN_BACKLOG, HANDSHAKE_TIMEOUT, MAX_PENDING_HANDSHAKES, HOST_WORKERS,
+    MESSAGE_LOG_DIR, RATE_LIMIT_POLICY, RATE_LIMIT_MAX_DELAY, METRICS_SNAPSHOT_PATH, FEDERATION_PORT,
+    FEDERATION_SECRET, FEDERATION_ALLOWED_PEERS
+)
+from .client_registry import ClientRegistry
+from .room_registry import RoomRegistry
+from .message_log import MessageLogWriter, load_room_history
+from .search_index import SearchIndexer
+from .outbound import OutboundQueue, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from .rate_limit import RateLimiter, admit_message, DROP, DISCONNECT
+from .metrics import HostMetrics, MetricsSnapshotWriter
+from .presence import PresenceBatcher, presence_text
+from .sessions import SessionTable
+
+CLOSE_FLUSH_TIMEOUT = 2.0     # 关闭聊天室时等待关闭通知写出的期限（秒）
+SHUTDOWN_FLUSH_TIMEOUT = 2.0  # 停止托管时等待所有成员的关闭通知写出的期限（秒）
 
 
 class ChatRoomHost:
     def __init__(self, port=DEFAULT_PORT):
         self.uid = get_or_create_uid()
         self.port = port
-        self.room_uid = None
-        self.room_name = None
-        self.clients = {}
+        self.rooms = RoomRegistry()
+        self._default_room = None  # 第一个创建的聊天室，兼容单聊天室用法
+        self.clients = ClientRegistry()  # 所有聊天室的成员
         self.running = False
         self.server_socket = None
+        self.evicted_clients = 0
+        # 握手阶段设置
+        self.listen_backlog = LISTEN_BACKLOG
+        self.handshake_timeout = HANDSHAKE_TIMEOUT
+        self.max_pending_handshakes = MAX_PENDING_HANDSHAKES
+        # 多进程模式：与其他工作进程以 SO_REUSEPORT 共用端口，并把本进程发起的房间广播转发出去
+        self.reuse_port = False
+        self.peer_relay = None
+        self.presence_relay = None  # 工作进程把成员加入/离开交给主进程统一编排名单版本
+        # 消息持久化日志：log_dir 用于恢复历史，message_log 为后台写线程（未启用时为None）
+        self.log_dir = None
+        self.message_log = None
+        # 检索索引在后台线程中更新，查询结果经 _send_message 发回
+        self.search_indexer = SearchIndexer(self._send_message)
+        # 入站限流：每个客户端和每个聊天室各一组令牌桶
+        self.rate_limit_policy = RATE_LIMIT_POLICY
+        self.rate_limit_max_delay = RATE_LIMIT_MAX_DELAY
+        self.rate_limited_clients = 0
+        # 心跳：对声明支持心跳的空闲成员发送ping，超时无响应的从成员列表中移除
+        self.heartbeat = HeartbeatMonitor(self._ping_client, self._heartbeat_expired)
+        # 运行时统计：热路径只更新计数器和直方图，metrics_path 不为None时定期写出JSON快照
+        self.metrics = HostMetrics()
+        self.metrics.gauge('active_connections', lambda: len(self.clients))
+        self.metrics.gauge('rooms', lambda: len(self.rooms))
+        self.metrics.sampled_histogram(
+            'client_queue_bytes', lambda: [info['queue'].stats()['bytes'] for info in self.clients.values()]
+        )
+        self.metrics_path = None
+        self._metrics_writer = None
+        # 主机联邦：与其他主机互联组成同一逻辑聊天室（未启用时为None）
+        self.federation = None
+        # 成员加入/离开通知按聊天室合并后定时发出
+        self.presence = PresenceBatcher(self._flush_presence)
+        # 会话令牌：意外断开的成员保留一段时间，期间重连不产生加入/离开通知
+        self.sessions = SessionTable(self._session_expired)
+
+    @property
+    def room_uid(self):
+        return self._default_room.room_uid if self._default_room else None
+
+    @property
+    def room_name(self):
+        return self._default_room.room_name if self._default_room else None
 
     def create_room(self, room_name):
-        """创建聊天室"""
-        self.room_name = room_name
-        self.room_uid = f"{room_name}_{self.uid}"[:20]
-        return self.room_uid
+        """
+        创建聊天室，托管开始前后均可调用
+        Returns:
+            房间ID；同名聊天室已存在时返回None
+        """
+        room = self._add_room(f"{room_name}_{self.uid}"[:20], room_name)
+        if room is None:
+            display_system_message(f"聊天室 '{room_name}' 已存在")
+            return None
+        return room.room_uid
+
+    def _forget_room(self, room):
+        """已关闭的聊天室是默认聊天室时，改用剩下的第一个"""
+        if room is self._default_room:
+            remaining = self.rooms.rooms()
+            self._default_room = remaining[0] if remaining else None
 
-    def start_hosting(self):
-        """开始托管聊天室"""
+    def _add_room(self, room_uid, room_name):
+        """按给定的房间ID登记聊天室，已存在时返回None"""
+        room = self.rooms.create(room_uid, room_name)
+        if room is None:
+            return None
+        if self._default_room is None:
+            self._default_room = room
+        self._load_history(room)
+        return room
+
+    def enable_message_log(self, directory=MESSAGE_LOG_DIR):
+        """
+        启用消息持久化日志：聊天消息由后台线程追加到 directory 下各聊天室的分段日志，
+        已创建的聊天室立即从日志恢复最近的历史消息
+        """
+        if not directory:
+            return
+        self.log_dir = directory
+        self.message_log = MessageLogWriter(directory)
+        for room in self.rooms.rooms():
+            self._load_history(room)
+
+    def enable_metrics_snapshot(self, path=METRICS_SNAPSHOT_PATH):
+        """启用统计快照：托管期间每隔 METRICS_SNAPSHOT_INTERVAL 秒把 get_metrics() 写入 path"""
+        if path:
+            self.metrics_path = path
+
+    def enable_federation(self, port=FEDERATION_PORT, secret=FEDERATION_SECRET, allowed_peers=FEDERATION_ALLOWED_PEERS):
+        """
+        启用主机联邦：托管期间在 port 上接受其他主机的联邦连接（须通过共享密钥或允许列表验证），
+        联邦聊天室（share_room）中本机成员的聊天消息转发给相连的主机，对方的消息交给本机同一房间ID的成员
+        """
+        from .federation import Federation
+        self.federation = Federation(
+            self.uid,
+            lambda: {room.room_uid: room.room_name for room in self.rooms.rooms()},
+            self._deliver_federated,
+            port,
+            secret=secret,
+            allowed_peers=allowed_peers
+        )
+
+    def share_room(self, room_uid):
+        """
+        把聊天室标记为联邦聊天室，相连的主机才能看到并加入它
+        Returns:
+            未启用联邦或聊天室不存在时返回False
+        """
+        if self.federation is None or self.rooms.get(room_uid) is None:
+            return False
+        self.federation.share(room_uid)
+        return True
+
+    def link_host(self, address, port, room_uid=None):
+        """
+        与另一台主机建立联邦连接
+        Args:
+            address: 对方主机地址
+            port: 对方的联邦端口
+            room_uid: 要加入的对方聊天室；本机没有该房间ID时按对方的名称创建
+        Returns:
+            是否连接成功
+        """
+        if self.federation is None:
+            display_system_message("未启用主机联邦")
+            return False
+        rooms = self.federation.connect(address, port)
+        if rooms is None:
+            display_system_message(f"无法与主机 {address}:{port} 建立联邦连接")
+            return False
+        if room_uid and self.rooms.get(room_uid) is None:
+            if room_uid not in rooms:
+                display_system_message(f"对方主机没有房间ID为 '{room_uid}' 的联邦聊天室")
+            elif self._add_room(room_uid, rooms[room_uid]) is not None:
+                self.federation.share(room_uid)
+                display_system_message(f"已加入联邦聊天室 '{rooms[room_uid]}'，房间ID: {room_uid}")
+        elif room_uid:
+            self.federation.share(room_uid)
+        return True
+
+    def _deliver_federated(self, room_uid, message_data):
+        """其他主机转发来的房间广播，发给本机该聊天室的成员"""
+        room = self.rooms.get(room_uid)
+        if room is not None and not room.closed:
+            self._broadcast(message_data, room=room)
+
+    def _stop_metrics_writer(self):
+        """停止统计快照写线程（停止前写出最后一次快照）"""
+        if self._metrics_writer is not None:
+            self._metrics_writer.close()
+            self._metrics_writer = None
+
+    def _load_history(self, room):
+        """从消息日志恢复聊天室最近的历史消息"""
+        if not self.log_dir:
+            return
         try:
-            self.server_socket = create_dual_stack_socket()
-            if not self.server_socket:
-                display_system_message("无法创建服务器socket")
-                return False
+            frames = load_room_history(self.log_dir, room.room_uid, room.history.max_messages)
+        except OSError as e:
+            display_system_message(f"读取消息日志失败: {e}")
+            return
+        messages = [decode_json_frame(memoryview(frame)[HEADER_SIZE:]) for frame in frames]
+        with room.history.lock:
+            # 日志中的编号接续使用，重启后新消息的编号不与旧消息重复
+            for frame, message_data in zip(frames, messages):
+                room.history.append(frame, message_data.get('seq') if message_data else None)
+        for message_data in messages:
+            if message_data:
+                self.search_indexer.add(room.search, message_data)
 
-            # 设置socket选项
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    def _stop_background_tasks(self):
+        """停止联邦连接以及成员通知、会话、消息日志、检索索引、心跳与统计快照的后台线程"""
+        self.presence.close()
+        self.sessions.close()
+        if self.federation is not None:
+            self.federation.close()
+        self._stop_metrics_writer()
+        if self.message_log is not None:
+            self.message_log.close()
+            self.message_log = None
+        self.search_indexer.close()
+        self.heartbeat.stop()
 
-            # 绑定到所有接口
-            try:
-                if hasattr(self.server_socket, 'family') and self.server_socket.family == socket.AF_INET6:
-                    self.server_socket.bind(('::', self.port))
-                    display_system_message("使用 IPv4/IPv6 双栈模式")
-                else:
-                    self.server_socket.bind(('0.0.0.0', self.port))
-                    display_system_message("使用 IPv4 模式")
-            except OSError as e:
-                display_system_message(f"绑定端口失败: {e}")
+    def close_room(self, room_uid):
+        """
+        关闭一个聊天室：通知并断开其成员，其他聊天室不受影响
+        Returns:
+            聊天室不存在时返回False
+        """
+        room = self.rooms.close(room_uid)
+        if room is None:
+            return False
+        self._forget_room(room)
+        if self.federation is not None:
+            self.federation.unshare(room_uid)
+        if self.message_log is not None:
+            self.message_log.close_room(room_uid)
+
+        self._broadcast({
+            'type': 'system',
+            'message': '聊天室已关闭',
+            'sender': '系统',
+            'closing': True  # 客户端据此不再自动重连
+        }, priority=PRIORITY_HIGH, room=room)
+        for client, client_info in room.members.snapshot():
+            self._remove_client(client, client_info['uid'], graceful=True)
+        display_system_message(f"聊天室 '{room.room_name}' 已关闭")
+        return True
+
+    def start_hosting(self, interactive=True):
+        """
+        开始托管聊天室
+        Args:
+            interactive: 是否进入主机控制台；为False时启动后台服务后立即返回
+        """
+        try:
+            if not self._open_server_socket():
                 return False
 
-            self.server_socket.listen(8)
             self.running = True
+            self._start_engine()
+            if self.federation is not None and self.federation.start():
+                display_system_message(f"联邦端口: {self.federation.port}")
+            if self.metrics_path:
+                self._metrics_writer = MetricsSnapshotWriter(self.metrics_path, self.get_metrics)
+
+            if not interactive:
+                return True
 
             # 显示网络信息
             network_info = get_all_network_addresses()
@@ -60,11 +279,12 @@ class ChatRoomHost:
             display_system_message(f"端口: {self.port}")
             display_network_info(network_info)
             display_system_message("等待用户加入...")
-            display_system_message("输入 '/quit' 关闭聊天室")
-
-            # 启动接受连接线程
-            accept_thread = threading.Thread(target=self._accept_connections, daemon=True)
-            accept_thread.start()
+            display_system_message("输入 '/open <名称>' 新建聊天室，'/close <房间ID>' 关闭聊天室，'/rooms' 查看所有聊天室，'/limits' 查看限流统计，'/stats' 查看运行统计")
+            if self.federation is not None:
+                display_system_message("输入 '/link <地址> <端口> [房间ID]' 与其他主机互联，'/federate <房间ID>' 把聊天室加入联邦，"
+                                       "'/links' 查看联邦连接")
+            display_system_message("输入 '/profile on|cpu|off|dump|mem|summary' 开关性能剖析并导出快照")
+            display_system_message("输入 '/quit' 关闭所有聊天室")
 
             # 处理主机消息输入
             self._host_message_loop()
@@ -76,85 +296,305 @@ class ChatRoomHost:
             traceback.print_exc()
             return False
 
+    def _open_server_socket(self):
+        """创建、绑定并监听服务器socket"""
+        if not self._bind_server_socket():
+            return False
+        self.server_socket.listen(self.listen_backlog)
+        return True
+
+    def _bind_server_socket(self):
+        """创建并绑定服务器socket"""
+        self.server_socket = create_dual_stack_socket()
+        if not self.server_socket:
+            display_system_message("无法创建服务器socket")
+            return False
+
+        # 设置socket选项
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            # 内核在绑定同一端口的各工作进程之间分配新连接
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        # 绑定到所有接口
+        try:
+            if hasattr(self.server_socket, 'family') and self.server_socket.family == socket.AF_INET6:
+                self.server_socket.bind(('::', self.port))
+                display_system_message("使用 IPv4/IPv6 双栈模式")
+            else:
+                self.server_socket.bind(('0.0.0.0', self.port))
+                display_system_message("使用 IPv4 模式")
+        except OSError as e:
+            display_system_message(f"绑定端口失败: {e}")
+            return False
+
+        # 端口为0时由系统分配，记录实际端口
+        self.port = self.server_socket.getsockname()[1]
+        return True
+
+    def _start_engine(self):
+        """启动连接处理：接受连接与握手在同一个非阻塞线程中完成，每个成员一个读线程和一个写线程"""
+        accept_thread = threading.Thread(target=self._accept_connections, daemon=True)
+        accept_thread.start()
+
+    @profiled(cpu=False)  # 整个托管期间运行，只统计不计入cProfile
     def _accept_connections(self):
-        """接受客户端连接"""
-        while self.running:
-            try:
-                client_socket, address = self.server_socket.accept()
-                client_socket.settimeout(30)
-
-                # 处理握手
-                handshake = receive_json(client_socket)
-                if handshake and handshake.get('type') == 'join_room':
-                    client_uid = handshake.get('uid', 'Unknown')
-                    room_uid = handshake.get('room_uid', '')
-
-                    if room_uid == self.room_uid:
-                        # 验证成功，允许加入
-                        send_json(client_socket, {
-                            'type': 'join_success',
-                            'message': f'欢迎来到聊天室 {self.room_name}',
-                            'room_uid': self.room_uid
-                        })
-
-                        # 添加到客户端列表
-                        self.clients[client_socket] = {
-                            'uid': client_uid,
-                            'address': address
-                        }
-
-                        # 显示连接信息
-                        addr_str = f"{address[0]}:{address[1]}" if len(address) == 2 else f"[{address[0]}]:{address[1]}"
-                        display_system_message(f"{client_uid} 加入了聊天室 ({addr_str})")
-
-                        # 广播用户加入消息
-                        self._broadcast({
-                            'type': 'system',
-                            'message': f'{client_uid} 加入了聊天室',
-                            'sender': '系统',
-                            'timestamp': get_current_time()
-                        }, exclude=client_socket)
-
-                        # 启动客户端消息处理线程
-                        client_thread = threading.Thread(
-                            target=self._handle_client,
-                            args=(client_socket, client_uid),
-                            daemon=True
-                        )
-                        client_thread.start()
+        """
+        接受客户端连接并以非阻塞方式推进握手
+        accept始终保持就绪：沉默或缓慢的客户端只占用一个待握手名额，
+        到达握手期限后被关闭，不会阻塞其他人加入。
+        """
+        self.server_socket.setblocking(False)
+        selector = selectors.DefaultSelector()
+        selector.register(self.server_socket, selectors.EVENT_READ)
+        pending = {}  # socket -> (地址, 握手期限)
+
+        try:
+            while self.running:
+                try:
+                    events = selector.select(0.5)
+                except (OSError, ValueError):
+                    break  # Socket closed
+
+                for key, _ in events:
+                    if key.fileobj is self.server_socket:
+                        if not self._accept_pending(selector, pending):
+                            return
                     else:
-                        # Room UID 不匹配
-                        send_json(client_socket, {
-                            'type': 'join_failed',
-                            'message': '无效的房间ID'
-                        })
-                        client_socket.close()
-                else:
-                    client_socket.close()
+                        self._advance_handshake(selector, pending, key.fileobj)
+
+                # 关闭超过握手期限的连接
+                now = time.monotonic()
+                for client_socket, (_, deadline) in list(pending.items()):
+                    if deadline < now:
+                        self._drop_pending(selector, pending, client_socket)
+        finally:
+            for client_socket in list(pending):
+                self._drop_pending(selector, pending, client_socket)
+            selector.close()
 
+    def _accept_pending(self, selector, pending):
+        """
+        接受所有排队的连接，放入待握手集合
+        Returns:
+            False表示监听socket已关闭
+        """
+        while True:
+            try:
+                client_socket, address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return True
             except OSError:
-                break  # Socket closed
-            except Exception as e:
-                display_system_message(f"接受连接时出错: {e}")
+                return False  # Socket closed
+
+            if len(pending) >= self.max_pending_handshakes:
+                # 待握手连接过多，直接拒绝以保持accept畅通
+                client_socket.close()
                 continue
 
+            client_socket.setblocking(False)
+            pending[client_socket] = (address, time.monotonic() + self.handshake_timeout)
+            selector.register(client_socket, selectors.EVENT_READ)
+
+    def _drop_pending(self, selector, pending, client_socket):
+        """关闭一个未完成握手的连接"""
+        pending.pop(client_socket, None)
+        try:
+            selector.unregister(client_socket)
+        except (KeyError, ValueError):
+            pass
+        self._close_client(client_socket)
+
+    def _advance_handshake(self, selector, pending, client_socket):
+        """读取已到达的数据，握手帧完整后完成加入流程"""
+        reader = get_frame_reader(client_socket)
+        try:
+            if not reader.fill():
+                self._drop_pending(selector, pending, client_socket)
+                return
+            frame = reader.next_frame()
+            if frame is None:
+                return  # 握手帧尚未完整到达
+            handshake = decode_json_frame(frame)
+        except (BlockingIOError, InterruptedError):
+            return
+        except (OSError, ValueError, KeyError):
+            self._drop_pending(selector, pending, client_socket)
+            return
+
+        address, deadline = pending.pop(client_socket)
+        selector.unregister(client_socket)
+
+        try:
+            reply, wire_version, room = self._join_reply(handshake)
+            if reply is None:
+                self._close_client(client_socket)
+                return
+
+            # 回复很小，写入新连接的空发送缓冲区不会阻塞；期限仅作保护
+            client_socket.settimeout(self.handshake_timeout)
+            # 旧版客户端不携带wire字段，继续使用旧格式
+            set_wire_version(client_socket, wire_version)
+            send_json(client_socket, reply)
+            if reply['type'] != 'join_success':
+                self._close_client(client_socket)
+                return
+
+            # 握手完成后恢复阻塞模式，空闲成员不会因超时被断开
+            client_socket.settimeout(None)
+            self.metrics.handshake_seconds.observe(time.monotonic() - (deadline - self.handshake_timeout))
+            client_uid = handshake.get('uid', 'Unknown')
+            self._register_client(client_socket, client_uid, address, wire_version, room,
+                                  heartbeat=bool(reply.get('heartbeat')), members=bool(reply.get('members')),
+                                  resume=reply.get('resume'), session=reply.get('session'))
+
+            # 启动客户端消息处理线程
+            client_thread = threading.Thread(
+                target=self._handle_client,
+                args=(client_socket, client_uid),
+                daemon=True
+            )
+            client_thread.start()
+        except Exception as e:
+            display_system_message(f"接受连接时出错: {e}")
+            self._close_client(client_socket)
+
+    def _join_reply(self, handshake):
+        """
+        校验加入请求，按 room_uid 找到要加入的聊天室并生成回复
+        Args:
+            handshake: 客户端发来的第一条消息
+        Returns:
+            (回复消息, 协商出的线路格式, 聊天室)，不是加入请求时回复为None，加入失败时聊天室为None
+        """
+        if not handshake or handshake.get('type') != 'join_room':
+            return None, WIRE_LEGACY, None
+
+        room = self.rooms.get(handshake.get('room_uid', ''))
+        if room is None:
+            # 没有该 Room UID 的聊天室
+            return {
+                'type': 'join_failed',
+                'message': '无效的房间ID'
+            }, WIRE_LEGACY, None
+        if self.sessions.kicked(handshake.get('uid', 'Unknown'), room):
+            # 刚被主机断开的成员：不恢复会话，也不作为新成员加入
+            return {
+                'type': 'join_failed',
+                'message': '你刚被移出该聊天室，请稍后再加入'
+            }, WIRE_LEGACY, None
+
+        # 验证成功，允许加入
+        reply = {
+            'type': 'join_success',
+            'message': f'欢迎来到聊天室 {room.room_name}',
+            'room_uid': room.room_uid,
+            'wire': WIRE_VERSION
+        }
+        if handshake.get('heartbeat') and self.heartbeat.enabled:
+            # 只对声明支持心跳的客户端发送ping，旧版客户端不受影响
+            reply['heartbeat'] = self.heartbeat.interval
+        if handshake.get('members'):
+            # 客户端维护成员名单：加入时发送完整名单，之后按合并周期发送版本化的增减
+            reply['members'] = True
+        if handshake.get('session'):
+            # 支持断线重连的客户端：沿用仍然有效的会话令牌，否则发放新令牌
+            reply['session'] = self.sessions.token_for(handshake['session'], handshake.get('uid', 'Unknown'), room)
+        # 聊天消息带有按聊天室递增的编号，epoch 标识编号序列
+        reply['epoch'] = room.history.epoch
+        resume = handshake.get('resume')
+        if isinstance(resume, dict) and resume.get('epoch') == room.history.epoch \
+                and isinstance(resume.get('seq'), int):
+            # 断线重连：只补发该编号之后的消息（缺口超出历史缓冲区时退回完整回放）
+            reply['resume'] = resume['seq']
+        return reply, negotiate_wire_version(handshake.get('wire')), room
+
+    def _register_client(self, client, client_uid, address, wire_version, room, heartbeat=False, members=False,
+                         resume=None, session=None):
+        """
+        将已通过握手的客户端加入主机与聊天室的成员列表并向该聊天室广播加入消息
+        Args:
+            heartbeat: 客户端支持心跳时开始监视它是否失联
+            members: 客户端维护成员名单时发送当前名单快照
+            resume: 重连的客户端最后收到的消息编号，只补发之后的消息
+            session: 会话令牌；恢复了保留中的会话时不广播加入
+        """
+        restored = False
+        if session is not None:
+            restored, previous = self.sessions.attach(session, client, client_uid, room)
+            if previous is not None:
+                # 旧连接尚未被发现断开，由新连接接管（会话仍然有效，不广播离开）
+                self._remove_client(previous, client_uid)
+        client_info = {
+            'uid': client_uid,
+            'address': address,
+            'wire': wire_version,
+            'room': room,
+            'queue': self._create_outbound_queue(client, client_uid),
+            'rate_limiter': RateLimiter(),
+            'acked': resume,  # 客户端累计确认的消息编号，不发送确认的旧版客户端为None
+            'session': session
+        }
+        with room.history.lock:
+            self.clients.add(client, client_info)
+            room.members.add(client, client_info)
+            # 紧跟 join_success 一次写出最近的消息（重连时只有缺口），之后的消息由实时广播送达
+            frames = room.history.frames_since(resume) if resume is not None else None
+            if frames is not None:
+                header = self._system_notice(f'已补发断线期间的 {len(frames)} 条消息') if frames else None
+            else:
+                header = self._system_notice(
+                    f"{'部分消息已无法补发，' if resume is not None else ''}以下是最近的 {len(room.history)} 条消息"
+                )
+            replay = room.history.replay_frame(wire_version, header, frames)
+            if replay:
+                self._send_frame(client, replay)
+                self.metrics.messages_out.inc((len(frames) if frames is not None else len(room.history)) + 1)
+                self.metrics.bytes_out.inc(len(replay))
+            if members:
+                # 与名单更新在同一把锁内，快照版本之后的增减都会送达该客户端
+                self._send_message(client, self._member_snapshot(room))
+        if room.closed:
+            # 握手期间聊天室被关闭
+            self._remove_client(client, client_uid, graceful=True)
+            return
+        if heartbeat:
+            self.heartbeat.add(client)
+
+        # 显示连接信息
+        addr_str = f"{address[0]}:{address[1]}" if len(address) == 2 else f"[{address[0]}]:{address[1]}"
+        if restored:
+            # 会话期间一直算在线：不广播加入，名单不变
+            display_system_message(f"{client_uid} 重新连接到聊天室 '{room.room_name}' ({addr_str})")
+            return
+        display_system_message(f"{client_uid} 加入了聊天室 '{room.room_name}' ({addr_str})")
+
+        # 加入通知与同一时段的其他加入/离开合并后广播
+        self.presence.joined(room, client_uid)
+
+    @profiled(cpu=False)  # 每个成员的整个会话
     def _handle_client(self, client_socket, client_uid):
         """处理客户端消息"""
+        # 与握手阶段共用该socket的帧读取器，紧跟握手到达的消息不会丢失
+        reader = get_frame_reader(client_socket)
         while self.running:
             try:
-                message_data = receive_json(client_socket)
+                frame = reader.read_frame()
+                if not frame:
+                    break
+                # 帧视图在下一次读取前有效，先记下大小再解码
+                frame_size = HEADER_SIZE + len(frame)
+                message_data = decode_json_frame(frame)
                 if not message_data:
                     break
+            except (OSError, ValueError, KeyError):
+                break
 
-                if message_data.get('type') == 'message':
-                    # 广播聊天消息
-                    broadcast_data = {
-                        'type': 'message',
-                        'message': message_data['message'],
-                        'sender': client_uid,
-                        'timestamp': get_current_time()
-                    }
-                    self._broadcast(broadcast_data)
+            try:
+                wait = self._handle_message(client_socket, client_uid, message_data, frame_size)
+                if wait:
+                    # 超过限流速率：暂停读取该客户端，积压留在TCP缓冲区中
+                    time.sleep(wait)
 
             except Exception as e:
                 display_system_message(f"处理客户端消息时出错: {e}")
@@ -163,34 +603,356 @@ class ChatRoomHost:
         # 客户端断开连接
         self._remove_client(client_socket, client_uid)
 
-    def _remove_client(self, client_socket, client_uid):
-        """移除客户端"""
-        if client_socket in self.clients:
-            del self.clients[client_socket]
-            try:
-                client_socket.close()
-            except:
-                pass
+    @profiled()
+    def _handle_message(self, client, client_uid, message_data, frame_size=0):
+        """
+        处理一条客户端消息
+        Args:
+            frame_size: 该消息在线路上的字节数（含长度头），用于统计
+        Returns:
+            按限流策略需要暂停读取该客户端的秒数，0表示无需暂停
+        """
+        self.metrics.messages_in.inc()
+        self.metrics.bytes_in.inc(frame_size)
+        self.heartbeat.seen(client)
+        message_type = message_data.get('type')
+        if message_type == 'ping':
+            self._send_message(client, {'type': 'pong', 'seq': message_data.get('seq')}, PRIORITY_HIGH)
+            return 0.0
+        if message_type == 'ack':
+            # 累计确认：客户端已按顺序收到该编号及之前的所有消息
+            client_info = self.clients.get(client)
+            seq = message_data.get('seq')
+            if client_info and isinstance(seq, int) and (client_info['acked'] is None or seq > client_info['acked']):
+                client_info['acked'] = seq
+            return 0.0
+        if message_type == 'leave':
+            # 客户端主动退出：结束会话，随后的断开按正常离开处理
+            client_info = self.clients.get(client)
+            if client_info and client_info['session'] is not None:
+                self.sessions.end(client_info['session'])
+            return 0.0
+        if message_type not in ('message', 'search', 'members_sync'):
+            return 0.0
+        client_info = self.clients.get(client)
+        if not client_info:
+            return 0.0
+        decision, wait = self._admit_message(client, client_info, message_data)
+        if decision in (DROP, DISCONNECT):
+            return 0.0
 
-            display_system_message(f"{client_uid} 离开了聊天室")
-            self._broadcast({
-                'type': 'system',
-                'message': f'{client_uid} 离开了聊天室',
-                'sender': '系统',
+        if message_type == 'search':
+            # 在检索线程中查询发送者所在的聊天室，结果单独发回
+            self.search_indexer.search(client_info['room'].search, client, message_data)
+        elif message_type == 'members_sync':
+            # 客户端发现名单版本不连续，重新发送完整名单
+            room = client_info['room']
+            with room.history.lock:
+                self._send_message(client, self._member_snapshot(room))
+        else:
+            # 向发送者所在的聊天室广播聊天消息
+            broadcast_data = {
+                'type': 'message',
+                'message': message_data['message'],
+                'sender': client_uid,
                 'timestamp': get_current_time()
-            })
+            }
+            self._room_broadcast(broadcast_data, client_info['room'])
+        return wait
 
-    def _broadcast(self, message_data, exclude=None):
-        """广播消息给所有客户端"""
-        for client_socket in list(self.clients.keys()):
-            if client_socket != exclude:
-                try:
-                    send_json(client_socket, message_data)
-                except:
-                    # 发送失败，移除客户端
-                    if client_socket in self.clients:
-                        client_info = self.clients[client_socket]
-                        self._remove_client(client_socket, client_info['uid'])
+    def _admit_message(self, client, client_info, message_data):
+        """
+        按客户端与聊天室的令牌桶对入站消息限流（每条消息O(1)）
+        Returns:
+            (ACCEPT / DELAY / DROP / DISCONNECT, 暂停读取的秒数)
+        """
+        text = message_data.get('message') if message_data.get('type') == 'message' else message_data.get('query')
+        size = len(str(text or '').encode('utf-8'))
+        decision, wait = admit_message(client_info['rate_limiter'], client_info['room'].rate_limiter, size,
+                                       self.rate_limit_policy, self.rate_limit_max_delay)
+        if decision == DROP:
+            self._send_message(client, self._system_notice('发送过快，消息已被丢弃'), PRIORITY_LOW)
+        elif decision == DISCONNECT:
+            self.rate_limited_clients += 1
+            display_system_message(f"{client_info['uid']} 发送过快，已断开")
+            notice = self._system_notice('发送过快，已被断开')
+            notice['closing'] = True  # 客户端据此不再自动重连
+            self._send_message(client, notice, PRIORITY_HIGH)
+            self._remove_client(client, client_info['uid'], graceful=True, kicked=True)
+        return decision, wait
+
+    def _remove_client(self, client, client_uid, graceful=False, kicked=False):
+        """
+        移除客户端（登记表的移除是原子的，重复调用不会产生重复的离开通知）
+        Args:
+            graceful: 为True时先写出已排队的数据（如关闭通知）再断开
+            kicked: 被主机断开（发送过快、接收过慢）：结束会话，冷却期内拒绝其重新加入
+        """
+        client_info = self.clients.remove(client)
+        if client_info:
+            self.heartbeat.remove(client)
+            room = client_info['room']
+            room.members.remove(client)
+            client_info['queue'].close()
+            if graceful:
+                self._close_client_gracefully(client)
+            else:
+                self._close_client(client)
+
+            if self.running and not room.closed:
+                # 意外断开的会话保留等待重连；被踢出、关闭通知后断开（graceful）时结束会话
+                if kicked:
+                    self.sessions.kick(client_info['session'], client_uid, room)
+                elif self.sessions.detach(client_info['session'], client, keep=not graceful):
+                    display_system_message(f"{client_uid} 连接中断，等待重连")
+                    return
+                self.presence.left(room, client_uid)
+            display_system_message(f"{client_uid} 离开了聊天室 '{room.room_name}'")
+
+    def _session_expired(self, client_uid, room):
+        """保留的会话到期仍未重连，按离开处理"""
+        if self.running and not room.closed:
+            display_system_message(f"{client_uid} 未能重连，离开了聊天室 '{room.room_name}'")
+            self.presence.left(room, client_uid)
+
+    def _flush_presence(self, room, joined, left):
+        """广播一个合并周期内聊天室的加入/离开通知（每类最多一条）"""
+        if not self.running:
+            return
+        for uids, action in ((joined, '加入'), (left, '离开')):
+            if uids:
+                self._room_broadcast(self._system_notice(presence_text(uids, action)), room)
+        if self.presence_relay is not None:
+            self.presence_relay(room.room_uid, joined, left)
+        else:
+            self._apply_member_diff(room, joined, left)
+
+    def _apply_member_diff(self, room, joined, left, version=None):
+        """
+        更新聊天室的成员名单，并向本机成员广播这一版本的增减（一个合并周期一条消息）
+        名单只在本机（或同一主机的各工作进程间）维护，不经联邦转发
+        Args:
+            version: 多进程模式下由主进程给出的版本号
+        """
+        with room.history.lock:
+            version, added, removed = room.roster.apply(joined, left, version)
+            if added or removed:
+                self._broadcast({
+                    'type': 'members',
+                    'room_uid': room.room_uid,
+                    'version': version,
+                    'added': added,
+                    'removed': removed
+                }, room=room)
+
+    def _member_snapshot(self, room):
+        """当前版本的完整成员名单消息（调用方持有 room.history.lock）"""
+        return {
+            'type': 'members',
+            'room_uid': room.room_uid,
+            'version': room.roster.version,
+            'snapshot': room.roster.snapshot()
+        }
+
+    def _ping_client(self, client):
+        """向空闲的客户端发送心跳"""
+        self._send_message(client, {'type': 'ping'}, PRIORITY_HIGH)
+
+    def _heartbeat_expired(self, client):
+        """客户端超过心跳期限没有任何消息到达，按断开处理"""
+        client_info = self.clients.get(client)
+        if client_info:
+            display_system_message(f"{client_info['uid']} 心跳超时，已断开")
+            self._remove_client(client, client_info['uid'])
+
+    def _close_client(self, client_socket):
+        """关闭客户端连接（先shutdown以唤醒阻塞在该socket上的读写线程）"""
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            client_socket.close()
+        except:
+            pass
+        release_frame_reader(client_socket)
+
+    def _close_client_gracefully(self, client_socket):
+        """发送队列已关闭，写线程写完剩余帧后断开；对端不再接收时到期强制断开"""
+        timer = threading.Timer(CLOSE_FLUSH_TIMEOUT, self._close_client, args=(client_socket,))
+        timer.daemon = True
+        timer.start()
+
+    def _create_outbound_queue(self, client_socket, client_uid):
+        """为客户端创建发送队列并启动其写线程"""
+        queue = OutboundQueue()
+        writer_thread = threading.Thread(
+            target=self._write_loop,
+            args=(client_socket, client_uid, queue),
+            daemon=True
+        )
+        writer_thread.start()
+        return queue
+
+    def _write_loop(self, client_socket, client_uid, queue):
+        """客户端写线程：把发送队列中的帧写入socket"""
+        while True:
+            frame = queue.get()
+            if frame is None:
+                # 队列已关闭且写完
+                self._close_client(client_socket)
+                break
+            if not send_frame(client_socket, frame):
+                self._remove_client(client_socket, client_uid)
+                break
+
+    def _send_message(self, client, message_data, priority=PRIORITY_NORMAL):
+        """按客户端的线路格式编码并发送一条只发给它的消息"""
+        client_info = self.clients.get(client)
+        if not client_info:
+            return
+        frame = encode_json_frame(message_data, client_info['wire'])
+        if not self._send_frame(client, frame, priority):
+            self._remove_client(client, client_info['uid'], kicked=client_info['queue'].evicted)
+            return
+        self.metrics.messages_out.inc()
+        self.metrics.bytes_out.inc(len(frame))
+
+    def _send_frame(self, client, frame, priority=PRIORITY_NORMAL):
+        """
+        把已编码的帧放入客户端的发送队列
+        Returns:
+            False表示连接已关闭或按慢消费者策略应被断开
+        """
+        client_info = self.clients.get(client)
+        if not client_info:
+            return False
+        return client_info['queue'].put(frame, priority)
+
+    def get_outbound_stats(self):
+        """各客户端发送队列深度与慢消费者驱逐统计"""
+        return {
+            'evicted_clients': self.evicted_clients,
+            'dead_clients': self.heartbeat.dead_peers,
+            'clients': [
+                dict(uid=client_info['uid'], room_uid=client_info['room'].room_uid,
+                     unacked=self._unacked(client_info), **client_info['queue'].stats())
+                for client_info in self.clients.values()
+            ]
+        }
+
+    @staticmethod
+    def _unacked(client_info):
+        """客户端尚未确认的消息条数，不发送确认的客户端为None"""
+        acked = client_info.get('acked')
+        return None if acked is None else max(0, client_info['room'].history.seq - acked)
+
+    def _close_notice_frames(self):
+        """
+        Returns:
+            {线路格式: 聊天室关闭通知帧}，停止托管时所有成员共用，只编码一次
+        """
+        notice = {'type': 'system', 'message': '聊天室已关闭', 'sender': '系统', 'closing': True}
+        return {version: encode_json_frame(notice, version) for version in (WIRE_LEGACY, WIRE_V2)}
+
+    def _detach_all_clients(self):
+        """
+        一次性清空主机与各聊天室的成员列表（不逐个广播离开通知）
+        Returns:
+            [(客户端, 客户端信息)]
+        """
+        clients = self.clients.clear()
+        for room in self.rooms.rooms():
+            room.members.clear()
+        for client, _ in clients:
+            self.heartbeat.remove(client)
+        return clients
+
+    def _system_notice(self, text):
+        """构造系统通知消息"""
+        return {
+            'type': 'system',
+            'message': text,
+            'sender': '系统',
+            'timestamp': get_current_time()
+        }
+
+    def _room_broadcast(self, message_data, room, exclude=None):
+        """
+        向聊天室广播一条由本主机的成员引发的消息；多进程模式下同时转发给其他工作进程，
+        启用联邦时同时转发给相连的主机
+        """
+        self._broadcast(message_data, exclude=exclude, room=room)
+        if self.peer_relay is not None:
+            self.peer_relay(room.room_uid, message_data)
+        if self.federation is not None:
+            self.federation.publish(room.room_uid, message_data)
+
+    @profiled()
+    def _broadcast(self, message_data, exclude=None, priority=None, room=None):
+        """
+        广播消息（每种线路格式只编码一次，同一帧放入所有接收者的发送队列）
+        Args:
+            room: 只发给该聊天室的成员；为None时发给所有聊天室
+        """
+        if priority is None:
+            priority = PRIORITY_LOW if message_data.get('type') == 'system' else PRIORITY_NORMAL
+
+        frames = {}
+        for target in ([room] if room is not None else self.rooms.rooms()):
+            self._broadcast_to_room(message_data, target, exclude, priority, frames)
+
+    def _broadcast_to_room(self, message_data, room, exclude, priority, frames):
+        """向一个聊天室的成员广播，聊天消息编号后同时记入该聊天室的历史"""
+        started = time.perf_counter()
+        if message_data.get('type') == 'message':
+            # 编号按聊天室分配，每个聊天室单独编码
+            frames = {}
+            with room.history.lock:
+                seq = room.history.next_seq()
+                message_data = dict(message_data, seq=seq)
+                frame = frames[WIRE_VERSION] = encode_json_frame(message_data, WIRE_VERSION)
+                room.history.append(frame, seq)
+                members = room.members.snapshot()
+            if self.message_log is not None:
+                # 只入队，写文件和fsync由日志写线程完成
+                log_frame = frame if WIRE_VERSION == WIRE_V2 else encode_json_frame(message_data, WIRE_V2)
+                self.message_log.append(room.room_uid, log_frame)
+            self.search_indexer.add(room.search, message_data)
+        else:
+            members = room.members.snapshot()
+
+        failed = []
+        sent = sent_bytes = 0
+        for client, client_info in members:
+            if client is exclude:
+                continue
+            wire_version = client_info['wire']
+            frame = frames.get(wire_version)
+            if frame is None:
+                frame = frames[wire_version] = encode_json_frame(message_data, wire_version)
+            if self._send_frame(client, frame, priority):
+                sent += 1
+                sent_bytes += len(frame)
+            else:
+                failed.append(client)
+
+        metrics = self.metrics
+        metrics.broadcasts.inc()
+        metrics.messages_out.inc(sent)
+        metrics.bytes_out.inc(sent_bytes)
+        metrics.fanout_seconds.observe(time.perf_counter() - started)
+
+        # 发送失败或接收过慢，移除客户端
+        for client in failed:
+            client_info = self.clients.get(client)
+            if client_info:
+                evicted = client_info['queue'].evicted
+                if evicted:
+                    self.evicted_clients += 1
+                    display_system_message(f"{client_info['uid']} 接收过慢，已断开")
+                # 被驱逐的成员不保留会话：否则它会立即恢复并收到同样让它被驱逐的积压消息
+                self._remove_client(client, client_info['uid'], kicked=evicted)
 
     def _host_message_loop(self):
         """主机消息循环"""
@@ -203,8 +965,59 @@ class ChatRoomHost:
                 if message.lower() == '/quit':
                     break
 
+                if message.lower() == '/queues':
+                    self._show_outbound_stats()
+                    continue
+
+                if message.lower() == '/limits':
+                    self._show_rate_limit_stats()
+                    continue
+
+                if message.lower() == '/stats':
+                    self._show_metrics()
+                    continue
+
+                if message.lower() == '/rooms':
+                    self._show_rooms()
+                    continue
+
+                if message.lower() == '/links':
+                    self._show_federation()
+                    continue
+
+                command, _, argument = message.partition(' ')
+                if command.lower() == '/profile':
+                    self._profile_command(argument.strip().lower())
+                    continue
+
+                if command.lower() == '/open':
+                    room_uid = self.create_room(argument.strip()) if argument.strip() else None
+                    if room_uid:
+                        display_system_message(f"聊天室 '{argument.strip()}' 创建成功，房间ID: {room_uid}")
+                    continue
+
+                if command.lower() == '/close':
+                    if not self.close_room(argument.strip()):
+                        display_system_message(f"没有房间ID为 '{argument.strip()}' 的聊天室")
+                    continue
+
+                if command.lower() == '/federate':
+                    if self.share_room(argument.strip()):
+                        display_system_message(f"聊天室 {argument.strip()} 已加入联邦")
+                    else:
+                        display_system_message(f"未启用主机联邦或没有房间ID为 '{argument.strip()}' 的聊天室")
+                    continue
+
+                if command.lower() == '/link':
+                    parts = argument.split()
+                    if len(parts) in (2, 3) and parts[1].isdigit():
+                        self.link_host(parts[0], int(parts[1]), parts[2] if len(parts) == 3 else None)
+                    else:
+                        display_system_message("用法: /link <地址> <端口> [房间ID]")
+                    continue
+
                 if message.strip():
-                    # 广播主机消息
+                    # 向所有聊天室广播主机消息
                     message_data = {
                         'type': 'message',
                         'message': message,
@@ -212,6 +1025,9 @@ class ChatRoomHost:
                         'timestamp': get_current_time()
                     }
                     self._broadcast(message_data)
+                    if self.federation is not None:
+                        for room in self.rooms.rooms():
+                            self.federation.publish(room.room_uid, message_data)
                     # 显示自己发送的消息
                     display_chat_message(message_data, is_own_message=True)
 
@@ -222,22 +1038,160 @@ class ChatRoomHost:
 
         self.stop_hosting()
 
+    def _show_outbound_stats(self):
+        """显示各客户端发送队列状态"""
+        stats = self.get_outbound_stats()
+        sessions = self.sessions.stats()
+        display_system_message(f"在线 {len(stats['clients'])} 人，因接收过慢被断开 {stats['evicted_clients']} 人，"
+                               f"因心跳超时被断开 {stats['dead_clients']} 人，等待重连 {sessions['parked']} 人，"
+                               f"已重连 {sessions['restored']} 次，被主机断开 {sessions['kicks']} 次")
+        for item in sorted(stats['clients'], key=lambda x: x['bytes'], reverse=True):
+            unacked = f"，未确认 {item['unacked']} 条" if item['unacked'] is not None else ""
+            print(f"  {item['uid']}: 积压 {item['depth']} 条/{item['bytes']} 字节，"
+                  f"峰值 {item['peak_bytes']} 字节，丢弃 {item['dropped']} 条{unacked}")
+
+    def get_rate_limit_stats(self):
+        """入站限流统计：各聊天室汇总与各客户端的放行/延迟/丢弃次数"""
+        return {
+            'policy': self.rate_limit_policy,
+            'disconnected_clients': self.rate_limited_clients,
+            'rooms': {room.room_uid: room.rate_limiter.stats() for room in self.rooms.rooms()},
+            'clients': [
+                dict(uid=client_info['uid'], room_uid=client_info['room'].room_uid,
+                     **client_info['rate_limiter'].stats())
+                for client_info in self.clients.values()
+            ]
+        }
+
+    def _show_rate_limit_stats(self):
+        """显示入站限流统计，客户端按被限流次数排序"""
+        stats = self.get_rate_limit_stats()
+        display_system_message(f"限流策略: {stats['policy']}，因发送过快被断开 {stats['disconnected_clients']} 人")
+        for room_uid, item in stats['rooms'].items():
+            print(f"  聊天室 {room_uid}: 放行 {item['accepted']}，延迟 {item['delayed']}，丢弃 {item['dropped']}")
+        limited = [item for item in stats['clients'] if item['delayed'] or item['dropped']]
+        for item in sorted(limited, key=lambda x: x['delayed'] + x['dropped'], reverse=True)[:20]:
+            print(f"  {item['uid']}: 放行 {item['accepted']}，延迟 {item['delayed']}，丢弃 {item['dropped']}")
+
+    def get_metrics(self):
+        """运行时统计快照（可直接序列化为JSON）"""
+        return self.metrics.snapshot()
+
+    def _show_metrics(self):
+        """显示运行时统计"""
+        snapshot = self.get_metrics()
+        if not snapshot['enabled']:
+            display_system_message("运行时统计未启用 (METRICS_ENABLED)")
+            return
+        counters, gauges, histograms = snapshot['counters'], snapshot['gauges'], snapshot['histograms']
+        uptime = max(snapshot['uptime_seconds'], 1e-9)
+        display_system_message(f"运行 {uptime:.0f} 秒，在线 {gauges.get('active_connections', 0)} 人，"
+                               f"聊天室 {gauges.get('rooms', 0)} 个")
+        for direction, label in (('in', '收到'), ('out', '发出')):
+            messages, size = counters.get(f'messages_{direction}', 0), counters.get(f'bytes_{direction}', 0)
+            print(f"  {label}: {messages} 条/{size} 字节 (平均 {messages / uptime:.1f} 条/秒，{size / uptime:.0f} 字节/秒)")
+        for name, label, scale, unit in (('broadcast_fanout_seconds', '广播耗时', 1000, 'ms'),
+                                         ('handshake_seconds', '握手耗时', 1000, 'ms'),
+                                         ('client_queue_bytes', '发送队列', 1, '字节')):
+            item = histograms.get(name)
+            if item and item['count']:
+                print(f"  {label}: {item['count']} 次，平均 {item['mean'] * scale:.3f}{unit}，"
+                      f"p50 {item['p50'] * scale:.3f}{unit}，p99 {item['p99'] * scale:.3f}{unit}，"
+                      f"最大 {item['max'] * scale:.3f}{unit}")
+
+    def get_federation_stats(self):
+        """联邦连接与转发统计，未启用联邦时为None"""
+        return self.federation.stats() if self.federation is not None else None
+
+    def _show_federation(self):
+        """显示联邦连接及各连接的收发统计"""
+        stats = self.get_federation_stats()
+        if stats is None:
+            display_system_message("未启用主机联邦")
+            return
+        display_system_message(f"联邦端口 {stats['port']}，连接 {len(stats['links'])} 条，"
+                               f"转发出 {stats['published']} 条，收到 {stats['delivered']} 条，"
+                               f"丢弃重复 {stats['duplicates']} 条，拒绝 {stats['rejected']} 次")
+        display_system_message(f"联邦聊天室: {', '.join(stats['shared_rooms']) or '无'}")
+        for item in stats['links']:
+            direction = '主动' if item['outgoing'] else '被动'
+            print(f"  {item['peer_uid']} ({item['address']}，{direction}): 收 {item['messages_in']} 条，"
+                  f"发 {item['messages_out']} 条，积压 {item['backlog_bytes']} 字节")
+
+    def _profile_command(self, action):
+        """
+        性能剖析控制台命令
+        Args:
+            action: on=采样计时, cpu=采样计时+cProfile, off=停止, dump=导出cProfile,
+                    mem=导出tracemalloc快照（首次执行开始跟踪）, summary=显示并写出各函数耗时汇总
+        """
+        if action in ('on', 'cpu'):
+            profiler.enable(cpu=action == 'cpu')
+            display_system_message(f"性能剖析已开启{'（含cProfile）' if profiler.cpu_enabled else ''}，"
+                                   f"每 {profiler.sample_every} 次调用计时一次")
+        elif action == 'off':
+            profiler.disable()
+            display_system_message("性能剖析已关闭，已收集的数据仍可导出")
+        elif action == 'dump':
+            path = profiler.dump_cpu()
+            display_system_message(f"cProfile 数据已写入 {path}" if path else "尚无cProfile数据，先执行 '/profile cpu'")
+        elif action == 'mem':
+            path = profiler.dump_memory()
+            display_system_message(f"内存快照已写入 {path}" if path else "已开始跟踪内存分配，稍后再次执行以导出快照")
+        elif action == 'summary':
+            summary = profiler.summary()
+            if not summary:
+                display_system_message("尚无剖析数据，先执行 '/profile on'")
+                return
+            display_system_message(f"耗时汇总已写入 {profiler.write_summary()}")
+            for name, item in summary.items():
+                print(f"  {name}: {item['calls']} 次，平均 {item['mean_ms']:.3f}ms，p50 {item['p50_ms']:.3f}ms，"
+                      f"p99 {item['p99_ms']:.3f}ms，最大 {item['max_ms']:.3f}ms")
+        else:
+            display_system_message("用法: /profile on|cpu|off|dump|mem|summary")
+
+    def get_history_stats(self):
+        """各聊天室历史缓冲区的内存占用"""
+        return {room.room_uid: room.history.stats() for room in self.rooms.rooms()}
+
+    def _show_rooms(self):
+        """显示所有聊天室及其在线人数和历史消息占用"""
+        rooms = self.rooms.rooms()
+        display_system_message(f"共 {len(rooms)} 个聊天室，在线 {len(self.clients)} 人")
+        for room in rooms:
+            history = room.history.stats()
+            print(f"  {room.room_uid}: {room.room_name}，在线 {len(room.members)} 人，"
+                  f"历史 {history['messages']} 条/{history['bytes']} 字节 (上限 {history['max_bytes']} 字节)")
+
     def stop_hosting(self):
-        """停止托管"""
+        """
+        停止托管
+        同一个关闭通知帧放入所有成员的发送队列，由各写线程并行写出；在期限内等待写完，
+        之后统一断开。成员列表一次清空，不会逐个广播离开通知，整体O(N)。
+        """
         display_system_message("正在关闭聊天室...")
         self.running = False
+        self.presence.close()
 
-        # 通知所有客户端
-        for client_socket in list(self.clients.keys()):
-            try:
-                send_json(client_socket, {
-                    'type': 'system',
-                    'message': '聊天室已关闭',
-                    'sender': '系统'
-                })
-            except:
-                pass
-            self._remove_client(client_socket, self.clients[client_socket]['uid'])
+        frames = self._close_notice_frames()
+        clients = self._detach_all_clients()
+        for client, client_info in clients:
+            # 写线程写完关闭通知后自行断开
+            client_info['queue'].put(frames[client_info['wire']], PRIORITY_HIGH)
+            client_info['queue'].close()
+
+        # 写线程写完后会关闭socket，fileno() 变为-1
+        deadline = time.monotonic() + SHUTDOWN_FLUSH_TIMEOUT
+        pending = [client for client, _ in clients]
+        while pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+            pending = [client for client in pending if client.fileno() != -1]
+
+        # 期限内没有写完的（对端不再接收）强制断开
+        for client, _ in clients:
+            self._close_client(client)
+        if clients:
+            display_system_message(f"已断开 {len(clients)} 名成员")
 
         if self.server_socket:
             try:
@@ -245,10 +1199,41 @@ class ChatRoomHost:
             except:
                 pass
 
+        self._stop_background_tasks()
+        if profiler.enabled:
+            path = profiler.write_summary()
+            if path:
+                display_system_message(f"耗时汇总已写入 {path}")
         display_system_message("聊天室已关闭")
         time.sleep(1)
 
 
+HOST_ENGINES = ('threaded', 'async', 'selectors')
+
+
+def create_host(engine='threaded', port=DEFAULT_PORT, workers=1):
+    """
+    按引擎名称创建聊天室主机
+    Args:
+        engine: threaded=每客户端一个线程, async=asyncio事件循环, selectors=单线程非阻塞事件循环
+        port: 监听端口
+        workers: 工作进程数，大于1时各工作进程以 SO_REUSEPORT 共用端口，每个运行一个engine主机
+    """
+    if workers > 1:
+        from .room_host_workers import MultiProcessChatRoomHost, reuse_port_supported
+        if reuse_port_supported():
+            return MultiProcessChatRoomHost(engine, port, workers)
+        display_system_message("当前系统不支持 SO_REUSEPORT 负载均衡，使用单进程模式")
+
+    if engine == 'async':
+        from .room_host_async import AsyncChatRoomHost
+        return AsyncChatRoomHost(port)
+    if engine == 'selectors':
+        from .room_host_selectors import SelectorChatRoomHost
+        return SelectorChatRoomHost(port)
+    return ChatRoomHost(port)
+
+
 def create_chat_room():
     """创建聊天室函数"""
     from ..ui.display_utils import print_banner
@@ -268,8 +1253,41 @@ def create_chat_room():
         display_system_message("端口号无效，使用默认端口")
         port = DEFAULT_PORT
 
-    host = ChatRoomHost(port)
+    engine = get_input(f"选择主机引擎 ({'/'.join(HOST_ENGINES)})", HOST_ENGINES[0])
+    if engine not in HOST_ENGINES:
+        display_system_message("主机引擎无效，使用默认引擎")
+        engine = HOST_ENGINES[0]
+
+    workers_input = get_input("输入工作进程数 (大于1时多进程共用端口)", str(HOST_WORKERS))
+    try:
+        workers = max(1, int(workers_input)) if workers_input else HOST_WORKERS
+    except ValueError:
+        display_system_message("工作进程数无效，使用单进程模式")
+        workers = 1
+
+    log_dir = get_input("输入消息日志目录 (留空不保存历史消息)", MESSAGE_LOG_DIR or "")
+
+    federation_input = get_input("输入联邦端口 (留空不与其他主机互联)", "")
+    try:
+        federation_port = int(federation_input) if federation_input else None
+    except ValueError:
+        display_system_message("联邦端口无效，不启用主机联邦")
+        federation_port = None
+    federation_secret = FEDERATION_SECRET
+    if federation_port is not None:
+        federation_secret = get_input("输入联邦密钥 (各主机相同；留空则只接受允许列表中的主机)",
+                                      FEDERATION_SECRET or "") or None
+        if not federation_secret and not FEDERATION_ALLOWED_PEERS:
+            display_system_message("未配置联邦密钥或允许的主机，将拒绝其他主机发起的联邦连接")
+
+    host = create_host(engine, port, workers)
+    host.enable_message_log(log_dir)
+    host.enable_metrics_snapshot()
+    if federation_port is not None:
+        host.enable_federation(federation_port, federation_secret)
     room_uid = host.create_room(room_name)
+    if federation_port is not None and room_uid:
+        host.share_room(room_uid)
 
     if host.start_hosting():
         display_system_message(f"聊天室 '{room_name}' 运行结束")
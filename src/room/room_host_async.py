@@ -0,0 +1,226 @@
+# src/room/room_host_async.py
+import asyncio
+import threading
+import time
+from ..p2pu import decode_json_frame, encode_json_frame
+from ..p2pu.framing import HEADER_SIZE, MAX_FRAME_SIZE, FrameTooLargeError
+from ..ui.display_utils import display_system_message
+from ..config.settings import DEFAULT_PORT
+from .room_host import ChatRoomHost, CLOSE_FLUSH_TIMEOUT, SHUTDOWN_FLUSH_TIMEOUT
+from .outbound import PRIORITY_NORMAL, DROP, EVICT, admit_frame
+
+
+class TransportQueue:
+    """
+    以asyncio传输层写缓冲区作为客户端发送队列
+    按与 OutboundQueue 相同的慢消费者策略决定接受、丢弃或驱逐。
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.peak_bytes = 0
+        self.dropped = 0
+        self.evicted = False
+
+    def __len__(self):
+        return 1 if self.writer.transport.get_write_buffer_size() else 0
+
+    def put(self, frame, priority=PRIORITY_NORMAL):
+        if self.evicted or self.writer.is_closing():
+            return False
+        queued = self.writer.transport.get_write_buffer_size()
+        decision = admit_frame(queued, len(frame), priority)
+        if decision == DROP:
+            self.dropped += 1
+            return True
+        if decision == EVICT:
+            self.evicted = True
+            return False
+        self.writer.write(frame)
+        self.peak_bytes = max(self.peak_bytes, queued + len(frame))
+        return True
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {
+            'depth': len(self),
+            'bytes': self.writer.transport.get_write_buffer_size(),
+            'peak_bytes': self.peak_bytes,
+            'dropped': self.dropped,
+            'evicted': self.evicted
+        }
+
+
+class AsyncChatRoomHost(ChatRoomHost):
+    """
+    基于asyncio流的聊天室主机
+    所有成员连接由一个事件循环线程承载，不再为每个客户端创建线程；
+    协议与 ChatRoomHost 完全一致（join_room/join_success/message/system）。
+    """
+
+    def __init__(self, port=DEFAULT_PORT):
+        super().__init__(port)
+        self.loop = None
+        self._server = None
+        self._loop_thread = None
+        self._pending_handshakes = 0
+
+    def _start_engine(self):
+        """在后台线程中启动事件循环并开始接受连接"""
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self.loop)
+            self._server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_connection, sock=self.server_socket,
+                                     backlog=self.listen_backlog)
+            )
+            started.set()
+            self.loop.run_forever()
+
+        self._loop_thread = threading.Thread(target=run_loop, daemon=True)
+        self._loop_thread.start()
+        started.wait()
+
+    async def _read_message(self, reader):
+        """
+        读取并解码一个帧
+        Returns:
+            (消息, 帧的字节数)
+        """
+        header = await reader.readexactly(HEADER_SIZE)
+        length = int.from_bytes(header, 'big')
+        if length > MAX_FRAME_SIZE:
+            raise FrameTooLargeError(f"帧长度 {length} 超过上限 {MAX_FRAME_SIZE}")
+        return decode_json_frame(await reader.readexactly(length)), HEADER_SIZE + length
+
+    async def _handle_connection(self, reader, writer):
+        """处理握手并进入该客户端的消息循环"""
+        address = writer.get_extra_info('peername')
+        if self._pending_handshakes >= self.max_pending_handshakes:
+            # 待握手连接过多，直接拒绝
+            writer.close()
+            return
+
+        accepted_at = time.monotonic()
+        self._pending_handshakes += 1
+        try:
+            handshake, _ = await asyncio.wait_for(self._read_message(reader), self.handshake_timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError, ValueError, KeyError):
+            writer.close()
+            return
+        finally:
+            self._pending_handshakes -= 1
+
+        reply, wire_version, room = self._join_reply(handshake)
+        if reply is None:
+            writer.close()
+            return
+
+        writer.write(encode_json_frame(reply, wire_version))
+        if reply['type'] != 'join_success':
+            writer.close()
+            return
+
+        self.metrics.handshake_seconds.observe(time.monotonic() - accepted_at)
+        client_uid = handshake.get('uid', 'Unknown')
+        self._register_client(writer, client_uid, address, wire_version, room,
+                              heartbeat=bool(reply.get('heartbeat')), members=bool(reply.get('members')),
+                              resume=reply.get('resume'), session=reply.get('session'))
+        await self._handle_client(reader, writer, client_uid)
+
+    async def _handle_client(self, reader, writer, client_uid):
+        """处理客户端消息"""
+        while self.running:
+            try:
+                message_data, frame_size = await self._read_message(reader)
+            except (asyncio.IncompleteReadError, OSError, ValueError, KeyError):
+                break
+            if not message_data:
+                break
+
+            wait = self._handle_message(writer, client_uid, message_data, frame_size)
+            if wait:
+                # 超过限流速率：暂停读取该客户端
+                await asyncio.sleep(wait)
+
+        # 客户端断开连接
+        self._remove_client(writer, client_uid)
+        try:
+            # 取回连接关闭时的异常（如 BrokenPipe），避免 "exception was never retrieved"
+            await writer.wait_closed()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+
+    def _in_loop_thread(self):
+        return self._loop_thread is not None and threading.current_thread() is self._loop_thread
+
+    def _remove_client(self, writer, client_uid, graceful=False, kicked=False):
+        """移除客户端（切换到事件循环线程执行）"""
+        if not self._in_loop_thread():
+            self.loop.call_soon_threadsafe(self._remove_client, writer, client_uid, graceful, kicked)
+            return
+        super()._remove_client(writer, client_uid, graceful, kicked)
+
+    def _close_client(self, writer):
+        writer.close()
+
+    def _close_client_gracefully(self, writer):
+        """传输层关闭时会先写完缓冲区；对端不再接收时到期强制断开"""
+        writer.close()
+        self.loop.call_later(CLOSE_FLUSH_TIMEOUT, writer.transport.abort)
+
+    def _create_outbound_queue(self, writer, client_uid):
+        return TransportQueue(writer)
+
+    def _send_message(self, writer, message_data, priority=PRIORITY_NORMAL):
+        """向单个客户端发送消息（切换到事件循环线程执行）"""
+        if not self._in_loop_thread():
+            self.loop.call_soon_threadsafe(self._send_message, writer, message_data, priority)
+            return
+        super()._send_message(writer, message_data, priority)
+
+    def _broadcast(self, message_data, exclude=None, priority=None, room=None):
+        """广播消息给所有客户端（切换到事件循环线程执行）"""
+        if not self._in_loop_thread():
+            self.loop.call_soon_threadsafe(self._broadcast, message_data, exclude, priority, room)
+            return
+        super()._broadcast(message_data, exclude, priority, room)
+
+    async def _shutdown(self):
+        """在事件循环中向所有成员写入同一个关闭通知帧，期限内等待写完后断开"""
+        if self._server:
+            self._server.close()
+        frames = self._close_notice_frames()
+        writers = []
+        for writer, client_info in self._detach_all_clients():
+            if not writer.is_closing():
+                writer.write(frames[client_info['wire']])
+                writer.close()  # 传输层写完缓冲区后关闭
+                writers.append(writer)
+
+        deadline = time.monotonic() + SHUTDOWN_FLUSH_TIMEOUT
+        while writers and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            writers = [writer for writer in writers if writer.transport.get_write_buffer_size()]
+        for writer in writers:
+            writer.transport.abort()
+
+    def stop_hosting(self):
+        """停止托管"""
+        display_system_message("正在关闭聊天室...")
+        self.running = False
+
+        if self.loop and self.loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=SHUTDOWN_FLUSH_TIMEOUT + 3)
+            except Exception as e:
+                display_system_message(f"关闭连接时出错: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._loop_thread.join(timeout=5)
+
+        self._stop_background_tasks()
+        display_system_message("聊天室已关闭")
@@ -0,0 +1,397 @@
+# src/room/room_host_selectors.py
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from ..p2pu import FrameReader, decode_json_frame, encode_json_frame, profiled
+from ..p2pu.framing import HEADER_SIZE
+from ..ui.display_utils import display_system_message
+from ..config.settings import DEFAULT_PORT
+from .room_host import ChatRoomHost, CLOSE_FLUSH_TIMEOUT, SHUTDOWN_FLUSH_TIMEOUT
+from .outbound import OutboundQueue, PRIORITY_HIGH, PRIORITY_NORMAL
+
+SELECT_INTERVAL = 1.0
+
+
+class _Connection:
+    """非阻塞连接的状态：帧读取器、发送队列、握手信息和限流暂停状态"""
+
+    __slots__ = ('sock', 'address', 'reader', 'queue', 'writing', 'uid', 'deadline', 'closing',
+                 'events', 'resume_at')
+
+    def __init__(self, sock, address, deadline):
+        self.sock = sock
+        self.address = address
+        self.reader = FrameReader(sock)
+        self.queue = OutboundQueue()
+        self.writing = False  # 是否已注册可写事件
+        self.uid = None  # 握手完成前为None
+        self.deadline = deadline  # 握手期限或关闭期限，其余时间为None
+        self.closing = False
+        self.events = selectors.EVENT_READ  # 当前在selector中注册的事件，0为未注册
+        self.resume_at = None  # 被限流暂停读取时恢复读取的时间
+
+
+class SelectorChatRoomHost(ChatRoomHost):
+    """
+    基于selectors（Linux下为epoll）的单线程聊天室主机
+    非阻塞accept，增量读取帧，每个连接维护有界发送队列并在可写时刷新，
+    单个卡住的客户端只会积压自己的队列，不会阻塞其他成员的广播。
+    """
+
+    def __init__(self, port=DEFAULT_PORT):
+        super().__init__(port)
+        self._selector = None
+        self._loop_thread = None
+        self._pending_calls = deque()
+        self._wakeup_recv = None
+        self._wakeup_send = None
+        self._pending_handshakes = set()  # 尚未完成握手的连接
+        self._closing = set()  # 写完关闭通知后断开的连接
+        self._paused = {}  # 被限流暂停读取的连接 {socket: 连接}
+        self._resume_heap = []  # [(恢复时间, 序号, 连接)]
+        self._resume_seq = itertools.count()
+
+    def _start_engine(self):
+        """注册监听socket与唤醒管道，在后台线程中运行事件循环"""
+        self._selector = selectors.DefaultSelector()
+        self.server_socket.setblocking(False)
+        self._selector.register(self.server_socket, selectors.EVENT_READ, None)
+
+        # 其他线程（如主机控制台）通过唤醒管道把调用投递到事件循环
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ, self._wakeup_recv)
+
+        self._loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._loop_thread.start()
+
+    def _in_loop_thread(self):
+        return self._loop_thread is not None and threading.current_thread() is self._loop_thread
+
+    def _call_soon(self, func, *args):
+        """把调用投递到事件循环线程执行"""
+        self._pending_calls.append((func, args))
+        try:
+            self._wakeup_send.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # 管道已满说明事件循环马上就会被唤醒
+
+    def _run_loop(self):
+        """事件循环"""
+        while self.running:
+            timeout = SELECT_INTERVAL
+            if self._resume_heap:
+                timeout = min(timeout, max(0, self._resume_heap[0][0] - time.monotonic()))
+            for key, mask in self._selector.select(timeout):
+                if key.data is None:
+                    self._accept_ready()
+                elif key.data is self._wakeup_recv:
+                    self._run_pending_calls()
+                else:
+                    conn = key.data
+                    if mask & selectors.EVENT_READ and conn.sock.fileno() != -1:
+                        self._read_ready(conn)
+                    # 连接可能在本轮处理其他事件时已被关闭
+                    if mask & selectors.EVENT_WRITE and conn.sock.fileno() != -1:
+                        self._flush(conn)
+            self._expire_handshakes()
+            self._expire_closing()
+            self._resume_reading()
+        self._run_pending_calls()
+
+    def _run_pending_calls(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        while self._pending_calls:
+            func, args = self._pending_calls.popleft()
+            func(*args)
+
+    @profiled()  # 对应线程引擎的 _accept_connections
+    def _accept_ready(self):
+        """非阻塞接受所有排队的连接"""
+        while True:
+            try:
+                client_socket, address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # Socket closed
+            if len(self._pending_handshakes) >= self.max_pending_handshakes:
+                # 待握手连接过多，直接拒绝以保持accept畅通
+                client_socket.close()
+                continue
+
+            client_socket.setblocking(False)
+            conn = _Connection(client_socket, address, time.monotonic() + self.handshake_timeout)
+            self._pending_handshakes.add(conn)
+            self._selector.register(client_socket, selectors.EVENT_READ, conn)
+
+    @profiled()  # 对应线程引擎的 _handle_client
+    def _read_ready(self, conn):
+        """读取数据并处理所有已完整到达的帧"""
+        try:
+            received = conn.reader.fill()
+        except (BlockingIOError, InterruptedError):
+            return
+        except (OSError, ValueError):
+            received = 0
+        if not received:
+            self._drop_connection(conn)
+            return
+        self._process_frames(conn)
+
+    def _process_frames(self, conn):
+        """处理缓冲区中所有已完整到达的帧；被限流暂停时剩余的帧留到恢复读取后处理"""
+        try:
+            for frame in conn.reader.frames():
+                message_data = decode_json_frame(frame)
+                if not message_data:
+                    self._drop_connection(conn)
+                    return
+                if conn.uid is None:
+                    self._handle_handshake(conn, message_data)
+                else:
+                    wait = self._handle_message(conn.sock, conn.uid, message_data, HEADER_SIZE + len(frame))
+                    if wait and not conn.closing:
+                        self._pause_reading(conn, wait)
+                        return
+                if conn.closing:
+                    return
+        except (ValueError, KeyError) as e:
+            display_system_message(f"处理客户端消息时出错: {e}")
+            self._drop_connection(conn)
+
+    def _handle_handshake(self, conn, handshake):
+        """处理握手消息"""
+        reply, wire_version, room = self._join_reply(handshake)
+        if reply is None:
+            self._drop_connection(conn)
+            return
+
+        self._queue(conn, encode_json_frame(reply, wire_version), PRIORITY_HIGH)
+        if reply['type'] != 'join_success':
+            # 回复写出后再关闭
+            conn.closing = True
+            self._flush(conn)
+            return
+
+        conn.uid = handshake.get('uid', 'Unknown')
+        self.metrics.handshake_seconds.observe(time.monotonic() - (conn.deadline - self.handshake_timeout))
+        self._end_handshake(conn)
+        self._register_client(conn.sock, conn.uid, conn.address, wire_version, room,
+                              heartbeat=bool(reply.get('heartbeat')), members=bool(reply.get('members')),
+                              resume=reply.get('resume'), session=reply.get('session'))
+
+    def _update_events(self, conn):
+        """按是否暂停读取、是否有待写数据更新连接在selector中注册的事件"""
+        events = (0 if conn.resume_at else selectors.EVENT_READ) | (selectors.EVENT_WRITE if conn.writing else 0)
+        if events == conn.events:
+            return
+        if not conn.events:
+            self._selector.register(conn.sock, events, conn)
+        elif not events:
+            self._selector.unregister(conn.sock)
+        else:
+            self._selector.modify(conn.sock, events, conn)
+        conn.events = events
+
+    def _pause_reading(self, conn, wait):
+        """超过限流速率：暂停读取该连接，积压留在TCP缓冲区中，由对端感受到背压"""
+        conn.resume_at = time.monotonic() + wait
+        self._paused[conn.sock] = conn
+        heapq.heappush(self._resume_heap, (conn.resume_at, next(self._resume_seq), conn))
+        self._update_events(conn)
+
+    def _resume_reading(self):
+        """恢复到期的暂停连接，先处理暂停前已读入缓冲区的帧"""
+        now = time.monotonic()
+        while self._resume_heap and self._resume_heap[0][0] <= now:
+            resume_at, _, conn = heapq.heappop(self._resume_heap)
+            if conn.resume_at != resume_at or self._paused.get(conn.sock) is not conn:
+                continue  # 连接已关闭
+            del self._paused[conn.sock]
+            conn.resume_at = None
+            self._update_events(conn)
+            self._process_frames(conn)
+
+    def _end_handshake(self, conn):
+        """连接离开待握手状态"""
+        conn.deadline = None
+        self._pending_handshakes.discard(conn)
+
+    def _expire_handshakes(self):
+        """关闭超过握手期限仍未完成握手的连接"""
+        now = time.monotonic()
+        for conn in [conn for conn in self._pending_handshakes if conn.deadline < now]:
+            self._drop_connection(conn)
+
+    def _expire_closing(self):
+        """强制断开超过关闭期限仍未写完的连接"""
+        now = time.monotonic()
+        for conn in [conn for conn in self._closing if conn.deadline < now]:
+            self._close_client(conn.sock)
+
+    def _queue(self, conn, frame, priority=PRIORITY_NORMAL):
+        """把帧放入连接的发送队列并尽量立即写出"""
+        if not conn.queue.put(frame, priority):
+            return False
+        if not conn.writing:
+            self._flush(conn)
+        return True
+
+    def _flush(self, conn):
+        """写出发送队列直到socket缓冲区写满，剩余部分等待可写事件"""
+        while True:
+            data = conn.queue.head()
+            if data is None:
+                break
+            try:
+                sent = conn.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self._drop_connection(conn)
+                return
+            conn.queue.consume(sent)
+            if sent < len(data):
+                break
+
+        if len(conn.queue):
+            if not conn.writing:
+                conn.writing = True
+                self._update_events(conn)
+        elif conn.closing:
+            self._drop_connection(conn)
+        elif conn.writing:
+            conn.writing = False
+            self._update_events(conn)
+
+    def _connection_for(self, client_socket):
+        try:
+            return self._selector.get_key(client_socket).data
+        except (KeyError, ValueError):
+            # 暂停读取且没有待写数据的连接不在selector中
+            return self._paused.get(client_socket)
+
+    def _drop_connection(self, conn):
+        """关闭连接；已加入的成员走正常的离开流程"""
+        self._end_handshake(conn)
+        if conn.uid is not None and conn.sock in self.clients:
+            self._remove_client(conn.sock, conn.uid)
+        else:
+            self._close_client(conn.sock)
+
+    def _close_client(self, client_socket):
+        conn = self._connection_for(client_socket)
+        if conn is not None:
+            conn.closing = True
+            self._closing.discard(conn)
+        self._paused.pop(client_socket, None)
+        try:
+            self._selector.unregister(client_socket)
+        except (KeyError, ValueError):
+            pass
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+
+    def _close_client_gracefully(self, client_socket):
+        """写完发送队列后由 _flush 断开，到期仍未写完则强制断开"""
+        conn = self._connection_for(client_socket)
+        if conn is None:
+            return
+        conn.closing = True
+        conn.deadline = time.monotonic() + CLOSE_FLUSH_TIMEOUT
+        self._closing.add(conn)
+        self._flush(conn)
+
+    def _create_outbound_queue(self, client_socket, client_uid):
+        """非阻塞连接在accept时已创建发送队列，由事件循环负责写出"""
+        return self._connection_for(client_socket).queue
+
+    def _send_frame(self, client_socket, frame, priority=PRIORITY_NORMAL):
+        """放入连接的发送队列，不会阻塞事件循环"""
+        conn = self._connection_for(client_socket)
+        if conn is None or conn.closing:
+            return False
+        return self._queue(conn, frame, priority)
+
+    def _remove_client(self, client_socket, client_uid, graceful=False, kicked=False):
+        """移除客户端（切换到事件循环线程执行）"""
+        if not self._in_loop_thread():
+            self._call_soon(self._remove_client, client_socket, client_uid, graceful, kicked)
+            return
+        super()._remove_client(client_socket, client_uid, graceful, kicked)
+
+    def _send_message(self, client_socket, message_data, priority=PRIORITY_NORMAL):
+        """向单个客户端发送消息（切换到事件循环线程执行）"""
+        if not self._in_loop_thread():
+            self._call_soon(self._send_message, client_socket, message_data, priority)
+            return
+        super()._send_message(client_socket, message_data, priority)
+
+    def _broadcast(self, message_data, exclude=None, priority=None, room=None):
+        """广播消息给所有客户端（切换到事件循环线程执行）"""
+        if not self._in_loop_thread():
+            self._call_soon(self._broadcast, message_data, exclude, priority, room)
+            return
+        super()._broadcast(message_data, exclude, priority, room)
+
+    def _shutdown(self, done):
+        """在事件循环中通知所有成员并在期限内尽量刷新待写数据"""
+        frames = self._close_notice_frames()
+        for client_socket, client_info in self._detach_all_clients():
+            conn = self._connection_for(client_socket)
+            if conn is not None:
+                self._queue(conn, frames[client_info['wire']], PRIORITY_HIGH)
+                conn.closing = True
+
+        deadline = time.monotonic() + SHUTDOWN_FLUSH_TIMEOUT
+        while time.monotonic() < deadline:
+            pending = [key.data for key in self._selector.get_map().values()
+                       if isinstance(key.data, _Connection) and len(key.data.queue)]
+            if not pending:
+                break
+            for key, mask in self._selector.select(deadline - time.monotonic()):
+                if isinstance(key.data, _Connection) and mask & selectors.EVENT_WRITE:
+                    self._flush(key.data)
+
+        for key in list(self._selector.get_map().values()):
+            if isinstance(key.data, _Connection):
+                self._close_client(key.data.sock)
+        for conn in list(self._paused.values()):
+            self._close_client(conn.sock)
+        self.running = False
+        done.set()
+
+    def stop_hosting(self):
+        """停止托管"""
+        display_system_message("正在关闭聊天室...")
+
+        if self._loop_thread and self._loop_thread.is_alive():
+            done = threading.Event()
+            self._call_soon(self._shutdown, done)
+            done.wait(SHUTDOWN_FLUSH_TIMEOUT + SELECT_INTERVAL + 1)
+            self._loop_thread.join(timeout=SELECT_INTERVAL + 1)
+        self.running = False
+
+        for sock in (self.server_socket, self._wakeup_recv, self._wakeup_send):
+            if sock:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+        if self._selector:
+            self._selector.close()
+
+        self._stop_background_tasks()
+        display_system_message("聊天室已关闭")
@@ -0,0 +1,330 @@
+# src/room/room_host_workers.py
+import contextlib
+import io
+import multiprocessing
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from ..p2pu import encode_json_frame
+from ..p2pu.core_utils import WIRE_V2
+from ..ui.display_utils import display_system_message
+from ..config.settings import DEFAULT_PORT
+from .room_host import ChatRoomHost, create_host
+from .channel import FrameChannel
+from .metrics import HostMetrics, merge_snapshots
+
+STATS_TIMEOUT = 2.0
+WORKER_STOP_TIMEOUT = 10
+
+
+def reuse_port_supported():
+    """当前平台是否支持由内核在多个监听socket之间分配连接"""
+    return hasattr(socket, 'SO_REUSEPORT') and sys.platform.startswith('linux')
+
+
+def _run_worker(index, engine, port, rooms, log_dir, sock):
+    """
+    工作进程入口：运行一个以 SO_REUSEPORT 绑定共享端口的主机引擎，并执行主进程发来的命令
+    Args:
+        index: 工作进程编号
+        engine: 主机引擎名称
+        port: 共享端口
+        rooms: [(房间ID, 名称)]，与主进程的聊天室一致
+        log_dir: 消息日志目录，工作进程只读取它恢复历史消息，写入由主进程负责
+        sock: 与主进程通信的socket
+    """
+    # Ctrl+C 由主进程统一处理后通知各工作进程退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    channel = FrameChannel(sock)
+
+    host = create_host(engine, port)
+    host.reuse_port = True
+    host.log_dir = log_dir
+    for room_uid, room_name in rooms:
+        host._add_room(room_uid, room_name)
+
+    def relay(room_uid, message_data):
+        channel.send({'type': 'relay', 'room_uid': room_uid, 'message': message_data})
+
+    def presence_relay(room_uid, joined, left):
+        channel.send({'type': 'presence', 'room_uid': room_uid, 'joined': joined, 'left': left})
+
+    host.peer_relay = relay
+    host.presence_relay = presence_relay
+    if not host.start_hosting(interactive=False):
+        channel.send({'type': 'failed', 'worker': index})
+        channel.close(timeout=1)
+        return
+    channel.send({'type': 'ready', 'worker': index})
+
+    while True:
+        command = channel.receive()
+        if not command or command.get('type') == 'stop':
+            break
+        _handle_command(host, channel, index, command)
+
+    # 关闭信息由主进程统一显示
+    with contextlib.redirect_stdout(io.StringIO()):
+        host.stop_hosting()
+    channel.close(timeout=1)
+
+
+def _handle_command(host, channel, index, command):
+    """执行主进程发来的一条命令"""
+    command_type = command.get('type')
+    if command_type in ('relay', 'broadcast'):
+        # 其他工作进程的房间广播或主机控制台消息，发给本进程的成员
+        room_uid = command.get('room_uid')
+        room = host.rooms.get(room_uid) if room_uid else None
+        if room_uid and room is None:
+            return
+        host._broadcast(command['message'], room=room)
+    elif command_type == 'members':
+        # 主进程编排好版本号的名单增减，更新本进程的名单副本并发给本进程的成员
+        room = host.rooms.get(command.get('room_uid'))
+        if room is not None:
+            host._apply_member_diff(room, command['added'], command['removed'], command['version'])
+    elif command_type == 'open_room':
+        host._add_room(command['room_uid'], command['room_name'])
+    elif command_type == 'close_room':
+        with contextlib.redirect_stdout(io.StringIO()):
+            host.close_room(command['room_uid'])
+    elif command_type == 'stats':
+        channel.send({
+            'type': 'stats',
+            'worker': index,
+            'rooms': {room.room_uid: len(room.members) for room in host.rooms.rooms()},
+            'history': host.get_history_stats(),
+            'rate_limit': host.get_rate_limit_stats(),
+            'metrics': host.get_metrics(),
+            'outbound': host.get_outbound_stats()
+        })
+
+
+class MultiProcessChatRoomHost(ChatRoomHost):
+    """
+    多进程聊天室主机
+    N个工作进程以 SO_REUSEPORT 绑定同一端口，由内核分配新连接，各自运行一个主机引擎，
+    不再受单个进程GIL的限制。同一聊天室的成员可能分布在不同工作进程上，
+    房间广播经主进程中转给其他工作进程，由它们发给各自的成员。
+    主进程本身不接受连接，只负责控制台、聊天室的创建/关闭和消息中转。
+    """
+
+    def __init__(self, engine='threaded', port=DEFAULT_PORT, workers=2):
+        super().__init__(port)
+        self.engine = engine
+        self.worker_count = workers
+        self.reuse_port = True
+        self._workers = []  # [(进程, 通道)]
+        self._stats_replies = queue.Queue()
+        self._stats_lock = threading.Lock()
+
+    def _open_server_socket(self):
+        """只绑定不监听：占住端口（端口为0时确定实际端口），连接全部由工作进程接受"""
+        return self._bind_server_socket()
+
+    def _start_engine(self):
+        """启动工作进程，等待全部就绪后开始中转"""
+        # spawn: 工作进程只继承各自的通道，主进程退出时能收到EOF
+        context = multiprocessing.get_context('spawn')
+        rooms = [(room.room_uid, room.room_name) for room in self.rooms.rooms()]
+        try:
+            for index in range(self.worker_count):
+                parent_sock, child_sock = socket.socketpair()
+                process = context.Process(
+                    target=_run_worker,
+                    args=(index, self.engine, self.port, rooms, self.log_dir, child_sock),
+                    daemon=True
+                )
+                process.start()
+                child_sock.close()
+                self._workers.append((process, FrameChannel(parent_sock)))
+
+            for index, (_, channel) in enumerate(self._workers):
+                reply = channel.receive()
+                if not reply or reply.get('type') != 'ready':
+                    raise RuntimeError(f"工作进程 {index} 启动失败")
+        except Exception:
+            self._stop_workers()
+            raise
+
+        for index, (_, channel) in enumerate(self._workers):
+            relay_thread = threading.Thread(target=self._relay_loop, args=(index, channel), daemon=True)
+            relay_thread.start()
+        display_system_message(f"已启动 {self.worker_count} 个工作进程 ({self.engine})，共用端口 {self.port}")
+
+    def _relay_loop(self, index, channel):
+        """读取一个工作进程发来的消息：房间广播转发给其他工作进程，统计结果交给查询方"""
+        while True:
+            message = channel.receive()
+            if not message:
+                break
+            if message.get('type') == 'relay':
+                frame = encode_json_frame(message, WIRE_V2)
+                for other_index, (_, other) in enumerate(self._workers):
+                    if other_index != index:
+                        other.send_frame(frame)
+                # 所有房间广播都经过主进程，消息日志由主进程统一写入，联邦转发也由主进程负责
+                self._log_message(message['room_uid'], message['message'])
+                if self.federation is not None:
+                    self.federation.publish(message['room_uid'], message['message'])
+            elif message.get('type') == 'presence':
+                room = self.rooms.get(message.get('room_uid'))
+                if room is not None:
+                    self._apply_member_diff(room, message['joined'], message['left'])
+            elif message.get('type') == 'stats':
+                self._stats_replies.put(message)
+
+        if self.running:
+            display_system_message(f"工作进程 {index} 已退出")
+
+    def _log_message(self, room_uid, message_data):
+        if self.message_log is not None and message_data.get('type') == 'message':
+            self.message_log.append(room_uid, encode_json_frame(message_data, WIRE_V2))
+
+    def _send_to_workers(self, message):
+        frame = encode_json_frame(message, WIRE_V2)
+        for _, channel in self._workers:
+            channel.send_frame(frame)
+
+    def _load_history(self, room):
+        """历史消息和检索索引由各工作进程自己从日志恢复"""
+
+    def _add_room(self, room_uid, room_name):
+        room = super()._add_room(room_uid, room_name)
+        if room is not None:
+            self._send_to_workers({'type': 'open_room', 'room_uid': room_uid, 'room_name': room_name})
+        return room
+
+    def close_room(self, room_uid):
+        """关闭聊天室：由各工作进程通知并断开各自的成员"""
+        room = self.rooms.close(room_uid)
+        if room is None:
+            return False
+        self._forget_room(room)
+        if self.message_log is not None:
+            self.message_log.close_room(room_uid)
+        self._send_to_workers({'type': 'close_room', 'room_uid': room_uid})
+        display_system_message(f"聊天室 '{room.room_name}' 已关闭")
+        return True
+
+    def _broadcast(self, message_data, exclude=None, priority=None, room=None):
+        """主机控制台消息：交给所有工作进程，由它们广播给各自的成员"""
+        for target in ([room] if room is not None else self.rooms.rooms()):
+            self._log_message(target.room_uid, message_data)
+        self._send_to_workers({
+            'type': 'broadcast',
+            'room_uid': room.room_uid if room else None,
+            'message': message_data
+        })
+
+    def _apply_member_diff(self, room, joined, left, version=None):
+        """主进程持有权威名单：合并各工作进程的加入/离开，编排版本号后交给所有工作进程"""
+        with room.history.lock:
+            version, added, removed = room.roster.apply(joined, left, version)
+            if added or removed:
+                # 在锁内发送，各工作进程按版本号顺序收到
+                self._send_to_workers({
+                    'type': 'members',
+                    'room_uid': room.room_uid,
+                    'version': version,
+                    'added': added,
+                    'removed': removed
+                })
+
+    def _collect_worker_stats(self):
+        """向所有工作进程查询统计信息，返回按时收到的回复"""
+        with self._stats_lock:
+            while not self._stats_replies.empty():
+                self._stats_replies.get_nowait()
+            self._send_to_workers({'type': 'stats'})
+
+            replies = []
+            deadline = time.monotonic() + STATS_TIMEOUT
+            while len(replies) < len(self._workers):
+                try:
+                    replies.append(self._stats_replies.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            return sorted(replies, key=lambda reply: reply['worker'])
+
+    def get_outbound_stats(self):
+        """汇总各工作进程的发送队列统计"""
+        replies = self._collect_worker_stats()
+        return {
+            'evicted_clients': sum(reply['outbound']['evicted_clients'] for reply in replies),
+            'dead_clients': sum(reply['outbound']['dead_clients'] for reply in replies),
+            'clients': [client for reply in replies for client in reply['outbound']['clients']]
+        }
+
+    def get_metrics(self):
+        """合并各工作进程的运行时统计"""
+        replies = self._collect_worker_stats()
+        snapshot = merge_snapshots([reply['metrics'] for reply in replies], HostMetrics.BOUNDS)
+        snapshot['workers'] = len(replies)
+        snapshot['gauges']['rooms'] = len(self.rooms)
+        return snapshot
+
+    def get_rate_limit_stats(self):
+        """汇总各工作进程的入站限流统计（聊天室限流器按工作进程各自计数）"""
+        replies = self._collect_worker_stats()
+        rooms = {}
+        for reply in replies:
+            for room_uid, item in reply['rate_limit']['rooms'].items():
+                total = rooms.setdefault(room_uid, {'accepted': 0, 'delayed': 0, 'dropped': 0})
+                for key in total:
+                    total[key] += item[key]
+        return {
+            'policy': self.rate_limit_policy,
+            'disconnected_clients': sum(reply['rate_limit']['disconnected_clients'] for reply in replies),
+            'rooms': rooms,
+            'clients': [client for reply in replies for client in reply['rate_limit']['clients']]
+        }
+
+    def _show_rooms(self):
+        """显示所有聊天室的在线人数及成员在各工作进程上的分布"""
+        replies = self._collect_worker_stats()
+        members = {}
+        for reply in replies:
+            for room_uid, count in reply['rooms'].items():
+                members[room_uid] = members.get(room_uid, 0) + count
+
+        rooms = self.rooms.rooms()
+        display_system_message(f"共 {len(rooms)} 个聊天室，在线 {sum(members.values())} 人")
+        for room in rooms:
+            print(f"  {room.room_uid}: {room.room_name}，在线 {members.get(room.room_uid, 0)} 人")
+        for reply in replies:
+            # 各工作进程都保存完整的历史消息
+            history_bytes = sum(item['bytes'] for item in reply['history'].values())
+            print(f"  工作进程 {reply['worker']}: {sum(reply['rooms'].values())} 人，历史 {history_bytes} 字节")
+
+    def _stop_workers(self):
+        """通知工作进程退出，超时未退出的强制结束"""
+        for _, channel in self._workers:
+            channel.send({'type': 'stop'})
+        for process, channel in self._workers:
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+            channel.close(timeout=1)
+        self._workers = []
+
+    def stop_hosting(self):
+        """停止托管"""
+        display_system_message("正在关闭聊天室...")
+        self.running = False
+        # 最后一次统计快照需要在工作进程退出前收集
+        self._stop_metrics_writer()
+        self._stop_workers()
+        self._stop_background_tasks()
+
+        if self.server_socket:
+            try:
+                self.server_socket.close()
+            except OSError:
+                pass
+
+        display_system_message("聊天室已关闭")
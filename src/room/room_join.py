@@ -4,11 +4,12 @@ import threading
 import time
 from ..p2pu import (
     get_or_create_uid, send_json, receive_json, get_current_time,
-    prefer_ipv6_connections, is_ipv4_address, is_ipv6_address
+    prefer_ipv6_connections, is_ipv4_address, is_ipv6_address, release_frame_reader,
+    negotiate_wire_version, set_wire_version, HeartbeatMonitor, backoff_delays
 )
 from ..ui.display_utils import display_system_message, display_chat_message
 from ..ui.input_utils import get_input
-from ..config.settings import DEFAULT_PORT
+from ..config.settings import DEFAULT_PORT, WIRE_VERSION, ACK_EVERY, CONNECTION_TIMEOUT
 
 
 class ChatRoomClient:
@@ -19,51 +20,45 @@ class ChatRoomClient:
         self.connected = False
         self.room_uid = None
         self.room_name = "未知房间"
+        self._search_id = 0
+        self._send_lock = threading.Lock()  # 输入线程与心跳线程共用socket
+        self.heartbeat = None
+        # 成员名单：由主机的完整快照初始化，之后按版本号依次应用增减
+        self.members = set()
+        self.members_version = None  # None表示尚未收到快照（或正在重新同步）
+        self.members_supported = False
+        # 消息编号：按顺序收到的最后一条消息，重连时据此只取缺口；epoch 变化说明编号序列已重新开始
+        self.room_epoch = None
+        self.last_seq = 0
+        self.acked_seq = 0
+        # 断线重连：主机发放的会话令牌，重连时凭它恢复成员身份
+        self.host_input = None
+        self.session = None
+        self.reconnecting = False
 
     def join_room(self, host_input, room_uid):
         """加入聊天室"""
         try:
+            if room_uid != self.room_uid:
+                self.room_epoch = None
+                self.session = None
             self.room_uid = room_uid
+            self.host_input = host_input
 
-            # 解析主机地址
-            if is_ipv4_address(host_input) or is_ipv6_address(host_input):
-                # 直接使用IP地址
-                if ':' in host_input:  # IPv6
-                    address = (host_input, self.port)
-                else:  # IPv4
-                    address = (host_input, self.port)
-
-                family = socket.AF_INET6 if ':' in host_input else socket.AF_INET
-                self.socket = socket.socket(family, socket.SOCK_STREAM)
-                self.socket.settimeout(10)
-                self.socket.connect(address)
-
-            else:
-                # 使用主机名，优先IPv6连接
-                self.socket = prefer_ipv6_connections(host_input, self.port)
-                if not self.socket:
-                    display_system_message("无法连接到服务器")
-                    return False
+            self.socket = self._connect(host_input)
+            if not self.socket:
+                display_system_message("无法连接到服务器")
+                return False
 
             self.connected = True
 
-            # 发送加入请求
-            join_request = {
-                'type': 'join_room',
-                'uid': self.uid,
-                'room_uid': self.room_uid
-            }
-
-            if not send_json(self.socket, join_request):
-                display_system_message("发送加入请求失败")
-                return False
-
-            # 等待服务器响应
-            response = receive_json(self.socket)
+            # 发送加入请求并等待服务器响应
+            response = self._request_join(self.socket)
             if response and response.get('type') == 'join_success':
+                self._joined(self.socket, response)
                 welcome_msg = response.get('message', '成功加入聊天室!')
                 display_system_message(welcome_msg)
-                display_system_message("输入 '/quit' 退出聊天室")
+                display_system_message("输入 '/search <关键词>' 搜索聊天记录，'/members' 查看成员，'/quit' 退出聊天室")
 
                 # 启动消息接收线程
                 receive_thread = threading.Thread(target=self._receive_messages, daemon=True)
@@ -86,17 +81,136 @@ class ChatRoomClient:
 
         return False
 
+    def _connect(self, host_input):
+        """
+        连接主机
+        Returns:
+            已连接的socket，无法连接时为None
+        """
+        # 解析主机地址
+        if is_ipv4_address(host_input) or is_ipv6_address(host_input):
+            # 直接使用IP地址
+            address = (host_input, self.port)
+            family = socket.AF_INET6 if ':' in host_input else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(CONNECTION_TIMEOUT)
+            try:
+                sock.connect(address)
+            except OSError:
+                sock.close()
+                raise
+            return sock
+
+        # 使用主机名，优先IPv6连接
+        return prefer_ipv6_connections(host_input, self.port)
+
+    def _request_join(self, sock):
+        """
+        发送加入请求（以旧格式发送并声明支持的线路格式，旧版主机也能识别）
+        Returns:
+            主机的回复，发送失败或无响应时为None
+        """
+        join_request = {
+            'type': 'join_room',
+            'uid': self.uid,
+            'room_uid': self.room_uid,
+            'wire': WIRE_VERSION,
+            'heartbeat': True,
+            'members': True,
+            'session': self.session or True
+        }
+        if self.room_epoch is not None:
+            # 重新加入同一聊天室：只请求最后收到的编号之后的消息
+            join_request['resume'] = {'epoch': self.room_epoch, 'seq': self.last_seq}
+        if not send_json(sock, join_request):
+            return None
+        return receive_json(sock)
+
+    def _joined(self, sock, response):
+        """按主机的 join_success 回复设置连接"""
+        set_wire_version(sock, negotiate_wire_version(response.get('wire')))
+        self.members_supported = bool(response.get('members'))
+        self.session = response.get('session')
+        if response.get('epoch') != self.room_epoch:
+            self.room_epoch = response.get('epoch')
+            self.last_seq = self.acked_seq = 0
+        if response.get('heartbeat'):
+            # 主机支持心跳：失联由心跳检测，不再让空闲连接因读超时断开
+            sock.settimeout(None)
+            if self.heartbeat is None:
+                self.heartbeat = HeartbeatMonitor(self._ping_host, self._host_lost)
+            self.heartbeat.add(sock)
+
+    def _reconnect(self):
+        """
+        连接意外断开后按指数退避（带随机抖动）自动重连，
+        凭会话令牌恢复成员身份，主机只补发断线期间的消息
+        Returns:
+            是否重连成功
+        """
+        if not self.connected or self.host_input is None:
+            return False
+        old_socket = self.socket
+        if self.heartbeat and old_socket:
+            self.heartbeat.remove(old_socket)
+        if old_socket:
+            try:
+                old_socket.close()
+            except OSError:
+                pass
+            release_frame_reader(old_socket)
+
+        self.reconnecting = True
+        display_system_message("与主机的连接中断，正在重连...")
+        try:
+            for attempt, delay in enumerate(backoff_delays(), 1):
+                time.sleep(delay)
+                if not self.connected:
+                    return False
+                sock = response = None
+                try:
+                    sock = self._connect(self.host_input)
+                    if sock:
+                        response = self._request_join(sock)
+                except OSError:
+                    pass
+                if response and response.get('type') == 'join_success':
+                    with self._send_lock:
+                        self.socket = sock
+                    self._joined(sock, response)
+                    display_system_message("已重新连接")
+                    return True
+                if sock:
+                    sock.close()
+                    release_frame_reader(sock)
+                if response and response.get('type') == 'join_failed':
+                    display_system_message(f"重连失败: {response.get('message', '加入聊天室失败')}")
+                    return False
+                display_system_message(f"第 {attempt} 次重连失败")
+            return False
+        finally:
+            self.reconnecting = False
+
     def _receive_messages(self):
-        """接收消息"""
+        """接收消息（连接意外断开时自动重连）"""
         while self.connected:
             try:
                 message_data = receive_json(self.socket)
                 if not message_data:
+                    if self._reconnect():
+                        continue
                     break
 
                 message_type = message_data.get('type')
+                if self.heartbeat:
+                    self.heartbeat.seen(self.socket)
 
-                if message_type == 'message':
+                if message_type == 'ping':
+                    self._send({'type': 'pong', 'seq': message_data.get('seq')})
+
+                elif message_type == 'message':
+                    if not self._accept_seq(message_data.get('seq')):
+                        continue  # 重连后重复收到的消息
                     # 显示他人消息（左对齐，带名字）
                     display_chat_message(message_data, is_own_message=False)
                     print("> ", end="", flush=True)
@@ -105,6 +219,15 @@ class ChatRoomClient:
                     # 显示系统消息
                     display_system_message(message_data.get('message', ''))
                     print("> ", end="", flush=True)
+                    if message_data.get('closing'):
+                        break  # 聊天室已关闭，不再重连
+
+                elif message_type == 'members':
+                    self._apply_members(message_data)
+
+                elif message_type == 'search_result':
+                    self._show_search_result(message_data)
+                    print("> ", end="", flush=True)
 
                 elif message_type == 'room_closing':
                     display_system_message("聊天室即将关闭")
@@ -127,8 +250,22 @@ class ChatRoomClient:
                     break
 
                 if message.lower() == '/quit':
+                    # 主动退出：通知主机结束会话，主机立即广播离开
+                    self._send({'type': 'leave'})
                     break
 
+                if message.lower() == '/members':
+                    self._show_members()
+                    continue
+
+                command, _, query = message.partition(' ')
+                if command.lower() == '/search':
+                    if query.strip():
+                        self._search(query.strip())
+                    else:
+                        display_system_message("用法: /search <关键词>")
+                    continue
+
                 if message.strip():
                     message_data = {
                         'type': 'message',
@@ -137,12 +274,14 @@ class ChatRoomClient:
                         'timestamp': get_current_time()
                     }
 
-                    if send_json(self.socket, message_data):
+                    if self._send(message_data):
                         # 显示自己发送的消息（右对齐，不带名字）
                         display_chat_message(message_data, is_own_message=True)
+                    elif self.reconnecting:
+                        display_system_message("正在重连，消息未发送")
                     else:
+                        # 连接是否已断开由接收线程判断（自动重连或结束）
                         display_system_message("发送消息失败")
-                        break
 
             except KeyboardInterrupt:
                 break
@@ -152,13 +291,107 @@ class ChatRoomClient:
         self.connected = False
         self._cleanup()
 
+    def _send(self, message_data):
+        """发送一条消息（与心跳线程互斥，避免两个线程的帧交错）"""
+        sock = self.socket
+        if sock is None:
+            return False
+        with self._send_lock:
+            return send_json(sock, message_data)
+
+    def _ping_host(self, sock):
+        self._send({'type': 'ping'})
+        # 空闲时确认剩余的消息
+        self._ack(force=True)
+
+    def _accept_seq(self, seq):
+        """
+        记录收到的消息编号，每 ACK_EVERY 条发送一次累计确认
+        Returns:
+            False表示该消息已经收到过
+        """
+        if not isinstance(seq, int):
+            return True  # 主机不支持消息编号
+        if seq <= self.last_seq:
+            return False
+        self.last_seq = seq
+        self._ack()
+        return True
+
+    def _ack(self, force=False):
+        """发送累计确认：已按顺序收到 last_seq 及之前的所有消息"""
+        seq = self.last_seq
+        if seq - self.acked_seq >= ACK_EVERY or (force and seq > self.acked_seq):
+            if self._send({'type': 'ack', 'seq': seq}):
+                self.acked_seq = seq
+
+    def _host_lost(self, sock):
+        """主机超过心跳期限没有任何消息到达：关闭连接，唤醒接收线程重连"""
+        display_system_message("主机无响应，连接已断开")
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _apply_members(self, message_data):
+        """应用主机发来的成员名单快照或增减，版本不连续时请求重新同步"""
+        version = message_data.get('version', 0)
+        if 'snapshot' in message_data:
+            if self.members_version is None or version >= self.members_version:
+                self.members = set(message_data['snapshot'])
+                self.members_version = version
+            return
+        if self.members_version is None or version <= self.members_version:
+            # 尚未收到快照（之后的快照已包含这次变化），或是快照之前的旧版本
+            return
+        if version != self.members_version + 1:
+            # 漏掉了中间的版本：丢弃本地名单，等待主机重新发送快照
+            self.members_version = None
+            self._send({'type': 'members_sync'})
+            return
+        self.members.update(message_data.get('added', []))
+        self.members.difference_update(message_data.get('removed', []))
+        self.members_version = version
+
+    def _show_members(self):
+        """显示本地维护的成员名单"""
+        if not self.members_supported:
+            display_system_message("主机不支持成员名单")
+            return
+        if self.members_version is None:
+            display_system_message("成员名单同步中，请稍后再试")
+            return
+        display_system_message(f"在线成员 {len(self.members)} 人: {'、'.join(sorted(self.members))}")
+
+    def _search(self, query):
+        """向主机发送检索请求，结果由接收线程显示"""
+        self._search_id += 1
+        if not self._send({'type': 'search', 'request_id': self._search_id, 'query': query}):
+            display_system_message("发送搜索请求失败")
+
+    def _show_search_result(self, result):
+        """显示检索结果（从旧到新）"""
+        results = result.get('results', [])
+        if not results:
+            display_system_message(f"没有找到包含 '{result.get('query', '')}' 的消息")
+            return
+        more = "，仅显示最近的部分结果" if result.get('more') else ""
+        display_system_message(f"找到 {len(results)} 条包含 '{result.get('query', '')}' 的消息{more} "
+                               f"({result.get('elapsed_ms', 0)} ms)")
+        print()
+        for message_data in reversed(results):
+            display_chat_message(message_data, is_own_message=message_data.get('sender') == self.uid)
+
     def _cleanup(self):
         """清理连接"""
+        if self.heartbeat:
+            self.heartbeat.stop()
         if self.socket:
             try:
                 self.socket.close()
             except:
                 pass
+            release_frame_reader(self.socket)
             self.socket = None
 
 
@@ -0,0 +1,70 @@
+# src/room/room_registry.py
+import threading
+from .client_registry import ClientRegistry
+from .history import HistoryBuffer
+from .search_index import SearchIndex
+from .rate_limit import create_room_limiter
+from .presence import MemberRoster
+
+
+class ChatRoom:
+    """单个聊天室：房间信息、该房间的成员（广播集合）、成员名单、最近消息、检索索引和入站限流器"""
+
+    def __init__(self, room_uid, room_name):
+        self.room_uid = room_uid
+        self.room_name = room_name
+        self.members = ClientRegistry()
+        self.roster = MemberRoster()  # 发给客户端的成员名单，按合并周期更新，与 history.lock 共用锁
+        self.history = HistoryBuffer()
+        self.search = SearchIndex()
+        self.rate_limiter = create_room_limiter()
+        self.closed = False
+
+
+class RoomRegistry:
+    """
+    按 room_uid 索引的聊天室登记表
+    同一主机（同一监听端口）上的所有聊天室共用连接处理，
+    加入请求按 room_uid 路由到对应聊天室。创建与关闭在锁内进行，查询不加锁。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}
+
+    def create(self, room_uid, room_name):
+        """
+        创建聊天室
+        Returns:
+            新建的 ChatRoom；room_uid 已存在时返回None
+        """
+        with self._lock:
+            if room_uid in self._rooms:
+                return None
+            room = self._rooms[room_uid] = ChatRoom(room_uid, room_name)
+            return room
+
+    def close(self, room_uid):
+        """
+        移除聊天室并标记为已关闭，之后不再接受加入
+        Returns:
+            被关闭的 ChatRoom；不存在时返回None
+        """
+        with self._lock:
+            room = self._rooms.pop(room_uid, None)
+            if room is not None:
+                room.closed = True
+            return room
+
+    def get(self, room_uid):
+        return self._rooms.get(room_uid)
+
+    def rooms(self):
+        """当前所有聊天室的列表"""
+        return list(self._rooms.values())
+
+    def __contains__(self, room_uid):
+        return room_uid in self._rooms
+
+    def __len__(self):
+        return len(self._rooms)
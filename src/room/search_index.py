@@ -0,0 +1,197 @@
+# src/room/search_index.py
+import queue
+import re
+import threading
+import time
+from ..config.settings import SEARCH_MAX_DOCUMENTS, SEARCH_MAX_POSTINGS, SEARCH_RESULT_LIMIT
+
+# 中日韩文字按二元组切分，其他文字按单词切分
+_CJK = '぀-ヿ㐀-䶿一-鿿가-힯豈-﫿'
+_TOKEN_RE = re.compile(f'([{_CJK}]+)|([^\\W{_CJK}]+)')
+
+
+def tokenize(text):
+    """
+    切分检索词元
+    中日韩文字连续片段切成相邻二元组（单字片段保留单字），其他文字按单词切分并转小写
+    Returns:
+        词元集合
+    """
+    tokens = set()
+    for cjk, word in _TOKEN_RE.findall(text.lower()):
+        if word:
+            tokens.add(word)
+        elif len(cjk) == 1:
+            tokens.add(cjk)
+        else:
+            tokens.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+class SearchIndex:
+    """
+    单个聊天室消息的增量倒排索引
+    文档编号连续递增，每个词元的倒排表是按编号升序的list。文档数或倒排项总数超过上限时
+    淘汰最旧的文档：它在各倒排表中都位于开头，只记录过期前缀的长度，
+    过期部分超过一半时再整体截掉，摊还O(1)，内存因此有界。
+    查询取最短的倒排表从新到旧逐条用原文校验（二元组命中不代表子串命中），
+    不需要扫描全部消息。所有方法由 SearchIndexer 的线程调用。
+    """
+
+    def __init__(self, max_documents=SEARCH_MAX_DOCUMENTS, max_postings=SEARCH_MAX_POSTINGS):
+        self.max_documents = max_documents
+        self.max_postings = max_postings
+        self._documents = {}  # 编号 -> (小写原文, 词元, 发送者, 原文, 时间)
+        self._postings = {}   # 词元 -> [编号]
+        self._stale = {}      # 词元 -> 倒排表开头已淘汰的编号个数
+        self._oldest = 0      # 最旧的有效编号
+        self._next_id = 0
+        self.posting_count = 0
+
+    def __len__(self):
+        return self._next_id - self._oldest
+
+    def add(self, message_data):
+        """索引一条聊天消息"""
+        text = str(message_data.get('message', ''))
+        lowered = text.lower()
+        tokens = tuple(tokenize(lowered))
+        doc_id = self._next_id
+        self._next_id += 1
+        self._documents[doc_id] = (lowered if lowered != text else text, tokens,
+                                   message_data.get('sender'), text, message_data.get('timestamp'))
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                self._postings[token] = [doc_id]
+            else:
+                postings.append(doc_id)
+        self.posting_count += len(tokens)
+
+        while len(self) > self.max_documents or (len(self) > 1 and self.posting_count > self.max_postings):
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        doc_id = self._oldest
+        self._oldest += 1
+        tokens = self._documents.pop(doc_id)[1]
+        for token in tokens:
+            postings = self._postings[token]
+            stale = self._stale.pop(token, 0) + 1
+            if stale == len(postings):
+                del self._postings[token]
+            elif stale * 2 >= len(postings):
+                del postings[:stale]
+            else:
+                self._stale[token] = stale
+        self.posting_count -= len(tokens)
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """
+        查询同时包含所有关键词（空格分隔）的消息
+        Returns:
+            (从新到旧的消息列表, 是否还有更多结果)
+        """
+        terms = [term for term in query.lower().split() if term]
+        if not terms:
+            return [], False
+
+        tokens = set()
+        for term in terms:
+            tokens.update(tokenize(term))
+        # 单个汉字只在单字片段中被索引，不能用来缩小候选范围
+        tokens = {token for token in tokens if len(token) > 1 or not _TOKEN_RE.match(token).group(1)}
+        if any(token not in self._postings for token in tokens):
+            return [], False
+        if tokens:
+            candidates = reversed(min((self._postings[token] for token in tokens), key=len))
+        else:
+            # 没有可索引的词元（如单个标点或单个汉字），只能逐条检查
+            candidates = range(self._next_id - 1, self._oldest - 1, -1)
+
+        results = []
+        for doc_id in candidates:
+            if doc_id < self._oldest:
+                break  # 其余都是已淘汰的编号
+            lowered, _, sender, text, timestamp = self._documents[doc_id]
+            if all(term in lowered for term in terms):
+                if len(results) == limit:
+                    return results, True
+                results.append({'sender': sender, 'message': text, 'timestamp': timestamp})
+        return results, False
+
+    def stats(self):
+        return {
+            'documents': len(self),
+            'tokens': len(self._postings),
+            'postings': self.posting_count,
+            'max_documents': self.max_documents,
+            'max_postings': self.max_postings
+        }
+
+
+class SearchIndexer:
+    """
+    检索索引的后台线程
+    广播路径只把消息放入无锁队列，索引更新和查询都在该线程中按到达顺序执行，
+    查询因此能看到在它之前广播的所有消息，且不会阻塞广播或事件循环。
+    """
+
+    def __init__(self, reply):
+        """
+        Args:
+            reply: reply(客户端, 消息字典)，把查询结果发回客户端
+        """
+        self.reply = reply
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+
+    def add(self, index, message_data):
+        """索引一条消息（广播路径调用）"""
+        self._ensure_started()
+        self._queue.put((index, message_data, None))
+
+    def search(self, index, client, request):
+        """排队执行一个检索请求，结果通过 reply 发回"""
+        self._ensure_started()
+        self._queue.put((index, request, client))
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            index, message_data, client = item
+            if client is None:
+                index.add(message_data)
+                continue
+
+            started = time.perf_counter()
+            query = str(message_data.get('query', ''))
+            try:
+                limit = min(max(int(message_data.get('limit', SEARCH_RESULT_LIMIT)), 1), SEARCH_RESULT_LIMIT)
+            except (TypeError, ValueError):
+                limit = SEARCH_RESULT_LIMIT
+            results, more = index.search(query, limit)
+            self.reply(client, {
+                'type': 'search_result',
+                'request_id': message_data.get('request_id'),
+                'query': query,
+                'results': results,
+                'more': more,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+            })
@@ -0,0 +1,162 @@
+# src/room/sessions.py
+import secrets
+import threading
+import time
+from ..p2pu import TimerWheel
+from ..config.settings import SESSION_RESUME_TIMEOUT, KICK_REJOIN_COOLDOWN, HEARTBEAT_TICK
+
+
+class SessionTable:
+    """
+    会话令牌表
+    支持断线重连的客户端加入时获得一个令牌。连接意外断开时会话保留 timeout 秒，期间该成员
+    仍留在成员名单中、不广播离开；带着令牌重连即恢复成员身份，不产生加入/离开通知。
+    到期仍未重连才按离开处理。到期检查使用时间轮，与保留的会话数无关。
+    被主机断开的成员结束会话，并在 kick_cooldown 秒内不能重新加入该聊天室。
+    """
+
+    def __init__(self, on_expire, timeout=SESSION_RESUME_TIMEOUT, tick=HEARTBEAT_TICK,
+                 kick_cooldown=KICK_REJOIN_COOLDOWN):
+        """
+        Args:
+            on_expire: on_expire(成员UID, 聊天室)，保留的会话到期未重连
+            timeout: 断开后保留会话的秒数，0为不保留
+            kick_cooldown: 被主机断开后多少秒内拒绝重新加入
+        """
+        self.on_expire = on_expire
+        self.timeout = timeout
+        self.kick_cooldown = kick_cooldown
+        self.restored = 0
+        self.expired = 0
+        self.kicks = 0
+        self._sessions = {}  # 令牌 -> {'uid', 'room', 'client'}，client为None表示等待重连
+        self._kicked = {}    # (成员UID, 房间ID) -> 可以重新加入的时间
+        self._wheel = TimerWheel(tick)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def token_for(self, token, uid, room):
+        """
+        加入请求携带的令牌仍属于该成员在该聊天室的会话时沿用，否则生成新令牌
+        （新令牌在 attach 时才登记）
+        """
+        entry = self._sessions.get(token) if isinstance(token, str) else None
+        if entry is not None and entry['uid'] == uid and entry['room'] is room:
+            return token
+        return secrets.token_hex(16)
+
+    def attach(self, token, client, uid, room):
+        """
+        把连接登记到会话
+        Returns:
+            (是否恢复了已有会话, 被接管的旧连接)；旧连接尚未被发现断开时由新连接接管，调用方负责移除它
+        """
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is not None and entry['uid'] == uid and entry['room'] is room and not room.closed:
+                previous, entry['client'] = entry['client'], client
+                self._wheel.cancel(token)
+                self.restored += 1
+                return True, previous
+            self._sessions[token] = {'uid': uid, 'room': room, 'client': client}
+            return False, None
+
+    def detach(self, token, client, keep=True):
+        """
+        会话的连接已断开
+        Args:
+            keep: 为False时结束会话（被踢出、主动退出）
+        Returns:
+            True表示会话仍然有效（保留等待重连，或已被新连接接管），不应广播离开
+        """
+        if token is None:
+            return False
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return False
+            if entry['client'] is not client:
+                return True  # 已被新连接接管
+            if not keep or self.timeout <= 0:
+                del self._sessions[token]
+                return False
+            entry['client'] = None
+            self._wheel.schedule(token, self.timeout)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            return True
+
+    def end(self, token):
+        """客户端主动退出：结束会话，之后断开按正常离开处理"""
+        with self._lock:
+            if self._sessions.pop(token, None) is not None:
+                self._wheel.cancel(token)
+
+    def kick(self, token, uid, room, now=None):
+        """成员被主机断开：结束会话，kick_cooldown 秒内拒绝它重新加入该聊天室"""
+        if now is None:
+            now = time.monotonic()
+        self.end(token)
+        with self._lock:
+            self.kicks += 1
+            # 顺带清理已过冷却期的记录（踢出很少发生，逐项检查的开销可以忽略）
+            self._kicked = {key: until for key, until in self._kicked.items() if until > now}
+            if self.kick_cooldown > 0:
+                self._kicked[(uid, room.room_uid)] = now + self.kick_cooldown
+
+    def kicked(self, uid, room, now=None):
+        """
+        Returns:
+            该成员是否在被断开后的冷却期内
+        """
+        with self._lock:
+            until = self._kicked.get((uid, room.room_uid))
+            if until is None:
+                return False
+            if until > (time.monotonic() if now is None else now):
+                return True
+            del self._kicked[(uid, room.room_uid)]
+            return False
+
+    def tick(self, now=None):
+        """推进时间轮，结束到期仍未重连的会话（回调在锁外执行）"""
+        expired = []
+        with self._lock:
+            for token in self._wheel.advance(now):
+                entry = self._sessions.get(token)
+                if entry is not None and entry['client'] is None:
+                    del self._sessions[token]
+                    expired.append(entry)
+        for entry in expired:
+            self.expired += 1
+            self.on_expire(entry['uid'], entry['room'])
+
+    def _run(self):
+        while not self._stop.wait(self._wheel.tick):
+            self.tick()
+
+    def close(self):
+        """停止后台线程并丢弃所有会话"""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+        with self._lock:
+            self._sessions = {}
+            self._kicked = {}
+            self._wheel = TimerWheel(self._wheel.tick)
+
+    def stats(self):
+        with self._lock:
+            parked = sum(1 for entry in self._sessions.values() if entry['client'] is None)
+            return {
+                'sessions': len(self._sessions),
+                'parked': parked,
+                'restored': self.restored,
+                'expired': self.expired,
+                'kicks': self.kicks,
+                'timeout': self.timeout
+            }
@@ -0,0 +1,115 @@
+"""客户端登记表的并发：增删与遍历同时进行，运行中的主机上成员不断加入/断开的同时持续广播"""
+import collections
+import socket
+import threading
+import time
+
+import pytest
+
+from src.p2pu import send_json, receive_json
+from src.room.client_registry import ClientRegistry
+from src.room.room_host import create_host
+
+CHURNERS = 4
+ROUNDS = 60
+
+
+def test_concurrent_remove_succeeds_once():
+    registry = ClientRegistry()
+    keys = list(range(2000))
+    for key in keys:
+        registry.add(key, {'uid': str(key)})
+    results = [[], []]
+
+    def remove(order, out):
+        for key in order:
+            out.append(registry.remove(key) is not None)
+
+    threads = [threading.Thread(target=remove, args=(keys, results[0])),
+               threading.Thread(target=remove, args=(list(reversed(keys)), results[1]))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(results[0]) + sum(results[1]) == len(keys)
+    assert len(registry) == 0 and registry.snapshot() == ()
+
+
+def join(port, room_uid, uid):
+    sock = socket.create_connection(('127.0.0.1', port))
+    send_json(sock, {'type': 'join_room', 'uid': uid, 'room_uid': room_uid, 'wire': 2, 'session': True})
+    assert receive_json(sock)['type'] == 'join_success'
+    return sock
+
+
+@pytest.mark.parametrize('engine', ['threaded', 'async', 'selectors'])
+def test_churn_while_broadcasting(engine):
+    host = create_host(engine, 0)
+    host.presence.interval = 0.05
+    host.sessions.timeout = 0.2  # 意外断开的成员很快按离开处理
+    room_uid = host.create_room('stress')
+    assert host.start_hosting(interactive=False)
+    errors = []
+    removed = collections.Counter()
+    stop = threading.Event()
+    try:
+        watcher = join(host.port, room_uid, 'watcher')
+        sender = join(host.port, room_uid, 'sender')
+
+        def watch():
+            while True:
+                message = receive_json(watcher)
+                if not message:
+                    return
+                if message.get('type') == 'members':
+                    removed.update(message.get('removed', ()))
+
+        def send():
+            while not stop.is_set():
+                if not send_json(sender, {'type': 'message', 'message': 'stress'}):
+                    errors.append("广播发送方连接断开")
+                    return
+                time.sleep(0.001)
+
+        def drain_sender():
+            while receive_json(sender):
+                pass
+
+        def churn(index):
+            try:
+                for i in range(ROUNDS):
+                    sock = join(host.port, room_uid, f'c{index}-{i}')
+                    if i % 2:
+                        # 直接RST，覆盖读写两侧同时发现断开的情况
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, b'\x01\x00\x00\x00\x00\x00\x00\x00')
+                    else:
+                        send_json(sock, {'type': 'leave'})
+                    sock.close()
+            except Exception as e:
+                errors.append(f"c{index}: {e!r}")
+
+        background = [threading.Thread(target=target, daemon=True) for target in (watch, send, drain_sender)]
+        churners = [threading.Thread(target=churn, args=(index,)) for index in range(CHURNERS)]
+        for thread in background + churners:
+            thread.start()
+        for thread in churners:
+            thread.join(60)
+        stop.set()
+
+        room = host.rooms.get(room_uid)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and (len(host.clients) > 2 or len(room.members) > 2
+                                               or host.sessions.stats()['parked']
+                                               or set(room.roster.snapshot()) != {'watcher', 'sender'}):
+            time.sleep(0.05)
+        time.sleep(0.2)
+
+        assert errors == []
+        assert sorted(info['uid'] for _, info in host.clients.items()) == ['sender', 'watcher']
+        assert sorted(info['uid'] for _, info in room.members.items()) == ['sender', 'watcher']
+        assert host.sessions.stats()['parked'] == 0
+        assert set(room.roster.snapshot()) == {'watcher', 'sender'}
+        assert {uid: count for uid, count in removed.items() if count > 1} == {}
+    finally:
+        stop.set()
+        host.stop_hosting()
@@ -0,0 +1,39 @@
+import socket
+import threading
+import time
+
+from src.direct import direct_chat
+from src.direct.direct_chat import DirectChat
+from src.p2pu.core_utils import receive_json, send_json
+
+
+def test_silent_connection_does_not_block_reconnect(monkeypatch):
+    monkeypatch.setattr(direct_chat, 'get_or_create_uid', lambda: 'listener')
+    chat = DirectChat(port=0)
+    chat.connected = True
+    chat.session = 'token'
+    chat.peer_uid = 'peer'
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    chat._server_socket = listener
+    replaced = threading.Event()
+    monkeypatch.setattr(chat, '_replace_peer', lambda conn, handshake: replaced.set())
+    threading.Thread(target=chat._accept_reconnects, daemon=True).start()
+
+    address = listener.getsockname()
+    silent = socket.create_connection(address)  # 连上后不发送握手
+    time.sleep(0.1)
+    started = time.monotonic()
+    peer = socket.create_connection(address)
+    try:
+        send_json(peer, {'type': 'handshake', 'uid': 'peer', 'session': 'token'})
+        peer.settimeout(2)
+        assert receive_json(peer)['uid'] == 'listener'
+        assert replaced.wait(2)
+        assert time.monotonic() - started < 1
+    finally:
+        chat.connected = False
+        listener.close()
+        silent.close()
+        peer.close()
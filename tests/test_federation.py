@@ -0,0 +1,124 @@
+"""主机联邦：握手验证、只告知联邦聊天室、拒绝伪造或格式不对的信封"""
+import socket
+import time
+
+import pytest
+
+from src.room.federation import Federation
+
+
+def make(uid, secret=None, allowed_peers=(), rooms=None):
+    delivered = []
+    rooms = rooms if rooms is not None else {f"{uid}_shared": 'shared', f"{uid}_private": 'private'}
+    federation = Federation(uid, lambda: rooms, lambda room_uid, message: delivered.append((room_uid, message)),
+                            port=0, secret=secret, allowed_peers=allowed_peers)
+    federation.share(f"{uid}_shared")
+    assert federation.start()
+    return federation, delivered
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_rejects_without_secret_or_allowlist():
+    host, _ = make('a')
+    peer, _ = make('b')
+    try:
+        assert peer.connect('127.0.0.1', host.port) is None
+        assert host.rejected == 1 and host.stats()['links'] == []
+    finally:
+        host.close()
+        peer.close()
+
+
+def test_wrong_secret_rejected_and_only_shared_rooms_advertised():
+    host, _ = make('a', secret='s3cret')
+    intruder, _ = make('x', secret='guess')
+    peer, _ = make('b', secret='s3cret')
+    try:
+        assert intruder.connect('127.0.0.1', host.port) is None
+        assert peer.connect('127.0.0.1', host.port) == {'a_shared': 'shared'}
+    finally:
+        for federation in (host, intruder, peer):
+            federation.close()
+
+
+def test_pending_handshakes_limited():
+    host, _ = make('a', secret='s3cret')
+    host.max_pending = 2
+    peer, _ = make('b', secret='s3cret')
+    silent = [socket.create_connection(('127.0.0.1', host.port)) for _ in range(2)]
+    try:
+        assert wait_for(lambda: host.stats()['pending'] == 2)
+        # 超出上限的连接在握手之前就被关闭
+        extra = socket.create_connection(('127.0.0.1', host.port))
+        extra.settimeout(2)
+        assert extra.recv(1) == b''
+        extra.close()
+        for sock in silent:
+            sock.close()
+        assert wait_for(lambda: host.stats()['pending'] == 0)
+        assert peer.connect('127.0.0.1', host.port) == {'a_shared': 'shared'}
+    finally:
+        for sock in silent:
+            sock.close()
+        host.close()
+        peer.close()
+
+
+def test_allowlist():
+    host, _ = make('a', allowed_peers=('10.0.0.1',))
+    peer, _ = make('b')
+    try:
+        assert peer.connect('127.0.0.1', host.port) is None
+        host.allowed_peers = {'127.0.0.1'}
+        assert peer.connect('127.0.0.1', host.port) == {'a_shared': 'shared'}
+    finally:
+        host.close()
+        peer.close()
+
+
+def test_forged_and_malformed_envelopes_dropped():
+    host, delivered = make('a', secret='s3cret')
+    peer, _ = make('b', secret='s3cret', rooms={'a_shared': 'shared'})
+    try:
+        peer.share('a_shared')
+        assert peer.connect('127.0.0.1', host.port) is not None
+        assert wait_for(lambda: len(host.stats()['links']) == 1)
+        link = peer._links[0]
+        message = {'type': 'message', 'message': 'hi', 'sender': 'bob', 'timestamp': '12:00:00', 'closing': True}
+        link.channel.send({'type': 'federated', 'id': '1', 'room_uid': 'a_shared', 'hops': 0,
+                           'message': {'type': 'system', 'message': '伪造', 'sender': '系统'}})
+        link.channel.send({'type': 'federated', 'id': '2', 'room_uid': 'a_private', 'hops': 0, 'message': message})
+        link.channel.send({'type': 'federated', 'id': '3', 'room_uid': 'a_shared', 'hops': 'x', 'message': message})
+        link.channel.send({'type': 'federated', 'id': '4', 'room_uid': 'a_shared', 'hops': 0, 'message': message})
+        assert wait_for(lambda: delivered)
+        assert delivered == [('a_shared', {'type': 'message', 'message': 'hi', 'sender': 'bob',
+                                           'timestamp': '12:00:00'})]
+        assert host.rejected == 3
+        assert len(host.stats()['links']) == 1  # 格式不对的信封不会断开连接
+    finally:
+        host.close()
+        peer.close()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_link_removed_when_reader_fails():
+    host, _ = make('a', secret='s3cret')
+    peer, _ = make('b', secret='s3cret')
+    try:
+        def fail(link, envelope):
+            raise RuntimeError("处理出错")
+
+        host._receive = fail
+        assert peer.connect('127.0.0.1', host.port) is not None
+        assert wait_for(lambda: len(host.stats()['links']) == 1)
+        peer._links[0].channel.send({'type': 'federated'})
+        assert wait_for(lambda: host.stats()['links'] == [])
+    finally:
+        host.close()
+        peer.close()
@@ -0,0 +1,69 @@
+"""长度前缀帧读取器：长度头与帧内容跨多次recv到达、帧大于缓冲区、超长帧"""
+import struct
+
+import pytest
+
+from src.p2pu.framing import FrameReader, FrameTooLargeError
+
+
+class ChunkedSocket:
+    """按给定的分段依次返回数据的socket替身，分段读完后返回0（对端关闭）"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv_into(self, buffer):
+        if not self.chunks:
+            return 0
+        chunk = self.chunks.pop(0)
+        size = min(len(chunk), len(buffer))
+        buffer[:size] = chunk[:size]
+        if size < len(chunk):
+            self.chunks.insert(0, chunk[size:])
+        return size
+
+
+def frame(payload):
+    return struct.pack('>I', len(payload)) + payload
+
+
+def test_header_and_body_split_across_reads():
+    data = frame(b'hello') + frame(b'world!')
+    # 每次只到达1个字节：长度头和帧内容都不完整
+    reader = FrameReader(ChunkedSocket([data[i:i + 1] for i in range(len(data))]), buffer_size=8)
+    assert bytes(reader.read_frame()) == b'hello'
+    assert bytes(reader.read_frame()) == b'world!'
+    assert reader.read_frame() is None
+
+
+def test_partial_header_waits_for_more_data():
+    reader = FrameReader(ChunkedSocket([b'\x00\x00']))
+    reader.fill()
+    assert reader.next_frame() is None and reader.pending == 2
+
+
+def test_several_frames_in_one_read():
+    reader = FrameReader(ChunkedSocket([frame(b'a') + frame(b'bc') + frame(b'def')[:5]]))
+    reader.fill()
+    assert [bytes(item) for item in reader.frames()] == [b'a', b'bc']
+    assert reader.pending == 5  # 第三帧的长度头和1个字节
+
+
+def test_frame_larger_than_buffer_grows_it():
+    payload = bytes(range(256)) * 40
+    reader = FrameReader(ChunkedSocket([frame(payload)[i:i + 1000] for i in range(0, len(payload) + 4, 1000)]),
+                         buffer_size=16)
+    assert bytes(reader.read_frame()) == payload
+    assert reader.capacity >= len(payload) + 4
+
+
+def test_truncated_frame_at_close_is_dropped():
+    reader = FrameReader(ChunkedSocket([frame(b'complete') + frame(b'cut off')[:6]]))
+    assert bytes(reader.read_frame()) == b'complete'
+    assert reader.read_frame() is None
+
+
+def test_oversized_length_rejected():
+    reader = FrameReader(ChunkedSocket([struct.pack('>I', 1025) + b'x']), max_frame_size=1024)
+    with pytest.raises(FrameTooLargeError):
+        reader.read_frame()
@@ -0,0 +1,33 @@
+"""时间轮与心跳监视"""
+import time
+
+from src.p2pu.heartbeat import HeartbeatMonitor, TimerWheel
+
+
+def test_wheel_expires_after_delay():
+    wheel = TimerWheel(tick=0.1, slots=8, now=0.0)
+    wheel.schedule('a', 0.35, now=0.0)
+    assert wheel.advance(0.3) == []
+    assert wheel.advance(0.4) == ['a']
+
+
+def test_idle_wheel_rebases_on_schedule():
+    """空闲的时间轮在安排定时器时追上当前时间，不补推空闲期间的tick"""
+    wheel = TimerWheel(tick=0.1, slots=8, now=0.0)
+    wheel.schedule('a', 1.0, now=100.0)
+    assert wheel.advance(100.5) == []
+    assert wheel.advance(101.05) == ['a']
+
+
+def test_first_peer_after_idle_waits_interval():
+    pings = []
+    monitor = HeartbeatMonitor(pings.append, lambda peer: None, interval=10, timeout=30, tick=0.1)
+    monitor._wheel._time -= 60  # 监视器创建后空闲了很久
+    monitor.add('peer')
+    try:
+        # 检查定时器不能提前到期（提前到期时空闲复查会掩盖问题，这里直接看时间轮）
+        with monitor._lock:
+            assert monitor._wheel.advance(time.monotonic() + 1) == []
+            assert monitor._wheel.advance(time.monotonic() + 10.2) == ['peer']
+    finally:
+        monitor.stop()
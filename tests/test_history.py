@@ -0,0 +1,68 @@
+"""历史缓冲区：按编号补发漏掉的消息，编号超出范围、缺口已被丢弃或序列不同（epoch）时退回完整回放"""
+from src.p2pu import encode_json_frame, decode_json_frame
+from src.p2pu.framing import HEADER_SIZE
+from src.room.history import HistoryBuffer
+from src.room.room_host import create_host
+
+
+def fill(history, count, start=1):
+    for seq in range(start, start + count):
+        history.append(encode_json_frame({'type': 'message', 'seq': seq}), seq=history.next_seq())
+
+
+def seqs(frames):
+    return [decode_json_frame(memoryview(frame)[HEADER_SIZE:])['seq'] for frame in frames]
+
+
+def test_frames_since_returns_missed_messages():
+    history = HistoryBuffer(max_messages=10, max_bytes=1 << 20)
+    fill(history, 5)
+    assert history.seq == 5
+    assert seqs(history.frames_since(2)) == [3, 4, 5]
+    assert seqs(history.frames_since(0)) == [1, 2, 3, 4, 5]
+    assert history.frames_since(5) == []
+
+
+def test_frames_since_out_of_range():
+    history = HistoryBuffer(max_messages=10, max_bytes=1 << 20)
+    fill(history, 3)
+    assert history.frames_since(4) is None   # 比主机的编号还新：不属于当前序列
+    assert history.frames_since(-1) is None
+
+
+def test_frames_since_gap_already_evicted():
+    history = HistoryBuffer(max_messages=3, max_bytes=1 << 20)
+    fill(history, 6)
+    assert len(history) == 3
+    assert seqs(history.frames_since(3)) == [4, 5, 6]
+    assert history.frames_since(2) is None   # 第3条已被丢弃
+
+
+def test_oversized_message_counts_but_breaks_resume():
+    history = HistoryBuffer(max_messages=10, max_bytes=200)
+    fill(history, 2)
+    history.append(b'x' * 500, seq=history.next_seq())  # 超过字节上限，不保存但占用编号
+    fill(history, 1, start=4)
+    assert history.seq == 4
+    assert seqs(history.frames_since(3)) == [4]
+    assert history.frames_since(2) is None
+
+
+def test_frames_without_seq_cannot_resume():
+    history = HistoryBuffer(max_messages=10, max_bytes=1 << 20)
+    history.append(encode_json_frame({'type': 'message', 'seq': 0}))  # 从日志恢复的旧记录
+    fill(history, 2)
+    assert seqs(history.frames_since(1)) == [2]
+    assert history.frames_since(0) is None
+
+
+def test_resume_only_honoured_for_same_epoch():
+    host = create_host('threaded', 0)
+    room_uid = host.create_room('history')
+    room = host.rooms.get(room_uid)
+    fill(room.history, 3)
+    handshake = {'type': 'join_room', 'uid': 'alice', 'room_uid': room_uid, 'wire': 2}
+    reply, _, _ = host._join_reply(dict(handshake, resume={'epoch': room.history.epoch, 'seq': 1}))
+    assert reply['resume'] == 1 and reply['epoch'] == room.history.epoch
+    reply, _, _ = host._join_reply(dict(handshake, resume={'epoch': HistoryBuffer().epoch, 'seq': 1}))
+    assert 'resume' not in reply  # 主机重启后编号序列不同，完整回放
@@ -0,0 +1,102 @@
+"""被主机断开（发送过快、接收过慢）的成员不自动重连，冷却期内也不能恢复会话或重新加入"""
+import socket
+import threading
+import time
+
+import pytest
+
+from src.p2pu import send_json, receive_json
+from src.room import room_join
+from src.room.room_host import create_host
+from src.room.room_join import ChatRoomClient
+
+
+def drain(sock, duration):
+    """读取 duration 秒内到达的全部消息"""
+    messages = []
+    deadline = time.monotonic() + duration
+    sock.settimeout(0.05)
+    while time.monotonic() < deadline:
+        message = receive_json(sock)
+        if message:
+            messages.append(message)
+    return messages
+
+
+def notices(messages):
+    return [message['message'] for message in messages if message.get('type') == 'system']
+
+
+@pytest.fixture
+def room(monkeypatch):
+    # 退避间隔缩短到几十毫秒：若客户端错误地重连，会在断言之前发生
+    monkeypatch.setattr(room_join, 'backoff_delays', lambda: iter([0.05] * 3))
+    hosts = []
+
+    def start(engine):
+        host = create_host(engine, 0)
+        host.presence.interval = 0.05
+        room_uid = host.create_room('kick')
+        assert host.start_hosting(interactive=False)
+        hosts.append(host)
+        observer = socket.create_connection(('127.0.0.1', host.port))
+        send_json(observer, {'type': 'join_room', 'uid': 'observer', 'room_uid': room_uid, 'wire': 2})
+        assert receive_json(observer)['type'] == 'join_success'
+
+        client = ChatRoomClient(port=host.port)
+        client.uid, client.host_input, client.room_uid = 'spammer', '127.0.0.1', room_uid
+        sock = client._connect('127.0.0.1')
+        response = client._request_join(sock)
+        assert response['type'] == 'join_success'
+        client.socket, client.connected = sock, True
+        client._joined(sock, response)
+        thread = threading.Thread(target=client._receive_messages, daemon=True)
+        thread.start()
+        time.sleep(0.3)
+        drain(observer, 0.1)
+        return host, observer, client, thread
+
+    yield start
+    for host in hosts:
+        host.stop_hosting()
+
+
+def connected_uids(host):
+    return [info['uid'] for _, info in host.clients.items()]
+
+
+@pytest.mark.parametrize('engine', ['threaded', 'async', 'selectors'])
+def test_rate_limit_kick_is_terminal(room, engine):
+    host, observer, client, thread = room(engine)
+    host.rate_limit_policy = 'disconnect'
+    for index in range(40):
+        client._send({'type': 'message', 'message': f"spam {index}"})
+    thread.join(3)
+    assert not thread.is_alive() and not client.connected
+
+    time.sleep(0.5)
+    seen = notices(drain(observer, 0.3))
+    assert seen.count('spammer 离开了聊天室') == 1
+    assert not any('加入' in text for text in seen)
+    assert 'spammer' not in connected_uids(host)
+    assert host.sessions.stats()['kicks'] == 1
+
+    # 冷却期内凭旧令牌或作为新成员都不能加入
+    for session in (client.session, True):
+        sock = socket.create_connection(('127.0.0.1', host.port))
+        send_json(sock, {'type': 'join_room', 'uid': 'spammer', 'room_uid': client.room_uid, 'wire': 2,
+                         'session': session})
+        assert receive_json(sock)['type'] == 'join_failed'
+        sock.close()
+
+
+@pytest.mark.parametrize('engine', ['threaded', 'async', 'selectors'])
+def test_evicted_client_does_not_resume(room, engine):
+    host, observer, client, thread = room(engine)
+    hostside = [sock for sock, info in host.clients.items() if info['uid'] == 'spammer'][0]
+    host._remove_client(hostside, 'spammer', kicked=True)  # 与接收过慢被驱逐相同的处理
+    thread.join(3)
+    assert not thread.is_alive() and not client.connected
+    assert host.sessions.stats()['parked'] == 0
+    assert notices(drain(observer, 0.3)).count('spammer 离开了聊天室') == 1
+    assert 'spammer' not in connected_uids(host)
@@ -0,0 +1,39 @@
+"""消息日志：空闲的聊天室也按时清理过期的旧段"""
+import os
+import time
+
+from src.p2pu import encode_json_frame
+from src.room import message_log
+from src.room.message_log import MessageLogWriter, room_log_directory
+
+
+def test_retention_runs_while_room_is_idle(tmp_path, monkeypatch):
+    monkeypatch.setattr(message_log, 'RETENTION_CHECK_INTERVAL', 0.1)
+    writer = MessageLogWriter(str(tmp_path), fsync_interval=0.05, segment_bytes=256,
+                              retention_seconds=60, retention_bytes=0)
+    try:
+        for index in range(20):
+            writer.append('room', encode_json_frame({'type': 'message', 'message': f"m{index}" * 10}))
+        directory = room_log_directory(str(tmp_path), 'room')
+
+        def segments():
+            if not os.path.isdir(directory):
+                return []
+            return sorted(name for name in os.listdir(directory) if name.endswith('.log'))
+
+        deadline = time.monotonic() + 2
+        while len(segments()) < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        before = segments()
+        assert len(before) >= 3
+
+        # 旧段早已过期，之后不再有新消息
+        for name in before[:-1]:
+            path = os.path.join(directory, name)
+            os.utime(path, (time.time() - 3600, time.time() - 3600))
+        deadline = time.monotonic() + 2
+        while len(segments()) > 1 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert segments() == before[-1:]
+    finally:
+        writer.close()
@@ -0,0 +1,88 @@
+"""有界发送队列：按优先级丢弃、慢消费者策略（丢弃/断开）、非阻塞部分写出"""
+from src.room.outbound import (
+    OutboundQueue, admit_frame, ACCEPT, DROP, EVICT,
+    PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, POLICY_DROP, POLICY_DISCONNECT
+)
+
+
+def make_queue(policy=POLICY_DROP):
+    return OutboundQueue(high_water=100, max_bytes=200, policy=policy)
+
+
+def test_admit_frame_policies():
+    assert admit_frame(90, 10, PRIORITY_LOW, 100, 200, POLICY_DROP) == ACCEPT
+    assert admit_frame(95, 10, PRIORITY_LOW, 100, 200, POLICY_DROP) == DROP
+    assert admit_frame(95, 10, PRIORITY_NORMAL, 100, 200, POLICY_DROP) == ACCEPT
+    assert admit_frame(195, 10, PRIORITY_NORMAL, 100, 200, POLICY_DROP) == EVICT
+    assert admit_frame(95, 10, PRIORITY_NORMAL, 100, 200, POLICY_DISCONNECT) == EVICT
+    assert admit_frame(500, 10, PRIORITY_HIGH, 100, 200, POLICY_DISCONNECT) == ACCEPT
+
+
+def test_frames_leave_in_order():
+    queue = make_queue()
+    for frame, priority in ((b'a', PRIORITY_LOW), (b'b', PRIORITY_HIGH), (b'c', PRIORITY_NORMAL)):
+        assert queue.put(frame, priority)
+    assert [queue.get(0), queue.get(0), queue.get(0)] == [b'a', b'b', b'c']
+    assert queue.bytes == 0
+
+
+def test_low_priority_dropped_above_high_water():
+    queue = make_queue()
+    assert queue.put(b'x' * 90, PRIORITY_NORMAL)
+    assert queue.put(b'n' * 20, PRIORITY_LOW)  # 超过高水位，丢弃但不断开
+    assert len(queue) == 1 and queue.dropped == 1 and not queue.evicted
+
+
+def test_queued_low_priority_dropped_to_make_room():
+    queue = make_queue()
+    queue.put(b'h' * 10, PRIORITY_NORMAL)
+    queue.put(b'l' * 80, PRIORITY_LOW)
+    queue.put(b'm' * 100, PRIORITY_NORMAL)   # 总量未超上限，照常入队
+    assert queue.put(b'z' * 50, PRIORITY_NORMAL)  # 超过上限前先丢弃排队的低优先级帧
+    assert queue.dropped == 1 and not queue.evicted
+    assert [queue.get(0) for _ in range(3)] == [b'h' * 10, b'm' * 100, b'z' * 50]
+
+
+def test_evicted_above_max_bytes():
+    queue = make_queue()
+    queue.put(b'x' * 150, PRIORITY_NORMAL)
+    assert not queue.put(b'y' * 60, PRIORITY_NORMAL)
+    assert queue.evicted and queue.closed
+    assert queue.get(0) is None  # 被驱逐后不再写出剩余数据
+    assert not queue.put(b'late', PRIORITY_HIGH)
+
+
+def test_disconnect_policy_evicts_at_high_water():
+    queue = make_queue(POLICY_DISCONNECT)
+    queue.put(b'x' * 90, PRIORITY_NORMAL)
+    assert not queue.put(b'y' * 20, PRIORITY_LOW)
+    assert queue.evicted
+
+
+def test_high_priority_always_accepted():
+    queue = make_queue(POLICY_DISCONNECT)
+    queue.put(b'x' * 90, PRIORITY_NORMAL)
+    assert queue.put(b'c' * 500, PRIORITY_HIGH)
+    assert not queue.evicted and queue.peak_bytes == 590
+
+
+def test_partial_writes_keep_head_when_dropping():
+    queue = make_queue()
+    queue.put(b'h' * 60, PRIORITY_LOW)
+    queue.consume(10)  # 队首已部分写出
+    assert bytes(queue.head()) == b'h' * 50
+    queue.put(b'l' * 30, PRIORITY_LOW)
+    queue.put(b'n' * 100, PRIORITY_NORMAL)
+    assert queue.put(b'm' * 20, PRIORITY_NORMAL)
+    assert queue.dropped == 1  # 只丢弃排队中的低优先级帧，部分写出的队首保留
+    queue.consume(50)
+    assert queue.head() == b'n' * 100
+
+
+def test_closed_queue_drains_then_returns_none():
+    queue = make_queue()
+    queue.put(b'last')
+    queue.close()
+    assert queue.get(0) == b'last'
+    assert queue.get(0) is None
+    assert not queue.put(b'more')
@@ -0,0 +1,112 @@
+"""
+成员加入/离开通知的合并：同一批内先加入又离开的成员互相抵消，已关闭的聊天室不发出
+成员名单：按UID计数，只报告真正出现或消失的UID，有变化时版本号加一
+"""
+from src.room.presence import MemberRoster, PresenceBatcher, presence_text
+
+
+class Room:
+    closed = False
+
+
+def make(interval=60):
+    flushed = []
+    batcher = PresenceBatcher(lambda room, joined, left: flushed.append((room, list(joined), list(left))),
+                              interval=interval)
+    return batcher, flushed
+
+
+def test_batches_per_room():
+    batcher, flushed = make()
+    first, second = Room(), Room()
+    try:
+        batcher.joined(first, 'a')
+        batcher.joined(first, 'b')
+        batcher.left(second, 'c')
+        batcher.drain()
+        assert sorted(flushed, key=lambda item: item[1]) == [(second, [], ['c']), (first, ['a', 'b'], [])]
+        flushed.clear()
+        batcher.drain()
+        assert flushed == []
+    finally:
+        batcher.close()
+
+
+def test_join_then_leave_cancels():
+    batcher, flushed = make()
+    room = Room()
+    try:
+        batcher.joined(room, 'a')
+        batcher.joined(room, 'b')
+        batcher.left(room, 'a')
+        batcher.drain()
+        assert flushed == [(room, ['b'], [])]
+    finally:
+        batcher.close()
+
+
+def test_leave_then_rejoin_is_reported():
+    batcher, flushed = make()
+    room = Room()
+    try:
+        batcher.left(room, 'a')
+        batcher.joined(room, 'a')  # 重连：离开与重新加入都要告知
+        batcher.drain()
+        assert flushed == [(room, ['a'], ['a'])]
+    finally:
+        batcher.close()
+
+
+def test_closed_room_skipped():
+    batcher, flushed = make()
+    room = Room()
+    try:
+        batcher.joined(room, 'a')
+        room.closed = True
+        batcher.drain()
+        assert flushed == []
+    finally:
+        batcher.close()
+
+
+def test_zero_interval_flushes_immediately_without_recursion():
+    flushed = []
+    room = Room()
+
+    def flush(room, joined, left):
+        flushed.append((joined, left))
+        if joined == ['a']:
+            batcher.left(room, 'b')  # 发出过程中引发的新事件排在之后
+
+    batcher = PresenceBatcher(flush, interval=0)
+    batcher.joined(room, 'a')
+    assert flushed == [(['a'], []), ([], ['b'])]
+
+
+def test_presence_text():
+    assert presence_text(['a'], '加入') == 'a 加入了聊天室'
+    assert presence_text(['a', 'b'], '离开') == 'a、b 2 人离开了聊天室'
+    assert presence_text([str(i) for i in range(7)], '加入') == '0、1、2、3、4 等 7 人加入了聊天室'
+
+
+def test_roster_reports_only_real_changes():
+    roster = MemberRoster()
+    assert roster.apply(['a', 'b'], []) == (1, ['a', 'b'], [])
+    assert roster.apply(['a'], []) == (1, [], [])  # 同一UID的第二个连接
+    assert roster.apply([], ['a']) == (1, [], [])
+    assert roster.apply([], ['a', 'c']) == (2, [], ['a'])  # 不在名单中的UID被忽略
+    assert roster.snapshot() == ['b'] and len(roster) == 1
+
+
+def test_roster_join_and_leave_in_one_batch():
+    roster = MemberRoster()
+    roster.apply(['a'], [])
+    assert roster.apply(['a'], ['a']) == (1, [], [])  # 重连：仍在名单中，版本号不变
+    assert roster.apply(['b'], ['b']) == (2, ['b'], ['b'])
+
+
+def test_roster_follows_given_version():
+    roster = MemberRoster()
+    assert roster.apply(['a'], [], version=7) == (7, ['a'], [])
+    assert roster.apply([], [], version=8) == (8, [], [])
+    assert roster.apply(['b'], []) == (9, ['b'], [])
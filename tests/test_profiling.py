@@ -0,0 +1,27 @@
+"""剖析只在环境变量为 1 或 cpu 时开启"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profiler_state(value):
+    env = dict(os.environ, TRANSITCHAT_PROFILE=value)
+    output = subprocess.run(
+        [sys.executable, '-c', 'from src.p2pu.profiling import profiler; print(profiler.enabled, profiler.cpu_enabled)'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return output.split()  # [是否开启, 是否收集cProfile]
+
+
+@pytest.mark.parametrize('value', ['', '0', 'false', 'off', 'no', 'yes'])
+def test_other_values_keep_profiling_off(value):
+    assert profiler_state(value) == ['False', 'False']
+
+
+@pytest.mark.parametrize('value, expected', [('1', ['True', 'False']), ('cpu', ['True', 'True'])])
+def test_explicit_values_enable_profiling(value, expected):
+    assert profiler_state(value) == expected
@@ -0,0 +1,77 @@
+"""令牌桶与入站消息的限流决策（延迟/丢弃/断开），聊天室整体超限时不断开个别成员"""
+import time
+
+import pytest
+
+from src.room.rate_limit import (
+    TokenBucket, RateLimiter, admit_message, ACCEPT, DELAY, DROP, DISCONNECT,
+    POLICY_DELAY, POLICY_DROP, POLICY_DISCONNECT
+)
+
+
+def test_token_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=10, burst=20, now=0.0)
+    assert bucket.shortage(20, 0.0) == 0.0
+    bucket.take(20)
+    assert bucket.shortage(1, 0.0) == pytest.approx(0.1)
+    assert bucket.shortage(5, 0.5) == 0.0
+    bucket._refill(100.0)
+    assert bucket.tokens == 20  # 空闲再久也只积累 burst 个
+
+
+def test_token_bucket_overdraw_and_unlimited():
+    bucket = TokenBucket(rate=10, burst=10, now=0.0)
+    assert bucket.take(15) == pytest.approx(0.5)  # 透支5个，0.5秒后回到0
+    assert bucket.shortage(100, 0.0) == pytest.approx(1.5)  # 超过 burst 的请求按 burst 计
+    unlimited = TokenBucket(rate=0, burst=0, now=0.0)
+    assert unlimited.take(10 ** 9) == 0.0 and unlimited.shortage(10 ** 9, 0.0) == 0.0
+
+
+def limiters(client_rate=5, room_rate=100):
+    client = RateLimiter(client_rate, client_rate, 0, 0)
+    room = RateLimiter(room_rate, room_rate, 0, 0, shared=True)
+    return client, room
+
+
+def flood(client, room, policy, count, now, max_delay=1.0):
+    return [admit_message(client, room, 10, policy, max_delay, now)[0] for _ in range(count)]
+
+
+def test_drop_policy():
+    client, room = limiters()
+    now = time.monotonic()
+    assert flood(client, room, POLICY_DROP, 7, now) == [ACCEPT] * 5 + [DROP] * 2
+    assert client.dropped == room.dropped == 2 and client.accepted == 5
+    assert admit_message(client, room, 10, POLICY_DROP, 1.0, now + 0.5)[0] == ACCEPT  # 令牌已补充
+
+
+def test_delay_policy_pauses_then_drops_beyond_max_delay():
+    client, room = limiters()
+    now = time.monotonic()
+    flood(client, room, POLICY_DELAY, 5, now)
+    decision, wait = admit_message(client, room, 10, POLICY_DELAY, 1.0, now)
+    assert decision == DELAY and wait == pytest.approx(0.2)
+    for _ in range(4):
+        admit_message(client, room, 10, POLICY_DELAY, 1.0, now)
+    # 积欠超过 max_delay 后丢弃
+    assert admit_message(client, room, 10, POLICY_DELAY, 1.0, now)[0] == DROP
+    assert client.delayed == 5 and client.dropped == 1
+
+
+def test_disconnect_policy_only_for_client_overrun():
+    client, room = limiters()
+    now = time.monotonic()
+    assert flood(client, room, POLICY_DISCONNECT, 6, now) == [ACCEPT] * 5 + [DISCONNECT]
+
+    # 聊天室整体超限而成员自己没有：丢弃而不断开
+    client, room = limiters(client_rate=100, room_rate=3)
+    assert flood(client, room, POLICY_DISCONNECT, 4, now) == [ACCEPT] * 3 + [DROP]
+
+
+def test_byte_limit():
+    client = RateLimiter(0, 0, 100, 100)
+    room = RateLimiter(0, 0, 0, 0, shared=True)
+    now = time.monotonic()
+    assert admit_message(client, room, 80, POLICY_DROP, 1.0, now)[0] == ACCEPT
+    assert admit_message(client, room, 80, POLICY_DROP, 1.0, now)[0] == DROP
+    assert admit_message(client, room, 20, POLICY_DROP, 1.0, now)[0] == ACCEPT
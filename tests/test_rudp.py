@@ -0,0 +1,70 @@
+import time
+
+from src.p2pu.rudp import RUDPListener, connect_rudp
+
+
+def _pair(loss=0.0):
+    listener = RUDPListener(0, loss=loss)
+    client = connect_rudp(('127.0.0.1', listener.port), loss=loss)
+    client.sendall(b'hello')
+    server, _ = listener.accept()
+    server.settimeout(5)
+    assert server.recv(64) == b'hello'
+    return listener, client, server
+
+
+def _count_wakeups(endpoint, seconds):
+    calls = []
+    original = endpoint._next_deadline
+
+    def counting():
+        calls.append(1)
+        return original()
+
+    endpoint._next_deadline = counting
+    time.sleep(seconds)
+    return len(calls)
+
+
+def test_idle_endpoint_blocks_until_traffic():
+    listener, client, server = _pair()
+    try:
+        deadline = time.monotonic() + 2
+        while client.stats()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.stats()['in_flight'] == 0
+        assert _count_wakeups(client._endpoint, 0.3) <= 1
+        # 空闲后发出的消息仍立即送达
+        client.sendall(b'again')
+        assert server.recv(64) == b'again'
+    finally:
+        client.close()
+        server.close()
+        listener.close()
+
+
+def test_retransmits_wake_the_idle_endpoint_under_loss():
+    listener, client, server = _pair(loss=0.3)
+    try:
+        for index in range(20):
+            client.sendall(b'message %d' % index)
+        for index in range(20):
+            assert server.recv(64) == b'message %d' % index
+        assert client.stats()['retransmits'] > 0
+    finally:
+        client.close()
+        server.close()
+        listener.close()
+
+
+def test_close_stops_the_endpoint_thread():
+    listener, client, server = _pair()
+    endpoint = client._endpoint
+    client.close()
+    endpoint._thread.join(2)
+    assert not endpoint._thread.is_alive()
+    assert endpoint.sock.fileno() == -1
+    server.close()
+    listener.close()
+    listener._endpoint._thread.join(2)
+    assert not listener._endpoint._thread.is_alive()
@@ -0,0 +1,64 @@
+"""检索索引：中日韩文字二元组切分与原文校验、多关键词、按文档数和倒排项数淘汰"""
+from src.room.search_index import SearchIndex, tokenize
+
+
+def texts(results):
+    return [result['message'] for result in results[0]]
+
+
+def make(*messages, **limits):
+    index = SearchIndex(**limits)
+    for sender, message in messages:
+        index.add({'sender': sender, 'message': message, 'timestamp': 0})
+    return index
+
+
+def test_tokenize_cjk_bigrams_and_words():
+    assert tokenize('你好世界 Hello, World') == {'你好', '好世', '世界', 'hello', 'world'}
+    assert tokenize('好 ok') == {'好', 'ok'}
+
+
+def test_cjk_substring_match_verified_against_text():
+    index = make(('a', '今天天气很好'), ('b', '天气预报'), ('c', '今天很好，天上有气球'))
+    assert texts(index.search('天气')) == ['天气预报', '今天天气很好']
+    # 二元组“今天”“很好”都命中第三条，但原文不含该子串
+    assert texts(index.search('今天天气很好')) == ['今天天气很好']
+
+
+def test_single_character_and_mixed_queries():
+    index = make(('a', '好'), ('b', '你好 Python'), ('c', 'python 入门'))
+    assert texts(index.search('好')) == ['你好 Python', '好']
+    assert texts(index.search('PYTHON 你好')) == ['你好 Python']
+    assert texts(index.search('java')) == []
+
+
+def test_results_newest_first_with_limit():
+    index = make(*[('a', f'消息 {i}') for i in range(5)])
+    results, more = index.search('消息', limit=3)
+    assert [result['message'] for result in results] == ['消息 4', '消息 3', '消息 2'] and more
+
+
+def test_evicts_oldest_documents():
+    index = make(*[('a', f'聊天记录 {i}') for i in range(10)], max_documents=4)
+    assert len(index) == 4
+    assert texts(index.search('聊天')) == [f'聊天记录 {i}' for i in (9, 8, 7, 6)]
+    assert texts(index.search('3')) == []
+    assert index.stats()['postings'] == 4 * len(tokenize('聊天记录 0'))
+
+
+def test_evicts_by_posting_count():
+    index = make(('a', '第一条很长的消息内容'), ('b', '短'), ('c', '再来一条'), max_postings=8)
+    assert index.posting_count <= 8
+    assert texts(index.search('第一')) == []
+    assert texts(index.search('一条')) == ['再来一条']
+
+
+def test_eviction_keeps_postings_consistent():
+    index = make(max_documents=3)
+    for i in range(50):
+        index.add({'sender': 'a', 'message': '共同 词' if i % 2 else f'独有{i}', 'timestamp': 0})
+    assert texts(index.search('共同')) == ['共同 词'] * 2
+    assert texts(index.search('独有48')) == ['独有48']
+    assert texts(index.search('独有46')) == []
+    assert index.posting_count == sum(len(postings) - index._stale.get(token, 0)
+                                      for token, postings in index._postings.items())
@@ -0,0 +1,108 @@
+"""会话令牌表：断线后凭令牌恢复、到期按离开处理，以及主机长时间运行后首个保留会话的到期时间"""
+import threading
+import time
+from types import SimpleNamespace
+
+from src.room.sessions import SessionTable
+
+TIMEOUT = 1.0
+TICK = 0.05
+
+
+def make_table():
+    expired = []
+    done = threading.Event()
+
+    def on_expire(uid, room):
+        expired.append((uid, room))
+        done.set()
+
+    return SessionTable(on_expire, timeout=TIMEOUT, tick=TICK), expired, done
+
+
+def park(table, room, uid='alice'):
+    """加入后意外断开，返回令牌"""
+    client = object()
+    token = table.token_for(True, uid, room)
+    assert table.attach(token, client, uid, room) == (False, None)
+    assert table.detach(token, client, keep=True)
+    return token
+
+
+def test_restore_before_expiry():
+    table, expired, _ = make_table()
+    room = SimpleNamespace(closed=False)
+    try:
+        token = park(table, room)
+        time.sleep(TIMEOUT / 2)
+        assert table.token_for(token, 'alice', room) == token
+        restored, previous = table.attach(token, object(), 'alice', room)
+        assert restored and previous is None
+        time.sleep(TIMEOUT)
+        assert expired == []
+        assert table.stats()['restored'] == 1
+    finally:
+        table.close()
+
+
+def test_expires_after_timeout():
+    table, expired, done = make_table()
+    room = SimpleNamespace(closed=False)
+    try:
+        started = time.monotonic()
+        token = park(table, room)
+        assert done.wait(TIMEOUT * 3)
+        assert time.monotonic() - started >= TIMEOUT - TICK
+        assert expired == [('alice', room)]
+        assert table.token_for(token, 'alice', room) != token
+    finally:
+        table.close()
+
+
+def test_idle_table_older_than_timeout():
+    """时间轮在第一次保留会话前已空闲超过 timeout，保留的会话不能提前到期"""
+    table, expired, _ = make_table()
+    room = SimpleNamespace(closed=False)
+    try:
+        table._wheel._time -= TIMEOUT * 3  # 模拟主机已运行一段时间、从未保留过会话
+        token = park(table, room)
+        time.sleep(TIMEOUT / 2)
+        assert expired == []
+        assert table.attach(token, object(), 'alice', room)[0]
+    finally:
+        table.close()
+
+
+def test_restarts_on_fresh_clock_after_close():
+    table, expired, _ = make_table()
+    room = SimpleNamespace(closed=False)
+    try:
+        park(table, room, 'bob')
+        table.close()
+        table._wheel._time -= TIMEOUT * 3
+        token = park(table, room)
+        time.sleep(TIMEOUT / 2)
+        assert expired == []
+        assert table.attach(token, object(), 'alice', room)[0]
+    finally:
+        table.close()
+
+
+def test_kick_ends_session_and_blocks_rejoin_for_cooldown():
+    table, expired, _ = make_table()
+    table.kick_cooldown = 30
+    room, other = SimpleNamespace(closed=False, room_uid='r1'), SimpleNamespace(closed=False, room_uid='r2')
+    try:
+        client = object()
+        token = table.token_for(True, 'alice', room)
+        table.attach(token, client, 'alice', room)
+        table.kick(token, 'alice', room, now=100.0)
+        assert table.token_for(token, 'alice', room) != token  # 会话已结束
+        assert not table.detach(token, client)
+        assert table.kicked('alice', room, now=120.0)
+        assert not table.kicked('alice', other, now=120.0)
+        assert not table.kicked('bob', room, now=120.0)
+        assert not table.kicked('alice', room, now=131.0)
+        assert table.stats()['kicks'] == 1 and expired == []
+    finally:
+        table.close()